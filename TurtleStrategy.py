@@ -1,18 +1,14 @@
 
 import backtrader as bt
-import math
-# 数据接口
-import tushare as ts
-import numpy as np
-import pandas as pd
-import time
 
 # 基础模块
-from datetime import datetime,timedelta
+from datetime import datetime
 
-# 设置Tushare Token
-ts.set_token('0ff27db3b933751cc13e959f62e7147d441325b4fdc2a4fd1b0aacfe')
-pro = ts.pro_api()
+from data_source import lazy_pro
+from streaming_indicators import Donchian, WilderATR
+
+# 行情接口，数据源与延迟创建见 data_source.lazy_pro
+pro = lazy_pro()
 
 class TurtleStrategy(bt.Strategy):
     params = (
@@ -21,17 +17,27 @@ class TurtleStrategy(bt.Strategy):
         ('atr_period', 20),  # 波动率计算周期
         ('risk_percent', 0.02),  # 单笔风险比例
         ('unit_limit', 4),  # 最大加仓单元数
+        ('recorder', None),  # event_log.EventRecorder，设置后日志写入事件文件而不是打印
     )
-    def log(self, txt, dt=None):
-        # 记录策略的执行日志
+    # checkpoint 保存和恢复的属性：流式通道和 ATR 不回看数据源，需要连同状态一起恢复
+    checkpoint_state = ('unit', 'channel', 'atr')
+
+    def log(self, txt, *args, dt=None):
+        # 记录策略的执行日志；txt 为 % 格式串，事件级别不够时不取日期也不格式化
+        recorder = self.params.recorder
+        if recorder is not None:
+            if recorder.enabled():
+                recorder.log(dt or self.datetime.date(0), txt, *args)
+            return
         dt = dt or self.datetime.date(0)
-        print('%s, %s' % (dt.isoformat(), txt))
+        print('%s, %s' % (dt.isoformat(), txt % args if args else txt))
 
     def __init__(self):
-        # 核心指标计算
-        self.high_channel = bt.indicators.Highest(self.data.high, period=self.p.entry_period)
-        self.low_channel = bt.indicators.Lowest(self.data.low, period=self.p.exit_period)
-        self.atr = bt.indicators.ATR(self.data, period=self.p.atr_period)
+        # 核心指标计算：流式通道和 ATR，逐根 O(1) 更新，实盘分钟线可直接复用同样的计算
+        self.channel = Donchian(self.p.entry_period, self.p.exit_period)
+        self.atr = WilderATR(self.p.atr_period)
+        # 与 backtrader 指标的 minperiod 一致，数据够长才开始交易
+        self.warmup = max(self.p.entry_period, self.p.exit_period, self.p.atr_period + 1)
 
         self.order = None
         self.unit = 0  # 当前持仓单元数
@@ -39,27 +45,34 @@ class TurtleStrategy(bt.Strategy):
     def calculate_position_size(self):
         # 根据ATR和账户资金计算头寸规模
         risk_amount = self.broker.getvalue() * self.params.risk_percent
-        size = risk_amount / self.atr[0]
+        size = risk_amount / self.atr.value
         return int(size)
     def next(self):
+        # 比较用上一根的通道，先取值再更新
+        high_channel, low_channel = self.channel.upper, self.channel.lower
+        self.channel.update(self.data.high[0], self.data.low[0])
+        self.atr.update(self.data.high[0], self.data.low[0], self.data.close[0])
+        if len(self) < self.warmup:
+            return
+
         if self.order:  # 有未完成订单则返回
             return
 
-        if self.data.close[0] > self.high_channel[-1]:
-            self.log(f'close:{self.data.close[0]} high:{self.high_channel[-1]}')
+        if self.data.close[0] > high_channel:
+            self.log('close:%s high:%s', self.data.close[0], high_channel)
 
         # 突破入场信号
-        if self.data.close[0] > self.high_channel[-1] and self.unit < self.p.unit_limit:
+        if self.data.close[0] > high_channel and self.unit < self.p.unit_limit:
             size = self.calculate_position_size()
             self.buy(size=size)
             self.unit += 1
-            self.log(f'第{self.unit}次加仓 | 价格：{self.data.close[0]:.2f}')
+            self.log('第%s次加仓 | 价格：%.2f', self.unit, self.data.close[0])
 
         # 跌破离场信号
-        elif self.data.close[0] < self.low_channel[-1] and self.position:
+        elif self.data.close[0] < low_channel and self.position:
             self.close()
             self.unit = 0
-            self.log(f'清仓离场 | 价格：{self.data.close[0]:.2f} ')
+            self.log('清仓离场 | 价格：%.2f ', self.data.close[0])
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -69,14 +82,18 @@ class TurtleStrategy(bt.Strategy):
         # 注意: 当资金不足时，broker会拒绝订单
         if order.status in [order.Completed]:
             if order.isbuy():
-                self.log(f"买入 {order.executed.size} 股，价格：{order.executed.price},总价：{order.executed.value},代码：{order.data._name}")
+                self.log("买入 %s 股，价格：%s,总价：%s,代码：%s", order.executed.size, order.executed.price,
+                         order.executed.value, order.data._name)
             elif order.issell():
-                self.log(f"卖出 {order.executed.size} 股，价格：{order.executed.price},总价：{order.executed.value},代码：{order.data._name}")
+                self.log("卖出 %s 股，价格：%s,总价：%s,代码：%s", order.executed.size, order.executed.price,
+                         order.executed.value, order.data._name)
 
                 # 记录当前交易数量
             self.bar_executed = len(self)
 
 def get_data(stock_code, start_date, end_date):
+    import pandas as pd
+
     # 获取历史日线数据
     print(stock_code,start_date,end_date)
     df = pro.daily(ts_code=stock_code, start_date=start_date, end_date=end_date)
@@ -97,22 +114,30 @@ def get_data(stock_code, start_date, end_date):
 
 # 策略执行示例
 if __name__ == '__main__':
+    import pandas as pd
+    from trade_calendar import load_calendar
+    from ashare_broker import AShareBroker
+    from analytics import EquityRecorder
+    from report import write_report
+
     cerebro = bt.Cerebro()
 
-    start_date = datetime.now()-timedelta(days=180)
-    start_date = start_date.strftime('%Y%m%d')
+    # 最近约半年（120 个交易日），按本地交易日历计算
     end_date = datetime.now().strftime('%Y%m%d')
+    start_date = pd.Timestamp(load_calendar(pro).offset(end_date, -120)).strftime('%Y%m%d')
 
     # Create stock Data Feed
     stock_index = '300718.SZ'
 
     data = get_data(stock_index,start_date,end_date)
-    cerebro.adddata(data)
+    cerebro.adddata(data, name=stock_index)
     cerebro.addstrategy(TurtleStrategy)
+    cerebro.broker = AShareBroker()  # A 股撮合和费用，头寸按整手向下取整
     cerebro.broker.setcash(100000.0)
-    cerebro.broker.setcommission(commission=0.0002)  # 加密货币低佣金
+    cerebro.addanalyzer(EquityRecorder, _name='equity')
 
     print('初始净值: $%.2f' % cerebro.broker.getvalue())
-    cerebro.run()
+    result = cerebro.run()[0]
     print('最终净值: $%.2f' % cerebro.broker.getvalue())
-    cerebro.plot(style='candlestick',bardown = 'green', barup = 'red')
+    # K 线图（涨红跌绿）写入 reports/，不弹出窗口
+    print('报告: %s' % write_report(result, style='candle'))
@@ -0,0 +1,202 @@
+import numpy as np
+import backtrader as bt
+
+# ================== 绩效分析 ==================
+# EquityRecorder 在回测中只做追加：每根 K 线记录一次净值和现金，成交和平仓在通知里记录，
+# 回测结束后一次性转成数组。夏普、索提诺、最大回撤及持续时间、换手率、胜率、分股票收益归因
+# 都在这些数组上向量化计算，不再依赖逐根 K 线运行的 TradeAnalyzer/DrawDown。
+# 净值相关的函数沿最后一维计算，传入 equity_matrix() 拼好的二维数组即可一次算出
+# 上千组参数寻优或批量回测的指标；不等长的曲线用 nan 补齐，nan 不参与计算。
+#   rec = result.analyzers.equity.get_analysis()
+#   print(summarize(rec))
+#   performance(equity_matrix([r['value'] for r in recs]))['sharpe']
+
+TRADING_DAYS = 252  # 日线年化系数
+
+
+class EquityRecorder(bt.Analyzer):
+    """记录净值曲线、成交和已平仓交易，get_analysis() 返回 numpy 数组"""
+
+    def start(self):
+        self._datetime = []
+        self._value = []
+        self._cash = []
+        self._fills = []  # (K 线序号, 数据源序号, 数量, 价格, 佣金)
+        self._trades = []  # (数据源序号, 毛利润, 净利润, 持仓 K 线数)
+        self._data_index = {d: i for i, d in enumerate(self.strategy.datas)}
+
+    def prenext(self):
+        # 多数据源策略在 prenext 阶段也会交易，净值同样记录
+        self.next()
+
+    def next(self):
+        broker = self.strategy.broker
+        self._datetime.append(self.strategy.datetime[0])
+        self._value.append(broker.getvalue())
+        self._cash.append(broker.getcash())
+
+    def notify_order(self, order):
+        if order.status == order.Completed:
+            # 通知在当根 K 线的 next() 之前到达，成交属于即将记录的这一根
+            self._fills.append((len(self._value), self._data_index[order.data], order.executed.size,
+                                order.executed.price, order.executed.comm))
+
+    def notify_trade(self, trade):
+        if trade.isclosed:
+            self._trades.append((self._data_index[trade.data], trade.pnl, trade.pnlcomm, trade.barlen))
+
+    def stop(self):
+        datas = self.strategy.datas
+        broker = self.strategy.broker
+        fills = np.array(self._fills, dtype=float).reshape(-1, 5)
+        trades = np.array(self._trades, dtype=float).reshape(-1, 4)
+        self.rets = {
+            'names': [d._name for d in datas],
+            'datetime': np.array(self._datetime),  # backtrader 的浮点日期，bt.num2date 转换
+            'value': np.array(self._value),
+            'cash': np.array(self._cash),
+            'start_cash': broker.startingcash,
+            'fill_bar': fills[:, 0].astype(np.int64),
+            'fill_data': fills[:, 1].astype(np.int64),
+            'fill_size': fills[:, 2],  # 买入为正，卖出为负
+            'fill_price': fills[:, 3],
+            'fill_comm': fills[:, 4],
+            'trade_data': trades[:, 0].astype(np.int64),
+            'trade_pnl': trades[:, 1],
+            'trade_pnlcomm': trades[:, 2],
+            'trade_barlen': trades[:, 3].astype(np.int64),
+            # 回测结束时的持仓和收盘价，用于未平仓部分的收益归因
+            'last_size': np.array([broker.getposition(d).size for d in datas], dtype=float),
+            'last_close': np.array([d.close[0] if len(d) else np.nan for d in datas]),
+        }
+
+    def get_analysis(self):
+        return self.rets
+
+
+# ================== 向量化指标 ==================
+def equity_matrix(curves):
+    """多条净值曲线对齐成二维数组，较短的在末尾用 nan 补齐"""
+    curves = [np.asarray(c, dtype=float) for c in curves]
+    out = np.full((len(curves), max((len(c) for c in curves), default=0)), np.nan)
+    for i, c in enumerate(curves):
+        out[i, :len(c)] = c
+    return out
+
+
+def returns(values):
+    """逐根收益率，比输入少一列"""
+    values = np.asarray(values, dtype=float)
+    return values[..., 1:] / values[..., :-1] - 1.0
+
+
+def sharpe(values, periods=TRADING_DAYS, risk_free=0.0):
+    """年化夏普比率，risk_free 为年化无风险利率"""
+    excess = returns(values) - risk_free / periods
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nanmean(excess, axis=-1) / np.nanstd(excess, axis=-1, ddof=1) * np.sqrt(periods)
+
+
+def sortino(values, periods=TRADING_DAYS, risk_free=0.0):
+    """年化索提诺比率，下行波动只计负的超额收益"""
+    excess = returns(values) - risk_free / periods
+    downside = np.sqrt(np.nanmean(np.minimum(excess, 0.0) ** 2, axis=-1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nanmean(excess, axis=-1) / downside * np.sqrt(periods)
+
+
+def drawdown(values):
+    """
+    逐根回撤（占前高的比例）及距前高的 K 线数
+    :return: (drawdown, duration)，形状与 values 相同
+    """
+    values = np.asarray(values, dtype=float)
+    peak = np.fmax.accumulate(values, axis=-1)
+    with np.errstate(invalid='ignore'):
+        dd = (peak - values) / peak
+        idx = np.broadcast_to(np.arange(values.shape[-1]), values.shape)
+        at_peak = np.where((values >= peak) | np.isnan(values), idx, 0)
+    duration = idx - np.maximum.accumulate(at_peak, axis=-1)
+    return dd, duration
+
+
+def max_drawdown(values):
+    """(最大回撤比例, 最长回撤 K 线数)"""
+    dd, duration = drawdown(values)
+    return np.nanmax(dd, axis=-1, initial=0.0), duration.max(axis=-1, initial=0)
+
+
+def performance(values, periods=TRADING_DAYS, risk_free=0.0):
+    """净值曲线的汇总指标，values 可以是一维或 equity_matrix() 的二维数组"""
+    values = np.asarray(values, dtype=float)
+    n = np.sum(~np.isnan(values), axis=-1)
+    first = values[..., 0]
+    last = np.take_along_axis(values, np.maximum(n - 1, 0)[..., None], axis=-1)[..., 0]
+    mdd, mdd_len = max_drawdown(values)
+    return {
+        'total_return': last / first - 1.0,
+        'annual_return': (last / first) ** (periods / np.maximum(n - 1, 1)) - 1.0,
+        'sharpe': sharpe(values, periods, risk_free),
+        'sortino': sortino(values, periods, risk_free),
+        'max_drawdown': mdd,
+        'max_drawdown_len': mdd_len,
+    }
+
+
+def turnover(rec, periods=TRADING_DAYS):
+    """年化换手率：成交额 / 平均净值，按年折算"""
+    traded = np.abs(rec['fill_size'] * rec['fill_price']).sum()
+    bars = len(rec['value'])
+    if not bars:
+        return 0.0
+    return traded / rec['value'].mean() * periods / bars
+
+
+def win_rate(pnlcomm):
+    """扣费后不亏的交易占比，与 TradeAnalyzer 的 won 口径一致"""
+    pnlcomm = np.asarray(pnlcomm, dtype=float)
+    return float(np.mean(pnlcomm >= 0.0)) if len(pnlcomm) else float('nan')
+
+
+def attribution(rec):
+    """
+    按股票拆分的收益（含未平仓浮盈，已扣佣金）：期末市值 - 买入金额 + 卖出金额 - 佣金
+    :return: {股票: 收益}，只含有成交的股票，按收益从高到低
+    """
+    n = len(rec['names'])
+    data = rec['fill_data']
+    cash_flow = np.bincount(data, weights=-rec['fill_size'] * rec['fill_price'] - rec['fill_comm'],
+                            minlength=n).astype(float)  # 没有成交时 bincount 返回整数数组
+    held = rec['last_size'] != 0
+    cash_flow[held] += rec['last_size'][held] * rec['last_close'][held]
+    traded = np.unique(data)
+    order = traded[np.argsort(-cash_flow[traded], kind='stable')]
+    return {rec['names'][i] if rec['names'][i] is not None else i: float(cash_flow[i]) for i in order}
+
+
+def positions(rec):
+    """逐根持仓数量矩阵（K 线 × 数据源），由成交累加得到"""
+    out = np.zeros((len(rec['value']), len(rec['names'])))
+    np.add.at(out, (rec['fill_bar'], rec['fill_data']), rec['fill_size'])
+    return np.cumsum(out, axis=0)
+
+
+def summarize(rec, periods=TRADING_DAYS, risk_free=0.0):
+    """EquityRecorder 结果的单行汇总，字段与 param_sweep / batch_backtest 的结果列一致"""
+    start_cash = rec['start_cash']
+    values = rec['value'] if len(rec['value']) else np.array([start_cash])  # 数据源为空时没有记录
+    final_value = float(values[-1])
+    perf = performance(values, periods, risk_free)
+    pnlcomm = rec['trade_pnlcomm']
+    return {
+        'final_value': final_value,
+        'net_profit': (final_value - start_cash) / start_cash * 100,
+        'trades': len(pnlcomm),
+        'won': int(np.sum(pnlcomm >= 0.0)),
+        'win_rate': win_rate(pnlcomm),
+        'max_drawdown': float(perf['max_drawdown']) * 100,
+        'max_drawdown_len': int(perf['max_drawdown_len']),
+        'sharpe': float(perf['sharpe']),
+        'sortino': float(perf['sortino']),
+        'turnover': turnover(rec, periods),
+    }
@@ -0,0 +1,347 @@
+from datetime import datetime
+
+import numpy as np
+import backtrader as bt
+from backtrader.order import Order
+
+from limit_price import limit_ratio, round_price, CHINEXT_REFORM_DATE, PRICE_TICK
+
+# ================== A 股撮合与费用 ==================
+# AShareBroker 在 BackBroker 基础上按 A 股规则成交：
+#   1. 买入按 100 股整手向下取整，不足一手的订单直接拒绝；卖出零股只能一次性全部卖出
+#   2. T+1：当天买入的股票当天不能卖出，卖出数量超过可卖数量（含做空）时撤单
+#   3. 全天封涨停（最低价 = 涨停价）买单无法成交，全天封跌停（最高价 = 跌停价）卖单无法成交，
+#      按当日有效单处理：撤单并通知策略
+#   4. 费用见 AShareCommission：佣金（最低 5 元）、印花税（仅卖出）、过户费
+#   5. 停牌（成交量为 0，或数据源有 suspended line 且为 1）当天不成交，订单保留到复牌后的第一根 K 线
+# 每根 K 线的全部市价单一次取齐开高低收、涨跌停价和持仓，用数组运算判断能否成交、计算成交价，
+# 成交记账只保留股票多头需要的部分（见 _fill）；提交时的资金检查也按累计资金一次算完。
+# 股票没有融资利息和逐日盯市，省去 BackBroker 每根 K 线对全部持仓的两次遍历。
+# 只支持市价单：限价、止损等订单类型提交时直接拒绝，不会绕过整手、T+1 和涨跌停检查。
+#   cerebro.broker = AShareBroker(coc=True)
+
+LOT_SIZE = 100
+_REFORM_DATENUM = bt.date2num(datetime(2020, 8, 24))
+
+
+class AShareCommission(bt.CommInfoBase):
+    """A 股费用：佣金按成交额收取且不低于 min_commission，印花税只在卖出时收取，过户费双向收取"""
+    params = (
+        ('stocklike', True),
+        ('commtype', bt.CommInfoBase.COMM_PERC),
+        ('percabs', True),
+        ('commission', 0.00025),  # 佣金费率（万 2.5）
+        ('min_commission', 5.0),  # 单笔最低佣金（元）
+        ('stamp_duty', 0.0005),  # 印花税（2023-08-28 起卖出 0.05%）
+        ('transfer_fee', 0.00001),  # 过户费（0.001%）
+    )
+
+    def _getcommission(self, size, price, pseudoexec):
+        value = abs(size) * price
+        fee = max(value * self.p.commission, self.p.min_commission) + value * self.p.transfer_fee
+        if size < 0:
+            fee += value * self.p.stamp_duty
+        return fee
+
+    def fees(self, size, price):
+        """向量版 getcommission，size 为负表示卖出"""
+        size = np.asarray(size, dtype=np.float64)
+        value = np.abs(size) * price
+        fee = np.maximum(value * self.p.commission, self.p.min_commission) + value * self.p.transfer_fee
+        fee += np.where(size < 0, value * self.p.stamp_duty, 0.0)
+        return np.where(size != 0, fee, 0.0)
+
+
+class AShareBroker(bt.brokers.BackBroker):
+    params = (
+        ('lot_size', LOT_SIZE),
+        ('t_plus_1', True),  # 当天买入次日才能卖出
+        ('check_limits', True),  # 封涨停不能买、封跌停不能卖
+        ('st_codes', None),  # ST 股票代码集合，涨跌幅按 5% 计算
+    )
+
+    def __init__(self):
+        super(AShareBroker, self).__init__()
+        # 默认费用只在构造时安装：start() 会再次调用 init()，不能覆盖之后 setcommission 设置的费用
+        self.comminfo[None] = AShareCommission()
+
+    def init(self):
+        super(AShareBroker, self).init()
+        self._ratios = {}  # data -> (创业板改革前比例, 改革后比例)
+        self._bought = {}  # data -> (成交日, 当天买入股数)
+        self._lines = {}  # data -> (datetime, open, high, low, close, pre_close, volume, suspended) 各条 line
+
+    # ---------- 下单：整手 ----------
+    def buy(self, owner, data, size, **kwargs):
+        lots = int(size) // self.p.lot_size * self.p.lot_size
+        if not lots:
+            kwargs['odd_lot'] = True
+        return super(AShareBroker, self).buy(owner, data, lots or size, **kwargs)
+
+    def sell(self, owner, data, size, **kwargs):
+        held = self.positions[data].size
+        # 零股只能随持仓一次卖完，其余按整手向下取整
+        if size != held:
+            lots = int(size) // self.p.lot_size * self.p.lot_size
+            if not lots:
+                kwargs['odd_lot'] = True
+            size = lots or size
+        return super(AShareBroker, self).sell(owner, data, size, **kwargs)
+
+    def submit(self, order, check=True):
+        if order.exectype != Order.Market:
+            print(f"{order.data._name} {order.getordername()}单被拒绝：AShareBroker 只支持市价单")
+            self._reject(order)
+            return order
+        return super(AShareBroker, self).submit(order, check=check)
+
+    def notify(self, order):
+        """与 Order.clone 相同的浅拷贝，直接复制 __dict__，省去 copy.copy 的通用协议开销"""
+        executed = order.executed
+        executed.markpending()
+        clone = object.__new__(order.__class__)
+        clone.__dict__.update(order.__dict__)
+        clone.executed = object.__new__(executed.__class__)
+        clone.executed.__dict__.update(executed.__dict__)
+        self.notifs.append(clone)
+
+    def _reject(self, order):
+        order.reject(self)
+        self.notify(order)
+        self._ococheck(order)
+        self._bracketize(order, cancel=True)
+
+    def _cancel(self, order):
+        order.cancel()
+        self.notify(order)
+        self._ococheck(order)
+        self._bracketize(order, cancel=True)
+
+    # ---------- 提交：资金检查 ----------
+    def check_submitted(self):
+        """按提交顺序累计资金占用，全部够用时一次接受；出现不足才从该笔开始逐笔判断"""
+        orders = []
+        while self.submitted:
+            order = self.submitted.popleft()
+            if self._take_children(order) is None:
+                continue
+            if order.info.get('odd_lot'):
+                self._reject(order)
+                continue
+            orders.append(order)
+        if not orders:
+            return
+
+        size = np.array([o.executed.remsize for o in orders], dtype=np.float64)
+        price = np.array([o.data.open[0] if self.p.coo else o.created.price for o in orders], dtype=np.float64)
+        if self._same_commission(orders):
+            fees = self.comminfo[None].fees(size, price)
+        else:
+            fees = np.array([self.getcommissioninfo(o.data).getcommission(s, p)
+                             for o, s, p in zip(orders, size, price)])
+        delta = -size * price - fees
+        running = self.cash + np.cumsum(delta)
+        short = np.flatnonzero(running < 0.0)
+        first = short[0] if len(short) else len(orders)
+        for order in orders[:first]:
+            self.submit_accept(order)
+        cash = running[first - 1] if first else self.cash
+        for order, d in zip(orders[first:], delta[first:]):
+            if cash + d >= 0.0:
+                cash += d
+                self.submit_accept(order)
+            else:
+                order.margin()
+                self.notify(order)
+                self._ococheck(order)
+                self._bracketize(order, cancel=True)
+
+    def _same_commission(self, orders):
+        default = self.comminfo[None]
+        return isinstance(default, AShareCommission) and \
+            all(self.getcommissioninfo(o.data) is default for o in orders)
+
+    # ---------- 撮合 ----------
+    def next(self):
+        while self._toactivate:
+            self._toactivate.popleft().activate()
+
+        if self.p.checksubmit:
+            self.check_submitted()
+
+        self._process_order_history()
+
+        market = []
+        self.pending.append(None)
+        while True:
+            order = self.pending.popleft()
+            if order is None:
+                break
+            if order.expire():
+                self.notify(order)
+                self._ococheck(order)
+                self._bracketize(order, cancel=True)
+            elif not order.active():
+                self.pending.append(order)
+            else:
+                market.append(order)
+
+        if market:
+            self._match_market(market)
+
+        self._get_value()
+
+    def _limit_ratio(self, data, datenum):
+        ratios = self._ratios.get(data)
+        if ratios is None:
+            name = data._name or ''
+            dates = np.array([CHINEXT_REFORM_DATE - np.timedelta64(1, 'D'), CHINEXT_REFORM_DATE])
+            ratios = self._ratios[data] = tuple(limit_ratio(np.array([name, name], dtype=object), dates, self.p.st_codes))
+        return ratios[datenum >= _REFORM_DATENUM]
+
+    def _bar_lines(self, data):
+        """缓存数据源的各条 line，撮合时直接按下标取值，不经过 data.xxx 的属性查找"""
+        lines = self._lines.get(data)
+        if lines is None:
+            lines = self._lines[data] = (data.lines.datetime, data.lines.open, data.lines.high, data.lines.low,
+                                         data.lines.close, getattr(data.lines, 'pre_close', None),
+                                         data.lines.volume, getattr(data.lines, 'suspended', None))
+        return lines
+
+    def _halted(self, data, ago):
+        """ago 那根 K 线是否停牌：成交量为 0，或 suspended line 为 1（如 panel.PanelData 的停牌日）"""
+        lines = self._bar_lines(data)
+        return lines[6][ago] == 0 or (lines[7] is not None and lines[7][ago] > 0)
+
+    def _match_market(self, orders):
+        """一根 K 线的全部市价单：取齐行情后用数组判断成交与价格，再逐笔记账"""
+        n = len(orders)
+        rows = np.full((n, 8), np.nan)  # 成交参考价、最高、最低、昨收、涨跌幅、成交日、股数、可卖
+        waiting = np.zeros(n, dtype=bool)  # 数据尚未推进到下一根或当天停牌，留到下次撮合
+        isbuy = np.zeros(n, dtype=bool)
+        use_close = np.zeros(n, dtype=bool)
+        positions, bought_today = self.positions, self._bought
+        for i, order in enumerate(orders):
+            data = order.data
+            dt_line, open_line, high_line, low_line, close_line, pre_line = self._bar_lines(data)[:6]
+            coc = self.p.coc and order.info.get('coc', True)
+            dt0 = dt_line[0]
+            created = order.created
+            ago = -1 if dt0 > created.dt and len(data) > 1 else 0
+            if coc and self._halted(data, ago):
+                # 下单那根 K 线停牌，收盘价只是沿用值，改为复牌后按开盘价成交
+                coc = False
+            if coc:
+                # 按下单那根 K 线的收盘价成交
+                exprice, exdate = created.pclose, created.dt
+            else:
+                if (not self.p.coo and dt0 <= created.dt) or self._halted(data, 0):
+                    waiting[i] = True
+                    continue
+                ago = 0
+                exprice, exdate = open_line[0], dt0
+            if pre_line is not None:
+                pre = pre_line[ago]
+            else:
+                pre = close_line[ago - 1] if len(data) > 1 - ago else float('nan')
+            size = order.executed.remsize
+            isbuy[i] = size > 0
+            use_close[i] = coc
+            held = positions[data].size
+            bought = bought_today.get(data)
+            if self.p.t_plus_1 and bought is not None and bought[0] == exdate:
+                held -= bought[1]
+            rows[i] = (exprice, high_line[ago], low_line[ago], pre, self._limit_ratio(data, exdate),
+                       exdate, size, held)
+
+        exprice, high, low, pre, ratio, exdate, size, sellable = rows.T
+        half_tick = PRICE_TICK / 2
+        up, down = round_price(pre * (1 + ratio)), round_price(pre * (1 - ratio))
+        with np.errstate(invalid='ignore'):
+            if self.p.check_limits:
+                # 收盘价成交时看收盘是否封板，开盘成交时看全天是否一字板
+                sealed_up = np.where(use_close, exprice, low) >= up - half_tick
+                sealed_down = np.where(use_close, exprice, high) <= down + half_tick
+            else:
+                sealed_up = sealed_down = np.zeros(n, dtype=bool)
+            blocked = np.where(isbuy, sealed_up, sealed_down)
+        if self.p.slip_perc or self.p.slip_fixed:
+            slip = exprice * self.p.slip_perc if self.p.slip_perc else self.p.slip_fixed
+            exprice = np.where(isbuy, np.minimum(exprice + slip, high), np.maximum(exprice - slip, low))
+
+        exprice, exdate = exprice.tolist(), exdate.tolist()
+        size, sellable = size.tolist(), sellable.tolist()
+        remaining = {}  # data -> 本批次还可卖出的股数，同一股票的多笔卖单（如停牌期间每天下的单）累计不超过持仓
+        for i, order in enumerate(orders):
+            if waiting[i]:
+                self.pending.append(order)
+            elif blocked[i]:
+                self._cancel(order)
+            elif not isbuy[i] and -size[i] > remaining.get(order.data, sellable[i]):
+                self._cancel(order)
+            else:
+                if not isbuy[i]:
+                    remaining[order.data] = remaining.get(order.data, sellable[i]) + size[i]
+                filled = self._fill(order, exprice[i], exdate[i] if use_close[i] else None)
+                if filled > 0:
+                    data = order.data
+                    bought = bought_today.get(data)
+                    if bought is not None and bought[0] == exdate[i]:
+                        filled += bought[1]
+                    bought_today[data] = (exdate[i], filled)
+
+    def _fill(self, order, price, dtcoc):
+        """
+        股票多头的成交记账，对应 BackBroker._execute 去掉杠杆、期货逐日盯市、反手开仓等分支
+        （卖出数量已限制在可卖持仓内，一笔订单只会开仓或平仓）
+        :return: 成交股数，卖出为负
+        """
+        if self.p.filler is not None:
+            # 按成交量部分成交时走 BackBroker 原逻辑
+            before = order.executed.size
+            self._execute(order, ago=0, price=price, dtcoc=dtcoc)
+            if order.alive():
+                self.pending.append(order)
+            elif order.status == Order.Completed:
+                self._bracketize(order)
+            return order.executed.size - before
+
+        data = order.data
+        size = order.executed.remsize
+        comminfo = self.getcommissioninfo(data)
+        position = self.positions[data]
+        pprice_orig = position.price
+        psize, pprice, opened, closed = position.pseudoupdate(size, price)
+
+        cash = self.cash
+        pnl = closedvalue = closedcomm = openedvalue = openedcomm = 0.0
+        if closed:
+            pnl = comminfo.profitandloss(-closed, pprice_orig, price)
+            closedvalue = comminfo.getoperationcost(closed, pprice_orig)
+            closedcomm = comminfo.getcommission(closed, price)
+            cash += closedvalue + pnl - closedcomm
+        if opened:
+            openedvalue = comminfo.getoperationcost(opened, price)
+            openedcomm = comminfo.getcommission(opened, price)
+            cash -= openedvalue + openedcomm
+            if cash < 0.0:
+                # 资金不足
+                order.margin()
+                self.notify(order)
+                self._ococheck(order)
+                self._bracketize(order, cancel=True)
+                return 0
+            position.adjbase = price
+        self.cash = cash
+
+        execsize = closed + opened
+        position.update(execsize, price, data.datetime.datetime())
+        order.execute(dtcoc or data.datetime[0], execsize, price,
+                      closed, closedvalue, closedcomm,
+                      opened, openedvalue, openedcomm,
+                      comminfo.margin, pnl, psize, pprice)
+        order.addcomminfo(comminfo)
+        self.notify(order)
+        self._ococheck(order)
+        self._bracketize(order)
+        return execsize
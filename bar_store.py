@@ -0,0 +1,296 @@
+import os
+import json
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import backtrader as bt
+
+# ================== 列式行情存储 ==================
+# 全市场日线按 (ts_code, trade_date) 排序后按列存成 .npy 文件，读取时使用内存映射：
+#   data/bars/CURRENT            -> 当前版本目录名
+#   data/bars/v<时间戳>/codes.npy    股票代码（已排序）
+#   data/bars/v<时间戳>/offsets.npy  每只股票在列数组中的起止下标，长度 len(codes)+1
+#   data/bars/v<时间戳>/trade_date.npy 及各字段 .npy
+#   data/bars/delta/d<时间戳>/       append_bars 追加的增量段（ts_code.npy、trade_date.npy 及各字段）
+# 写入总是生成新版本目录，再原子替换 CURRENT，读者不会看到写了一半的数据。
+# 增量同步每批只写一个增量段，代价与这一批的行数成正比；打开存储时把增量段合并进来（不再内存映射），
+# 同步结束后 compact_bars 一次性合并成新版本，整个回补只重写一次全量数据。
+
+BAR_STORE_DIR = 'data/bars'
+DELTA_DIR = 'delta'
+BAR_FIELDS = ('open', 'high', 'low', 'close', 'pre_close', 'vol', 'amount')
+CSV_DATA_DIR = 'data'
+
+
+class PandasBarData(bt.feeds.PandasData):
+    """带 pre_close 线的 PandasData，涨停判断需要用到昨收价"""
+    lines = ('pre_close',)
+    params = (('pre_close', -1),)
+
+
+def _to_datetime64(date):
+    """把 'YYYYMMDD' 字符串/Timestamp 统一成 datetime64[ns]"""
+    return np.datetime64(pd.Timestamp(date), 'ns')
+
+
+def _normalize_trade_date(s):
+    """Tushare 的 trade_date 是 'YYYYMMDD' 字符串，本地 CSV 里则是日期字符串"""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s.astype('datetime64[ns]')
+    s = s.astype(str)
+    fmt = '%Y%m%d' if s.str.len().eq(8).all() else None
+    return pd.to_datetime(s, format=fmt).astype('datetime64[ns]')
+
+
+class BarStore:
+    """只读的列式日线存储，数组为内存映射（有未合并的增量段时为合并后的内存数组），按股票切片不产生拷贝"""
+
+    def __init__(self, root=BAR_STORE_DIR, mmap=True):
+        self.root = root
+        self.version = None
+        self.codes = np.array([], dtype='<U12')
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.trade_date = np.array([], dtype='datetime64[ns]')
+        self.columns = {f: np.array([], dtype=np.float64) for f in BAR_FIELDS}
+        self._index = {}
+
+        version = _read_current(root)
+        if version is not None:
+            path = os.path.join(root, version)
+            mode = 'r' if mmap else None
+            self.version = version
+            self.codes = np.load(os.path.join(path, 'codes.npy'))
+            self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+            self.trade_date = np.load(os.path.join(path, 'trade_date.npy'), mmap_mode=mode)
+            self.columns = {f: np.load(os.path.join(path, f'{f}.npy'), mmap_mode=mode) for f in BAR_FIELDS}
+
+        self.deltas = _list_deltas(root)
+        if self.deltas:
+            # 尚未合并的增量段：与当前版本合并成内存数组，同一 ts_code+trade_date 以较新的段为准
+            frames = [self.to_frame()] + [_read_delta(os.path.join(root, DELTA_DIR, d)) for d in self.deltas]
+            df = _sorted_bars(pd.concat(frames, ignore_index=True))
+            self.codes, self.offsets = _code_offsets(df)
+            self.trade_date = df['trade_date'].to_numpy(dtype='datetime64[ns]')
+            self.columns = {f: df[f].to_numpy(dtype=np.float64) for f in BAR_FIELDS}
+        self._index = {code: i for i, code in enumerate(self.codes.tolist())}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, ts_code):
+        return ts_code in self._index
+
+    def _bounds(self, ts_code, start_date=None, end_date=None):
+        """返回某只股票在列数组中的 [lo, hi) 区间，可按日期截取"""
+        i = self._index[ts_code]
+        lo, hi = int(self.offsets[i]), int(self.offsets[i + 1])
+        if start_date is not None or end_date is not None:
+            dates = self.trade_date[lo:hi]
+            if start_date is not None:
+                lo += int(np.searchsorted(dates, _to_datetime64(start_date), side='left'))
+            if end_date is not None:
+                hi = int(self.offsets[i]) + int(np.searchsorted(dates, _to_datetime64(end_date), side='right'))
+        return lo, max(lo, hi)
+
+    def last_dates(self):
+        """每只股票最后一个已存储的交易日"""
+        if not len(self.codes):
+            return pd.Series(dtype='datetime64[ns]', name='trade_date')
+        last = np.asarray(self.trade_date)[self.offsets[1:] - 1]
+        return pd.Series(last, index=pd.Index(self.codes, name='ts_code'), name='trade_date')
+
+    def arrays(self, ts_code, start_date=None, end_date=None):
+        """取单只股票各列的数组视图（不拷贝），键为 trade_date 及 BAR_FIELDS"""
+        lo, hi = self._bounds(ts_code, start_date, end_date)
+        arrays = {f: self.columns[f][lo:hi] for f in BAR_FIELDS}
+        arrays['trade_date'] = self.trade_date[lo:hi]
+        return arrays
+
+    def get(self, ts_code, start_date=None, end_date=None):
+        """取单只股票日线，列名已转换为 backtrader 所需格式"""
+        lo, hi = self._bounds(ts_code, start_date, end_date)
+        c = self.columns
+        return pd.DataFrame({
+            'open': c['open'][lo:hi],
+            'high': c['high'][lo:hi],
+            'low': c['low'][lo:hi],
+            'close': c['close'][lo:hi],
+            'volume': c['vol'][lo:hi],
+            'pre_close': c['pre_close'][lo:hi],
+            'amount': c['amount'][lo:hi],
+        }, index=pd.DatetimeIndex(self.trade_date[lo:hi], name='trade_date'), copy=False)
+
+    def to_frame(self, codes=None):
+        """导出为长表（ts_code, trade_date, 各字段），字段名与 pro.daily 一致"""
+        if codes is None:
+            idx = slice(None)
+            code_col = np.repeat(self.codes, np.diff(self.offsets))
+        else:
+            codes = [c for c in codes if c in self._index]
+            parts = [np.arange(*self._bounds(c)) for c in codes]
+            idx = np.concatenate(parts) if parts else np.array([], dtype=np.int64)
+            code_col = np.repeat(np.array(codes, dtype=self.codes.dtype), [len(p) for p in parts])
+        df = pd.DataFrame({'ts_code': code_col, 'trade_date': np.asarray(self.trade_date[idx])})
+        for f in BAR_FIELDS:
+            df[f] = np.asarray(self.columns[f][idx])
+        return df
+
+    def feeds(self, codes=None, start_date=None, end_date=None, min_bars=1):
+        """逐只生成 backtrader 数据源"""
+        for ts_code in (self.codes.tolist() if codes is None else codes):
+            if ts_code not in self._index:
+                continue
+            df = self.get(ts_code, start_date, end_date)
+            if len(df) < min_bars:
+                continue
+            yield ts_code, PandasBarData(dataname=df, name=ts_code)
+
+    def add_feeds(self, cerebro, codes=None, start_date=None, end_date=None, min_bars=1):
+        """把存储中的股票全部加入 Cerebro，返回已加入的股票代码"""
+        added = []
+        for ts_code, data in self.feeds(codes, start_date, end_date, min_bars):
+            cerebro.adddata(data)
+            added.append(ts_code)
+        return added
+
+
+# ================== 写入 ==================
+def _read_current(root):
+    pointer = os.path.join(root, 'CURRENT')
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        version = f.read().strip()
+    return version or None
+
+
+def _list_deltas(root):
+    path = os.path.join(root, DELTA_DIR)
+    if not os.path.isdir(path):
+        return []
+    return sorted(d for d in os.listdir(path) if d.startswith('d'))
+
+
+def _read_delta(path):
+    df = pd.DataFrame({'ts_code': np.load(os.path.join(path, 'ts_code.npy')),
+                       'trade_date': np.load(os.path.join(path, 'trade_date.npy'))})
+    for f in BAR_FIELDS:
+        df[f] = np.load(os.path.join(path, f'{f}.npy'))
+    return df
+
+
+def _prepare_bars(df):
+    """只保留存储的列，trade_date 统一为 datetime64，缺失字段补 nan"""
+    df = df[[c for c in df.columns if c in ('ts_code', 'trade_date') + BAR_FIELDS]].copy()
+    df['trade_date'] = _normalize_trade_date(df['trade_date'])
+    for f in BAR_FIELDS:
+        if f not in df.columns:
+            df[f] = np.nan
+    return df
+
+
+def _sorted_bars(df):
+    """去重（同一 ts_code+trade_date 保留靠后的行）并按 (ts_code, trade_date) 排序"""
+    return (df.drop_duplicates(['ts_code', 'trade_date'], keep='last')
+              .sort_values(['ts_code', 'trade_date'], kind='mergesort')
+              .reset_index(drop=True))
+
+
+def _code_offsets(df):
+    codes, starts = np.unique(df['ts_code'].to_numpy(dtype=str), return_index=True)
+    return codes.astype('<U12'), np.append(starts, len(df)).astype(np.int64)
+
+
+def _new_name(prefix):
+    return prefix + datetime.now().strftime('%Y%m%d%H%M%S%f')
+
+
+def write_bars(df, root=BAR_STORE_DIR):
+    """
+    把长表整体写成一个新版本并原子切换
+    :param df: 至少包含 ts_code、trade_date 以及 BAR_FIELDS 中的列
+    :return: 新版本目录名
+    """
+    df = _sorted_bars(_prepare_bars(df))
+    codes, offsets = _code_offsets(df)
+
+    os.makedirs(root, exist_ok=True)
+    version = _new_name('v')
+    tmp_path = os.path.join(root, f'.{version}.tmp')
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'codes.npy'), codes)
+    np.save(os.path.join(tmp_path, 'offsets.npy'), offsets)
+    np.save(os.path.join(tmp_path, 'trade_date.npy'), df['trade_date'].to_numpy(dtype='datetime64[ns]'))
+    for f in BAR_FIELDS:
+        np.save(os.path.join(tmp_path, f'{f}.npy'), df[f].to_numpy(dtype=np.float64))
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as fp:
+        json.dump({
+            'fields': list(BAR_FIELDS),
+            'rows': int(len(df)),
+            'codes': int(len(codes)),
+            'last_trade_date': df['trade_date'].max().strftime('%Y%m%d') if len(df) else None,
+        }, fp)
+    os.rename(tmp_path, os.path.join(root, version))
+
+    # 先写临时指针再 os.replace，保证 CURRENT 要么是旧版本要么是新版本
+    pointer_tmp = os.path.join(root, f'.CURRENT.{os.getpid()}')
+    with open(pointer_tmp, 'w') as f:
+        f.write(version)
+    previous = _read_current(root)
+    os.replace(pointer_tmp, os.path.join(root, 'CURRENT'))
+
+    # 旧版本已被内存映射的进程在 Linux 下仍可继续读取
+    if previous and previous != version:
+        shutil.rmtree(os.path.join(root, previous), ignore_errors=True)
+    return version
+
+
+def append_bars(df, root=BAR_STORE_DIR):
+    """
+    把新增行情写成一个增量段，不重写已有数据；打开存储时即可读到（同一 ts_code+trade_date 以新数据为准）
+    :return: 增量段目录名，df 为空时返回 None
+    """
+    if df is None or df.empty:
+        return None
+    df = _prepare_bars(df)
+    delta_root = os.path.join(root, DELTA_DIR)
+    os.makedirs(delta_root, exist_ok=True)
+    name = _new_name('d')
+    tmp_path = os.path.join(delta_root, f'.{name}.tmp')
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'ts_code.npy'), df['ts_code'].to_numpy(dtype='<U12'))
+    np.save(os.path.join(tmp_path, 'trade_date.npy'), df['trade_date'].to_numpy(dtype='datetime64[ns]'))
+    for f in BAR_FIELDS:
+        np.save(os.path.join(tmp_path, f'{f}.npy'), df[f].to_numpy(dtype=np.float64))
+    os.rename(tmp_path, os.path.join(delta_root, name))
+    return name
+
+
+def compact_bars(root=BAR_STORE_DIR):
+    """
+    把全部增量段合并成一个新版本并删除这些段，没有增量段时不写入
+    :return: 当前版本目录名
+    """
+    store = BarStore(root, mmap=False)
+    if not store.deltas:
+        return store.version
+    version = write_bars(store.to_frame(), root)
+    for d in store.deltas:
+        shutil.rmtree(os.path.join(root, DELTA_DIR, d), ignore_errors=True)
+    return version
+
+
+def import_csv_dir(csv_dir=CSV_DATA_DIR, root=BAR_STORE_DIR):
+    """一次性把旧的 data/{ts_code}.csv 迁移进列式存储"""
+    frames = []
+    for stock_file in sorted(os.listdir(csv_dir)):
+        if not stock_file.endswith('.csv'):
+            continue
+        df = pd.read_csv(os.path.join(csv_dir, stock_file), dtype={'trade_date': str})
+        df['ts_code'] = stock_file.replace('.csv', '')
+        frames.append(df)
+    if not frames:
+        return None
+    return write_bars(pd.concat(frames, ignore_index=True), root)
@@ -0,0 +1,96 @@
+import pandas as pd
+
+from bar_store import BarStore, append_bars, compact_bars, BAR_STORE_DIR
+from trade_calendar import load_calendar
+
+# ================== 增量同步 ==================
+# 每只股票的最后交易日由列式存储直接给出（BarStore.last_dates），
+# 同步时只补缺失区间：默认按交易日调用 pro.daily(trade_date=...)，一次拿到全市场当天行情，
+# 从最落后的股票的下一个交易日开始，中断后重跑不会留下缺口（已退市的股票不要放进 codes，否则起点停在退市日）；
+# 存储里还没有的股票再按 ts_code 回补历史。
+# 缺失区间按本地交易日历计算，周末、节假日以及已经是最新的股票不会产生接口调用。
+# 每 flush_every 次调用追加一个增量段（只写这一批），全部完成后再合并成新版本，全量数据只重写一次。
+
+
+def _next_open(calendar, date):
+    """date 之后的下一个交易日，超出日历范围时退回下一自然日"""
+    day = calendar.next_open(date)
+    if pd.isnull(day):
+        day = pd.Timestamp(date) + pd.Timedelta(days=1)
+    return pd.Timestamp(day).strftime('%Y%m%d')
+
+
+def get_open_days(pro, start_date, end_date, exchange='SSE'):
+    """获取区间内的交易日（'YYYYMMDD' 升序列表），使用本地交易日历"""
+    if start_date > end_date:
+        return []
+    return load_calendar(pro, exchange, end_date=end_date).open_days(start_date, end_date)
+
+
+def sync_daily_bars(pro, start_date, end_date, codes=None, root=BAR_STORE_DIR, by='trade_date', flush_every=20):
+    """
+    把列式存储增量更新到 end_date
+    :param pro: Tushare pro 接口对象
+    :param start_date: 存储为空或股票无历史时的起始日期
+    :param codes: 需要维护的股票代码，None 表示全市场
+    :param by: 'trade_date' 按交易日拉全市场；'ts_code' 按股票拉缺失区间
+    :param flush_every: 每累计多少次接口调用写一个增量段，中断后已落盘部分不必重拉
+    :return: 本次新增的行数
+    """
+    store = BarStore(root)
+    calendar = load_calendar(pro, end_date=end_date)
+    last_dates = store.last_dates().dt.strftime('%Y%m%d')
+    wanted = None if codes is None else set(codes)
+
+    frames = []
+    added = 0
+
+    def flush():
+        nonlocal frames, added
+        if not frames:
+            return
+        df = pd.concat(frames, ignore_index=True)
+        if wanted is not None:
+            df = df[df['ts_code'].isin(wanted)]
+        append_bars(df, root)
+        added += len(df)
+        frames = []
+
+    # 存储里没有的股票按 ts_code 回补
+    backfill = []
+    if by == 'ts_code':
+        backfill = sorted(wanted) if wanted is not None else last_dates.index.tolist()
+    elif len(last_dates) and wanted is not None:
+        backfill = sorted(wanted - set(last_dates.index))
+
+    for i, ts_code in enumerate(backfill, 1):
+        begin = _next_open(calendar, last_dates[ts_code]) if ts_code in last_dates.index else start_date
+        if not calendar.count(begin, end_date):
+            continue
+        print(f"补充数据：{ts_code} {begin}-{end_date}")
+        try:
+            frames.append(pro.daily(ts_code=ts_code, start_date=begin, end_date=end_date))
+        except Exception as e:
+            print(f"下载 {ts_code} 时出错: {e}")
+        if i % flush_every == 0:
+            flush()
+
+    if by == 'trade_date':
+        # 从需要维护的已存储股票中最落后的一只开始：上次按日同步中断时，本次回补的新股或之前已追平的股票
+        # 不会把起点推过其余股票的缺口（已追平股票的重复行在读取时去重）
+        stored = last_dates if wanted is None else last_dates[last_dates.index.isin(wanted)]
+        begin = _next_open(calendar, stored.min()) if len(stored) else start_date
+        for i, trade_date in enumerate(calendar.open_days(begin, end_date), 1):
+            print(f"同步交易日：{trade_date}")
+            try:
+                frames.append(pro.daily(trade_date=trade_date))
+            except Exception as e:
+                # 按日同步必须连续，出错即停止，下次从已落盘的最后一天继续
+                print(f"下载 {trade_date} 时出错: {e}")
+                break
+            if i % flush_every == 0:
+                flush()
+
+    flush()
+    compact_bars(root)
+    return added
@@ -0,0 +1,100 @@
+import contextlib
+import csv
+import multiprocessing as mp
+import os
+
+from bar_store import BarStore, BAR_STORE_DIR
+from param_sweep import run_once
+
+# ================== 全市场批量回测 ==================
+# 对单标的策略（Strategy_wave1、TurtleStrategy）逐只股票独立回测。
+# 各进程只打开一次列式存储，数组是内存映射，所有进程共享同一份页缓存，
+# 数据源直接读取这些数组（SharedBarData），不为每只股票构造 DataFrame；
+# 每只股票完成后立即追加到结果文件，中途中断后重跑会跳过已完成的股票。
+
+BATCH_RESULT_FILE = 'batch_results.csv'
+RESULT_FIELDS = ['ts_code', 'bars', 'final_value', 'net_profit', 'trades', 'won', 'win_rate', 'max_drawdown',
+                 'max_drawdown_len', 'sharpe', 'sortino', 'turnover', 'error']
+INSUFFICIENT_BARS = 'insufficient bars'  # 数据不足，重跑也不会变，按已完成处理
+
+_STORE = None
+
+
+def _init_worker(root):
+    global _STORE
+    _STORE = BarStore(root)
+
+
+def _run_ticker(task):
+    ts_code, strategy, params, start_date, end_date, min_bars, quiet, kwargs = task
+    row = {'ts_code': ts_code}
+    try:
+        lo, hi = _STORE._bounds(ts_code, start_date, end_date)
+        row['bars'] = hi - lo
+        if hi - lo < min_bars:
+            row['error'] = INSUFFICIENT_BARS
+            return row
+        # 批量模式下屏蔽策略的逐笔打印
+        with open(os.devnull, 'w') as devnull:
+            with contextlib.redirect_stdout(devnull) if quiet else contextlib.nullcontext():
+                row.update(run_once(strategy, _STORE, params, codes=[ts_code], start_date=start_date,
+                                    end_date=end_date, **kwargs))
+    except Exception as e:
+        row['error'] = repr(e)
+    return row
+
+
+def _finished_codes(out_file):
+    # 出错的股票（如临时的读写异常）不算完成，续跑时重试，成功后追加新的一行
+    if not os.path.exists(out_file):
+        return set()
+    with open(out_file, newline='') as f:
+        return {row['ts_code'] for row in csv.DictReader(f) if row.get('error') in (None, '', INSUFFICIENT_BARS)}
+
+
+def _existing_fields(out_file):
+    # 续跑旧版本生成的结果文件时沿用它的表头，新增的列不写入
+    with open(out_file, newline='') as f:
+        return next(csv.reader(f), None) or RESULT_FIELDS
+
+
+def run_batch(strategy, codes=None, params=None, start_date=None, end_date=None, root=BAR_STORE_DIR,
+              out_file=BATCH_RESULT_FILE, processes=None, min_bars=30, quiet=True, **kwargs):
+    """
+    用进程池对每只股票单独跑一次策略，结果逐行写入 CSV
+    :param codes: 股票列表，None 表示存储中的全部股票
+    :param params: 策略参数
+    :param kwargs: 透传给 run_once（cash、commission、coc、sizer、indicator_cache）
+    :return: 本次完成的股票数
+    """
+    if codes is None:
+        codes = BarStore(root).codes.tolist()
+    finished = _finished_codes(out_file)
+    codes = [c for c in codes if c not in finished]
+    if finished:
+        print(f"已完成 {len(finished)} 只，剩余 {len(codes)} 只")
+
+    tasks = [(c, strategy, params, start_date, end_date, min_bars, quiet, kwargs) for c in codes]
+    processes = processes or os.cpu_count()
+    write_header = not os.path.exists(out_file) or os.path.getsize(out_file) == 0
+
+    done = 0
+    with open(out_file, 'a', newline='') as f, mp.Pool(processes, initializer=_init_worker, initargs=(root,)) as pool:
+        fields = RESULT_FIELDS if write_header else _existing_fields(out_file)
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        if write_header:
+            writer.writeheader()
+        for row in pool.imap_unordered(_run_ticker, tasks, chunksize=4):
+            writer.writerow(row)
+            f.flush()
+            done += 1
+            if done % 100 == 0:
+                print(f"进度 {done}/{len(tasks)}")
+    return done
+
+
+if __name__ == '__main__':
+    from wave_strategy import Strategy_wave1
+
+    run_batch(Strategy_wave1, params={'smoothing_period': 5}, start_date='20240101',
+              out_file='wave_batch_results.csv', cash=2000, coc=True)
@@ -0,0 +1,185 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import backtrader as bt
+
+from bar_store import BarStore, PandasBarData, write_bars
+from limit_price import add_limit_prices
+from shared_feed import SharedBarData
+from signal_scan import scan_limit_up_pullback
+from synthetic import generate_bars, generate_stock_basic
+
+# ================== 基准测试 ==================
+# 在 synthetic 生成的确定性行情上计时数据加载、涨跌停计算、信号扫描和各策略回测，
+# 结果写成 JSON（含环境和参数），可用 --baseline 与上一次结果对比，变慢超过容差时返回非零退出码。
+#   python benchmark.py --codes 500 --years 2 --out bench.json
+#   python benchmark.py --codes 500 --years 2 --baseline bench.json
+
+BENCH_CASES = ('generate', 'write_store', 'open_store', 'to_frame', 'pandas_feeds', 'limit_prices', 'scan',
+               'limitup', 'turtle', 'wave')
+
+
+def _timed(func, repeat):
+    """重复 repeat 次取最短耗时，返回 (秒, 最后一次的返回值)"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _run_cerebro(strategy, feeds, cash, coc=False, **params):
+    cerebro = bt.Cerebro(stdstats=False)
+    for feed in feeds:
+        cerebro.adddata(feed)
+    cerebro.addstrategy(strategy, **params)
+    if coc:
+        cerebro.broker = bt.brokers.BackBroker(coc=True)
+    cerebro.broker.setcash(cash)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        cerebro.run()
+    return cerebro.broker.getvalue()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _bench_store(root, bars, st_codes, add, cases, repeat, bt_codes, single_codes):
+    """打开 root 下的列式存储计时；store 只在本函数内引用，返回后内存映射随之释放，临时目录才能删除"""
+    from limit_up_decrease_gpt import LimitUpStrategy
+    from TurtleStrategy import TurtleStrategy
+    from wave_strategy import Strategy_wave1
+
+    seconds, store = _timed(lambda: BarStore(root), repeat)
+    if 'open_store' in cases:
+        add('open_store', seconds, len(bars))
+    codes = store.codes.tolist()
+
+    if 'to_frame' in cases:
+        seconds, _ = _timed(store.to_frame, repeat)
+        add('to_frame', seconds, len(bars))
+    if 'pandas_feeds' in cases:
+        seconds, _ = _timed(lambda: [PandasBarData(dataname=store.get(c)) for c in codes], repeat)
+        add('pandas_feeds', seconds, len(bars))
+    if 'limit_prices' in cases:
+        seconds, _ = _timed(lambda: add_limit_prices(bars.copy(), is_st=st_codes), repeat)
+        add('limit_prices', seconds, len(bars))
+    if 'scan' in cases:
+        seconds, _ = _timed(lambda: scan_limit_up_pullback(bars), repeat)
+        add('scan', seconds, len(bars))
+
+    def feeds(names):
+        return [SharedBarData(store=store, ts_code=c, name=c) for c in names]
+
+    if 'limitup' in cases:
+        names = codes[:bt_codes]
+        rows = sum(len(store.arrays(c)['close']) for c in names)
+        candidates = scan_limit_up_pullback(store.to_frame(names))
+        seconds, _ = _timed(lambda: _run_cerebro(LimitUpStrategy, feeds(names), 1000000,
+                                                 candidates=candidates), repeat)
+        add('limitup', seconds, rows)
+
+    singles = codes[:single_codes]
+    rows = sum(len(store.arrays(c)['close']) for c in singles)
+    if 'turtle' in cases:
+        seconds, _ = _timed(lambda: [_run_cerebro(TurtleStrategy, feeds([c]), 100000) for c in singles], repeat)
+        add('turtle', seconds, rows)
+    if 'wave' in cases:
+        seconds, _ = _timed(lambda: [_run_cerebro(Strategy_wave1, feeds([c]), 2000, coc=True)
+                                     for c in singles], repeat)
+        add('wave', seconds, rows)
+
+
+def run_benchmarks(n_codes=100, years=1, seed=0, repeat=1, bt_codes=50, single_codes=5, cases=BENCH_CASES):
+    """
+    :param bt_codes: LimitUpStrategy 回测使用的股票数上限（backtrader 逐根推进，全市场很慢）
+    :param single_codes: TurtleStrategy、Strategy_wave1 逐只回测的股票数
+    :return: 结果字典（meta + results 列表）
+    """
+    results = []
+
+    def add(name, seconds, rows):
+        results.append({'name': name, 'seconds': round(seconds, 6), 'rows': int(rows),
+                        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None})
+        print(f"{name:<14} {seconds:9.4f}s  {rows:>10} 行  {rows / seconds if seconds > 0 else 0:>14,.0f} 行/秒")
+
+    seconds, bars = _timed(lambda: generate_bars(n_codes, years, seed), repeat)
+    if 'generate' in cases:
+        add('generate', seconds, len(bars))
+    basic = generate_stock_basic(n_codes, years, seed)
+    st_codes = set(basic.loc[basic['name'].str.contains('ST'), 'ts_code'])
+
+    with tempfile.TemporaryDirectory() as root:
+        seconds, _ = _timed(lambda: write_bars(bars, root), repeat)
+        if 'write_store' in cases:
+            add('write_store', seconds, len(bars))
+        _bench_store(root, bars, st_codes, add, cases, repeat, bt_codes, single_codes)
+
+    return {
+        'meta': {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'n_codes': n_codes, 'years': years, 'seed': seed, 'repeat': repeat,
+            'bt_codes': bt_codes, 'single_codes': single_codes,
+            'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'backtrader': bt.__version__,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance=1.2):
+    """逐项对比耗时，返回变慢超过 tolerance 倍的项目"""
+    base = {r['name']: r['seconds'] for r in baseline['results']}
+    slower = []
+    for r in current['results']:
+        if r['name'] not in base or not base[r['name']]:
+            continue
+        ratio = r['seconds'] / base[r['name']]
+        flag = '  <-- 变慢' if ratio > tolerance else ''
+        print(f"{r['name']:<14} {base[r['name']]:9.4f}s -> {r['seconds']:9.4f}s  x{ratio:.2f}{flag}")
+        if ratio > tolerance:
+            slower.append(r['name'])
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='合成数据上的基准测试')
+    parser.add_argument('--codes', type=int, default=100, help='股票数（1 ~ 5000）')
+    parser.add_argument('--years', type=float, default=1, help='年数（1 ~ 20）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='每项重复次数，取最短耗时')
+    parser.add_argument('--bt-codes', type=int, default=50)
+    parser.add_argument('--single-codes', type=int, default=5)
+    parser.add_argument('--cases', nargs='+', choices=BENCH_CASES, default=list(BENCH_CASES))
+    parser.add_argument('--out', help='结果 JSON 文件')
+    parser.add_argument('--baseline', help='对比的历史结果 JSON')
+    parser.add_argument('--tolerance', type=float, default=1.2)
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.codes, args.years, args.seed, args.repeat, args.bt_codes, args.single_codes,
+                            args.cases)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            slower = compare(report, json.load(f), args.tolerance)
+        if slower:
+            sys.exit(1)
@@ -0,0 +1,192 @@
+import glob
+import os
+import pickle
+
+import backtrader as bt
+from backtrader.order import Order
+
+# ================== 回测检查点 ==================
+# 长时间的全市场回测每 every 根 K 线把状态写一次检查点，回测结束时再写一次：
+#   日期、现金、各股票持仓（数量、成本）、未成交订单，以及策略 checkpoint_state 中列出的属性
+#   （如 stock_status、positions_count、unit、stack），文件为 root/ckpt_YYYYMMDD.pkl，保留最近 keep 个。
+# 恢复时数据源从检查点前 RESUME_WARMUP 个交易日开始加载，只用于指标预热：
+# resumable() 包装后的策略在检查点日期之前不执行 next()，到检查点那根 K 线恢复现金、持仓和策略状态，
+# 并重新提交当时未成交的订单，之后的行为与不中断一致。
+# 回测结束时写入的检查点也可用于每日增量：延长 end_date 后 resume，只模拟新增的交易日。
+# 注意：恢复前建立的持仓在 TradeAnalyzer 等交易统计中不是完整的一笔交易；订单的有效期不保存。
+
+CHECKPOINT_DIR = 'data/checkpoints'
+CHECKPOINT_EVERY = 20  # 每多少根 K 线写一次
+CHECKPOINT_KEEP = 3
+RESUME_WARMUP = 30  # 恢复时在检查点之前多加载的交易日数
+
+
+def _data_key(strategy, data):
+    # 有名称的数据源按名称对应，单个未命名的数据源按下标
+    return data._name or strategy.datas.index(data)
+
+
+def _find_data(strategy, key):
+    if isinstance(key, int):
+        return strategy.datas[key]
+    data = strategy.getdatabyname(key) if key in strategy.dnames else None
+    if data is None:
+        raise ValueError(f"检查点中的 {key} 不在本次回测的数据源中")
+    return data
+
+
+def _base_name(strategy):
+    return getattr(strategy, '_resume_base', type(strategy)).__name__
+
+
+def snapshot(strategy):
+    """当前 K 线结束时的回测状态（在策略 next() 之后调用）"""
+    broker = strategy.broker
+    orders = []
+    # 本根 K 线新下的订单还在 submitted 队列，之前的在 pending 队列
+    for order in list(getattr(broker, 'submitted', ())) + list(broker.get_orders_open()):
+        if not order.alive():
+            continue
+        orders.append({
+            'data': _data_key(strategy, order.data),
+            'size': order.executed.remsize,  # 买入为正，卖出为负
+            'exectype': order.exectype,
+            'price': None if order.exectype == Order.Market else order.created.price,
+            'plimit': order.created.pricelimit,
+        })
+    return {
+        'strategy': _base_name(strategy),
+        'date': strategy.datetime.date(0),
+        'cash': broker.get_cash(),
+        'value': broker.get_value(),
+        'positions': {_data_key(strategy, d): (pos.size, pos.price)
+                      for d in strategy.datas for pos in [broker.getposition(d)] if pos.size},
+        'orders': orders,
+        'state': {name: getattr(strategy, name) for name in getattr(strategy, 'checkpoint_state', ())
+                  if hasattr(strategy, name)},
+    }
+
+
+def restore(strategy, state):
+    """把 snapshot() 的结果恢复到策略和 broker 上"""
+    if state['strategy'] != _base_name(strategy):
+        raise ValueError(f"检查点属于 {state['strategy']}，不能恢复到 {_base_name(strategy)}")
+    broker = strategy.broker
+    broker.cash = state['cash']
+    for key, (size, price) in state['positions'].items():
+        broker.getposition(_find_data(strategy, key)).set(size, price)
+    for name, value in state['state'].items():
+        current = getattr(strategy, name, None)
+        if isinstance(current, dict) and isinstance(value, dict):
+            # 按股票的状态字典合并：延长区间后新上市的股票保留 __init__ 中的初值
+            current.update(value)
+        else:
+            setattr(strategy, name, value)
+    for order in state['orders']:
+        data = _find_data(strategy, order['data'])
+        submit = strategy.buy if order['size'] > 0 else strategy.sell
+        submit(data=data, size=abs(order['size']), exectype=order['exectype'], price=order['price'],
+               plimit=order['plimit'])
+
+
+def save_checkpoint(state, root=CHECKPOINT_DIR, keep=CHECKPOINT_KEEP):
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f"ckpt_{state['date'].strftime('%Y%m%d')}.pkl")
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    for old in sorted(glob.glob(os.path.join(root, 'ckpt_*.pkl')))[:-keep]:
+        os.remove(old)
+    return path
+
+
+def load_checkpoint(root=CHECKPOINT_DIR):
+    """最近的检查点，没有时返回 None"""
+    paths = sorted(glob.glob(os.path.join(root, 'ckpt_*.pkl')))
+    if not paths:
+        return None
+    with open(paths[-1], 'rb') as f:
+        return pickle.load(f)
+
+
+def resume_start(state, start_date, calendar, warmup=RESUME_WARMUP):
+    """
+    恢复时数据源的起始日期（'YYYYMMDD'）：检查点前 warmup 个交易日，不早于原 start_date
+    检查点没有日期（或为 NaT）、预热区间超出日历范围时退回 start_date
+    :param calendar: trade_calendar.TradeCalendar
+    """
+    import pandas as pd
+
+    date = state.get('date') if state is not None else None
+    if date is None or pd.isnull(date):
+        return start_date
+    warm = calendar.offset(pd.Timestamp(date).strftime('%Y%m%d'), -warmup)
+    if pd.isnull(warm):
+        return start_date
+    return max(pd.Timestamp(warm).strftime('%Y%m%d'), start_date)
+
+
+def _guarded(base, method):
+    def wrapper(self):
+        state = self.p.resume
+        if state is not None and not self._restored:
+            date = self.datetime.date(0)
+            if date < state['date']:
+                return  # 预热阶段，只推进指标
+            restore(self, state)
+            self._restored = True
+            if date == state['date']:
+                return  # 检查点那根 K 线已经处理过
+        getattr(base, method)(self)
+    return wrapper
+
+
+def resumable(strategy_cls):
+    """
+    包装策略类，增加 resume 参数（load_checkpoint 的结果）；resume 为 None 时与原策略相同
+    """
+    return type(strategy_cls.__name__, (strategy_cls,), {
+        'params': (('resume', None),),
+        '_resume_base': strategy_cls,
+        '_restored': False,
+        'next': _guarded(strategy_cls, 'next'),
+        'prenext': _guarded(strategy_cls, 'prenext'),
+    })
+
+
+class Checkpointer(bt.Analyzer):
+    """每 every 根 K 线和回测结束时写检查点"""
+    params = (
+        ('root', CHECKPOINT_DIR),
+        ('every', CHECKPOINT_EVERY),
+        ('keep', CHECKPOINT_KEEP),
+    )
+
+    def start(self):
+        self._bars = 0
+        self.last_path = None
+
+    def _ready(self):
+        # 恢复中的策略在回到检查点之前不写
+        return self.strategy.p.__dict__.get('resume') is None or self.strategy._restored
+
+    def prenext(self):
+        self.next()
+
+    def next(self):
+        if not self._ready():
+            return
+        self._bars += 1
+        if self._bars % self.p.every == 0:
+            self.save()
+
+    def stop(self):
+        if self._ready() and len(self.strategy):
+            self.save()
+
+    def save(self):
+        self.last_path = save_checkpoint(snapshot(self.strategy), self.p.root, self.p.keep)
+
+    def get_analysis(self):
+        return {'last_checkpoint': self.last_path}
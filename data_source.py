@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+
+# ================== 行情数据源 ==================
+# 所有脚本通过 get_pro() 取得 pro 接口对象，由环境变量 STRATEGY_DATA_SOURCE 选择后端：
+#   live       直接调用 Tushare（默认）
+#   record     调用 Tushare，同时把每次请求的返回保存到 data/replay/
+#   replay     只从 data/replay/ 读取录制结果，不联网；读过的结果留在内存
+#   synthetic  由 synthetic 模块生成确定性行情，不需要 token，也不需要录制
+# 录制文件以 (接口名, 参数) 的哈希命名，同样的调用在 replay 时得到同样的 DataFrame。
+# 脚本在模块级使用 lazy_pro()：导入时不加载 tushare、pandas，也不创建客户端，第一次调用接口时才初始化。
+
+TUSHARE_TOKEN = os.environ.get('TUSHARE_TOKEN', '0ff27db3b933751cc13e959f62e7147d441325b4fdc2a4fd1b0aacfe')
+DATA_SOURCE_ENV = 'STRATEGY_DATA_SOURCE'
+REPLAY_DIR = 'data/replay'
+
+_PRO = {}  # 后端名 -> pro 对象
+
+
+def _request_key(api_name, kwargs):
+    payload = json.dumps([api_name, kwargs], sort_keys=True, ensure_ascii=False, default=str)
+    return f"{api_name}_{hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]}"
+
+
+class RecordingPro:
+    """包装真实的 pro 对象，返回结果的同时保存到本地"""
+
+    def __init__(self, pro, root=REPLAY_DIR):
+        self._pro = pro
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def __getattr__(self, api_name):
+        api = getattr(self._pro, api_name)
+
+        def call(**kwargs):
+            df = api(**kwargs)
+            path = os.path.join(self.root, _request_key(api_name, kwargs) + '.pkl')
+            tmp_path = path + '.tmp'
+            df.to_pickle(tmp_path)
+            os.replace(tmp_path, path)
+            return df
+        return call
+
+
+class ReplayPro:
+    """回放 RecordingPro 录制的结果；未录制的调用抛出 LookupError"""
+
+    def __init__(self, root=REPLAY_DIR):
+        self.root = root
+        self._cache = {}
+
+    def __getattr__(self, api_name):
+        if api_name.startswith('_'):
+            raise AttributeError(api_name)
+
+        def call(**kwargs):
+            key = _request_key(api_name, kwargs)
+            if key not in self._cache:
+                path = os.path.join(self.root, key + '.pkl')
+                if not os.path.exists(path):
+                    raise LookupError(f"没有录制 {api_name}({kwargs})，请先用 {DATA_SOURCE_ENV}=record 运行一次")
+                import pandas as pd
+                self._cache[key] = pd.read_pickle(path)
+            return self._cache[key].copy()
+        return call
+
+
+def get_pro(source=None):
+    """
+    按 source（默认读环境变量 STRATEGY_DATA_SOURCE）返回 pro 对象，同一后端只创建一次
+    """
+    source = source or os.environ.get(DATA_SOURCE_ENV, 'live')
+    if source not in _PRO:
+        if source in ('live', 'record'):
+            import tushare as ts
+            ts.set_token(TUSHARE_TOKEN)
+            pro = ts.pro_api()
+            _PRO[source] = RecordingPro(pro) if source == 'record' else pro
+        elif source == 'replay':
+            _PRO[source] = ReplayPro()
+        elif source == 'synthetic':
+            from synthetic import SyntheticPro
+            _PRO[source] = SyntheticPro()
+        else:
+            raise ValueError(f"未知的数据源 {source}，可选 live、record、replay、synthetic")
+    return _PRO[source]
+
+
+class LazyPro:
+    """第一次访问接口时才调用 get_pro()，可以直接当 pro 对象使用"""
+
+    def __init__(self, source=None):
+        self._source = source
+
+    def __getattr__(self, api_name):
+        if api_name.startswith('_'):
+            raise AttributeError(api_name)
+        return getattr(get_pro(self._source), api_name)
+
+
+def lazy_pro(source=None):
+    """
+    脚本模块级使用的 pro 对象，后端由 STRATEGY_DATA_SOURCE 选择（live/record/replay/synthetic，见 get_pro）
+    第一次调用接口时才创建客户端：只导入策略类（profiler、benchmark、批量回测的子进程）时
+    不加载 tushare/pandas，也不需要 token；pandas、numpy 和数据层模块由脚本在用到的函数里导入
+    """
+    return LazyPro(source)
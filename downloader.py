@@ -0,0 +1,164 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from bar_store import append_bars, compact_bars, BAR_STORE_DIR
+
+# ================== 并发限速下载 ==================
+# Tushare 按每分钟调用次数限流，网络往返才是瓶颈，所以用线程池并发请求，
+# 再用令牌桶把总调用速率压在配额以内；失败按指数退避重试，完成进度写入文件，中断后可续传。
+
+MAX_WORKERS = 4  # 并发线程数
+CALLS_PER_MINUTE = 480  # 略低于 pro.daily 每分钟 500 次的配额
+PROGRESS_FILE = 'data/download_progress_{start_date}_{end_date}.txt'  # 按下载区间区分进度
+
+
+class TokenBucket:
+    """线程安全的令牌桶限速器"""
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，取不到就等待"""
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+def load_progress(progress_file):
+    """读取已完成的任务键"""
+    if not progress_file or not os.path.exists(progress_file):
+        return set()
+    with open(progress_file) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def _mark_progress(progress_file, keys):
+    if not progress_file or not keys:
+        return
+    folder = os.path.dirname(progress_file)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(progress_file, 'a') as f:
+        f.write(''.join(f'{k}\n' for k in keys))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def download(keys, fetch, max_workers=MAX_WORKERS, calls_per_minute=CALLS_PER_MINUTE, retries=3, backoff=1.0,
+             progress_file=None, on_result=None, on_flush=None, flush_every=100, limiter=None, sleep=time.sleep):
+    """
+    并发执行 fetch(key)，总调用速率受令牌桶限制
+    :param keys: 任务键（如 ts_code 或 trade_date）
+    :param fetch: 单次接口调用，抛异常时按 backoff * 2**n 秒退避重试
+    :param progress_file: 进度文件，已记录的键直接跳过
+    :param on_result: 结果回调 on_result(key, value)，在主线程中执行；为 None 时结果随返回值带回
+    :param on_flush: 每完成 flush_every 个任务调用一次，返回后这些键才写入进度文件
+    :return: (results, failed) 两个字典，failed 记录重试耗尽后的异常
+    """
+    keys = list(keys)  # 可能是生成器，下面要遍历后再取长度
+    done = load_progress(progress_file)
+    pending = [k for k in keys if str(k) not in done]
+    if len(done):
+        print(f"已完成 {len(keys) - len(pending)} 个，剩余 {len(pending)} 个")
+    limiter = limiter or TokenBucket(calls_per_minute)
+
+    def task(key):
+        for attempt in range(retries + 1):
+            limiter.acquire()
+            try:
+                return fetch(key)
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                print(f"{key} 第{attempt + 1}次请求失败: {e}，重试中")
+                sleep(backoff * 2 ** attempt)
+
+    results, failed = {}, {}
+    unflushed = []
+
+    def flush():
+        if on_flush is not None:
+            on_flush()
+        _mark_progress(progress_file, unflushed)
+        unflushed.clear()
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(task, k): k for k in pending}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                value = future.result()
+            except Exception as e:
+                print(f"下载 {key} 时出错: {e}")
+                failed[key] = e
+                continue
+            if on_result is not None:
+                on_result(key, value)
+            else:
+                results[key] = value
+            unflushed.append(str(key))
+            if len(unflushed) >= flush_every:
+                flush()
+        flush()
+    finally:
+        # Ctrl-C 等异常时丢弃尚未开始的任务，已落盘的进度保留
+        executor.shutdown(wait=True, cancel_futures=True)
+    return results, failed
+
+
+def download_daily_bars(pro, codes, start_date, end_date, root=BAR_STORE_DIR, fetch=None,
+                        progress_file=None, calendar=None, **kwargs):
+    """
+    按股票并发下载日线并分批写入列式存储
+    :param fetch: 自定义单只股票的获取函数 fetch(ts_code) -> DataFrame，默认直接调用 pro.daily
+    :param calendar: TradeCalendar，传入时起止日期收缩到区间内的首尾交易日，区间内没有交易日则不发请求
+    :return: 下载失败的股票代码
+    """
+    if calendar is not None:
+        days = calendar.open_days(start_date, end_date)
+        if not days:
+            return []
+        start_date, end_date = days[0], days[-1]
+    if progress_file is None:
+        progress_file = PROGRESS_FILE.format(start_date=start_date, end_date=end_date)
+    if fetch is None:
+        def fetch(ts_code):
+            return pro.daily(ts_code=ts_code, start_date=start_date, end_date=end_date)
+
+    frames = []
+
+    def on_result(ts_code, df):
+        if df is None or df.empty:
+            return
+        if 'trade_date' not in df.columns:
+            df = df.reset_index()
+        frames.append(df)
+
+    def on_flush():
+        if frames:
+            append_bars(pd.concat(frames, ignore_index=True), root)
+            frames.clear()
+
+    _, failed = download(codes, fetch, progress_file=progress_file, on_result=on_result, on_flush=on_flush, **kwargs)
+    # 每批只追加了增量段，结束时合并一次
+    compact_bars(root)
+    return list(failed)
@@ -0,0 +1,157 @@
+import json
+import os
+import queue
+import threading
+
+import backtrader as bt
+
+# ================== 事件记录 ==================
+# 订单、成交、平仓和净值按结构化事件记录，代替逐条 print。
+# record() 只做级别判断和 list.append，攒够 batch_size 条整批交给后台线程写盘：
+#   *.jsonl    每批一次 write
+#   *.parquet  每种事件一个文件（需要 pyarrow），每批追加一个 row group
+# 级别低于设定值的事件在入口直接返回，关闭时（level='off'）几乎没有开销。
+
+LEVELS = {'debug': 10, 'info': 20, 'trade': 30, 'off': 100}
+BATCH_SIZE = 1000
+
+
+class EventRecorder:
+    """带缓冲的事件记录器，用作上下文管理器或手动 close()"""
+
+    def __init__(self, path, level='info', batch_size=BATCH_SIZE):
+        """
+        :param path: 输出文件，.parquet 结尾时按事件类型分别写 parquet，否则写 JSONL
+        :param level: 'debug'（逐根 K 线的细节）、'info'（订单、净值）、'trade'（仅成交和平仓）或 'off'
+        """
+        self.path = path
+        self.level = LEVELS[level]
+        self.batch_size = batch_size
+        self._buffer = []
+        self._queue = queue.Queue(maxsize=16)  # 写盘跟不上时阻塞记录方，限制内存
+        self._writers = {}
+        self._parquet = path.endswith('.parquet')
+        self._error = None
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not self._parquet:
+            self._file = open(path, 'w', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='event-writer', daemon=True)
+        self._thread.start()
+
+    def enabled(self, level='info'):
+        return LEVELS[level] >= self.level
+
+    def record(self, kind, level='info', **fields):
+        """记录一条事件，fields 需可 JSON 序列化（日期等会转成字符串）"""
+        if LEVELS[level] < self.level:
+            return
+        fields['kind'] = kind
+        self._buffer.append(fields)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def log(self, dt, txt, *args, level='info'):
+        """策略 log() 的文本消息，txt 可以是 % 格式串，级别不够时不做格式化和字符串转换"""
+        if LEVELS[level] < self.level:
+            return
+        self.record('log', level, date=dt, text=txt % args if args else str(txt))
+
+    def flush(self):
+        if self._buffer:
+            self._queue.put(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        if self._parquet:
+            for writer in self._writers.values():
+                writer.close()
+        else:
+            self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- 后台写盘 ----------
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self._error is not None:
+                continue  # 出错后丢弃剩余批次，close() 时抛出
+            try:
+                if self._parquet:
+                    self._write_parquet(batch)
+                else:
+                    self._file.write(''.join(json.dumps(e, ensure_ascii=False, default=str) + '\n' for e in batch))
+            except Exception as e:
+                self._error = e
+
+    def _write_parquet(self, batch):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        by_kind = {}
+        for e in batch:
+            by_kind.setdefault(e['kind'], []).append({k: (str(v) if k == 'date' else v) for k, v in e.items()})
+        for kind, rows in by_kind.items():
+            writer = self._writers.get(kind)
+            if writer is None:
+                table = pa.Table.from_pylist(rows)
+                path = f'{self.path[:-len(".parquet")]}.{kind}.parquet'
+                writer = self._writers[kind] = pq.ParquetWriter(path, table.schema)
+            else:
+                table = pa.Table.from_pylist(rows, schema=writer.schema)
+            writer.write_table(table)
+
+
+class EventAnalyzer(bt.Analyzer):
+    """把订单、成交、平仓和每根 K 线的净值写入 EventRecorder，策略本身无需改动"""
+    params = (
+        ('recorder', None),
+        ('equity_every', 1),  # 每隔多少根 K 线记录一次净值
+    )
+
+    def start(self):
+        self._rec = self.p.recorder
+        self._bars = 0
+
+    def notify_order(self, order):
+        rec = self._rec
+        # 市价单没有委托价记为 NaN，0.0 是合法价格要原样保留
+        price = float('nan') if order.created.price is None else order.created.price
+        if order.status in (order.Submitted, order.Accepted):
+            if rec.enabled('debug'):
+                rec.record('order', 'debug', date=self.strategy.datetime.date(0), ref=order.ref,
+                           ts_code=order.data._name, side='buy' if order.isbuy() else 'sell',
+                           status=order.getstatusname(), size=order.created.size, price=price)
+        elif order.status == order.Completed:
+            rec.record('fill', 'trade', date=self.strategy.datetime.date(0), ref=order.ref,
+                       ts_code=order.data._name, side='buy' if order.isbuy() else 'sell',
+                       size=order.executed.size, price=order.executed.price,
+                       value=order.executed.value, commission=order.executed.comm)
+        else:
+            rec.record('order', 'info', date=self.strategy.datetime.date(0), ref=order.ref,
+                       ts_code=order.data._name, side='buy' if order.isbuy() else 'sell',
+                       status=order.getstatusname(), size=order.created.size, price=price)
+
+    def notify_trade(self, trade):
+        if trade.isclosed:
+            self._rec.record('trade', 'trade', date=self.strategy.datetime.date(0), ref=trade.ref,
+                             ts_code=trade.data._name, pnl=trade.pnl, pnlcomm=trade.pnlcomm, barlen=trade.barlen)
+
+    def next(self):
+        self._bars += 1
+        if self._bars % self.p.equity_every == 0 and self._rec.enabled('info'):
+            broker = self.strategy.broker
+            self._rec.record('equity', 'info', date=self.strategy.datetime.date(0),
+                             value=broker.getvalue(), cash=broker.getcash())
@@ -0,0 +1,174 @@
+import hashlib
+import math
+import os
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+import backtrader as bt
+
+from streaming_indicators import WilderATR
+
+# ================== 指标缓存 ==================
+# 参数寻优、批量回测里同一只股票的同一个指标（SMA/Highest/Lowest/ATR + 周期）会被反复计算。
+# IndicatorCache 以“输入数组指纹 + 指标名 + 周期”为键缓存指标结果：
+#   内存中按 LRU 保留最近使用的 max_entries 个，计算结果同时写入 root 目录下的 .npy，
+#   其他进程或下一次运行命中磁盘后直接加载，每个唯一组合只计算一次。
+# 策略在 __init__ 中通过 cache.sma(...) 等取得 PrecomputedLine，用法与原指标相同；
+# 数据未预加载（preload=False、实盘）时拿不到完整数组，自动退回 backtrader 原指标。
+# 计算公式与 backtrader 逐项一致（SMA 用 fsum、ATR 同样的初值和平滑），缓存前后回测结果相同。
+#   cache = IndicatorCache()
+#   run_sweep(Strategy_wave1, panel, grid, indicator_cache=cache)
+
+INDICATOR_CACHE_DIR = 'data/indicator_cache'
+CACHE_ENTRIES = 512
+
+_CACHES = {}  # (root, max_entries) -> 本进程的 IndicatorCache
+
+
+def get_cache(root=INDICATOR_CACHE_DIR, max_entries=CACHE_ENTRIES):
+    """本进程内同一 root 共用一个缓存；IndicatorCache 反序列化时也走这里，子进程的内存缓存跨任务保留"""
+    key = (root, max_entries)
+    if key not in _CACHES:
+        _CACHES[key] = IndicatorCache(root, max_entries)
+    return _CACHES[key]
+
+
+class PrecomputedLine(bt.Indicator):
+    """把预先算好的数组当作指标输出，minperiod 与被替代的指标一致"""
+    lines = ('value',)
+    params = (
+        ('values', None),  # 与数据源逐根对齐的 float64 数组
+        ('period', 1),  # 原指标的 minperiod
+    )
+
+    def __init__(self):
+        self.addminperiod(self.p.period)
+
+    def next(self):
+        self.lines.value[0] = self.p.values[len(self) - 1]
+
+    def once(self, start, end):
+        dst = np.frombuffer(self.lines.value.array, dtype=np.float64)
+        dst[start:end] = self.p.values[start:end]
+
+
+def _line_values(line):
+    """预加载后 line 的完整数组（不拷贝）；未预加载返回 None"""
+    buf = getattr(line, 'array', None)
+    n = line.buflen() if buf is not None else 0
+    if not isinstance(buf, array) or not n:
+        return None
+    return np.frombuffer(buf, dtype=np.float64, count=n)
+
+
+def _fingerprint(*values):
+    h = hashlib.blake2b(digest_size=12)
+    for v in values:
+        h.update(len(v).to_bytes(8, 'little'))
+        h.update(v.data)
+    return h.hexdigest()
+
+
+def sma_values(x, period):
+    """与 bt.indicators.SMA 相同：每个窗口 math.fsum / period"""
+    out = np.full(len(x), np.nan)
+    values = x.tolist()
+    for i in range(period - 1, len(values)):
+        out[i] = math.fsum(values[i - period + 1:i + 1]) / period
+    return out
+
+
+def rolling_values(x, period, func):
+    out = np.full(len(x), np.nan)
+    if len(x) >= period:
+        out[period - 1:] = func(np.lib.stride_tricks.sliding_window_view(x, period), axis=1)
+    return out
+
+
+def atr_values(high, low, close, period):
+    """与 bt.indicators.ATR 相同，逐根复用 streaming_indicators.WilderATR"""
+    atr = WilderATR(period)
+    update = atr.update
+    return np.array([update(h, l, c) for h, l, c in zip(high.tolist(), low.tolist(), close.tolist())])
+
+
+class IndicatorCache:
+    def __init__(self, root=INDICATOR_CACHE_DIR, max_entries=CACHE_ENTRIES):
+        """
+        :param root: 落盘目录，None 表示只用内存
+        :param max_entries: 内存中保留的指标条数
+        """
+        self.root = root
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> np.ndarray，最近使用的在末尾
+        self.hits = self.disk_hits = self.misses = 0
+
+    def __reduce__(self):
+        # 传给进程池时只带配置，子进程里取该进程自己的缓存
+        return get_cache, (self.root, self.max_entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _path(self, key):
+        return os.path.join(self.root, key + '.npy')
+
+    def get(self, key, compute):
+        """按键取指标数组：内存 -> 磁盘 -> compute()"""
+        values = self._entries.get(key)
+        if values is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return values
+        if self.root is not None and os.path.exists(self._path(key)):
+            values = np.load(self._path(key))
+            self.disk_hits += 1
+        else:
+            values = compute()
+            self.misses += 1
+            if self.root is not None:
+                os.makedirs(self.root, exist_ok=True)
+                tmp_path = self._path(key) + f'.{os.getpid()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, values)
+                os.replace(tmp_path, self._path(key))
+        self._entries[key] = values
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return values
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'disk_hits': self.disk_hits,
+                'misses': self.misses}
+
+    # ---------- 在策略 __init__ 中调用 ----------
+    def sma(self, line, period):
+        x = _line_values(line)
+        if x is None:
+            return bt.indicators.SimpleMovingAverage(line, period=period)
+        values = self.get(f'sma_{period}_{_fingerprint(x)}', lambda: sma_values(x, period))
+        return PrecomputedLine(line, values=values, period=period)
+
+    def highest(self, line, period):
+        x = _line_values(line)
+        if x is None:
+            return bt.indicators.Highest(line, period=period)
+        values = self.get(f'highest_{period}_{_fingerprint(x)}', lambda: rolling_values(x, period, np.max))
+        return PrecomputedLine(line, values=values, period=period)
+
+    def lowest(self, line, period):
+        x = _line_values(line)
+        if x is None:
+            return bt.indicators.Lowest(line, period=period)
+        values = self.get(f'lowest_{period}_{_fingerprint(x)}', lambda: rolling_values(x, period, np.min))
+        return PrecomputedLine(line, values=values, period=period)
+
+    def atr(self, data, period):
+        high, low, close = _line_values(data.high), _line_values(data.low), _line_values(data.close)
+        if high is None or low is None or close is None:
+            return bt.indicators.ATR(data, period=period)
+        values = self.get(f'atr_{period}_{_fingerprint(high, low, close)}',
+                          lambda: atr_values(high, low, close, period))
+        # TrueRange 需要前一根收盘价，minperiod 比周期多 1
+        return PrecomputedLine(data, values=values, period=period + 1)
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+from shared_feed import SharedBarData, to_bt_datenum
+from signal_scan import scan_limit_up_pullback
+
+# ================== 按需加载的股票池 ==================
+# 全市场回测时绝大多数股票从未触发 LimitUpStrategy 的买入条件，却都要常驻内存并被 Cerebro 逐根推进。
+# 这里只常驻两样东西：内存映射的列式存储和预扫描得到的候选表 {date: [ts_code]}；
+# 真正的 backtrader 数据源只为出现过候选信号的股票创建，并且只覆盖信号前后的一段 K 线：
+#   [首次信号前 lookback 根, 最后一次信号后 hold_bars 根]
+# 窗口结束时如果仍有持仓或未成交订单（跌停封板卖不出、停牌、T+1 等），数据源继续推进，直到清仓为止。
+# 这样峰值内存和每根 K 线的推进开销都随活跃股票数增长，而不是随全市场股票数增长。
+
+SCAN_CHUNK = 500  # 预扫描时每批读取的股票数，控制峰值内存
+
+
+def scan_store(store, start_date=None, end_date=None, chunk=SCAN_CHUNK, codes=None, **scan_kwargs):
+    """分批扫描存储中的股票（codes 为 None 时全部），返回合并后的候选表 {date: [ts_code]}"""
+    codes = store.codes.tolist() if codes is None else [c for c in codes if c in store]
+    start = pd.Timestamp(start_date) if start_date else None
+    end = pd.Timestamp(end_date) if end_date else None
+    candidates = {}
+    for i in range(0, len(codes), chunk):
+        bars = store.to_frame(codes[i:i + chunk])
+        if start is not None:
+            bars = bars[bars['trade_date'] >= start]
+        if end is not None:
+            bars = bars[bars['trade_date'] <= end]
+        for date, names in scan_limit_up_pullback(bars, **scan_kwargs).items():
+            candidates.setdefault(date, []).extend(names)
+    for names in candidates.values():
+        names.sort()
+    return candidates
+
+
+class WindowBarData(SharedBarData):
+    """
+    信号窗口内的数据源：超过 hold_until 后，只在 broker 仍有该股票的持仓或未成交订单时继续加载
+    需要 Cerebro(preload=False)，逐根加载时才能看到当时的持仓
+    """
+    params = (
+        ('hold_until', None),  # 窗口最后一天 'YYYYMMDD'，end_date 为持仓时最多延长到的日期
+    )
+
+    def start(self):
+        super(WindowBarData, self).start()
+        self._hold_until = to_bt_datenum(np.datetime64(pd.Timestamp(self.p.hold_until), 'D'))
+
+    def _in_use(self):
+        broker = self._env.broker
+        if broker.getposition(self).size:
+            return True
+        # 上一根 K 线刚下的单还在 submitted 队列
+        orders = list(getattr(broker, 'submitted', ())) + list(broker.get_orders_open())
+        return any(o.data is self and o.alive() for o in orders)
+
+    def _load(self):
+        i = self._idx + 1
+        if i < len(self._dtnum) and self._dtnum[i] > self._hold_until and not self._in_use():
+            return False
+        return super(WindowBarData, self)._load()
+
+
+class LazyUniverse:
+    """候选驱动的股票池：只为有信号的股票在信号附近物化数据源"""
+
+    def __init__(self, store, candidates, start_date=None, end_date=None, lookback=4, hold_bars=5):
+        """
+        :param store: BarStore 或 SharedBarPanel
+        :param candidates: 预扫描结果 {date: [ts_code]}
+        :param lookback: 信号日之前保留的 K 线数，需覆盖策略回看的最大长度（d.close[-4]）
+        :param hold_bars: 最后一次信号之后至少保留的 K 线数；之后仍有持仓或订单的股票继续加载到清仓
+        """
+        self.store = store
+        self.candidates = candidates
+        self.start_date = start_date
+        self.end_date = end_date
+
+        signal_dates = {}
+        for date, names in candidates.items():
+            for name in names:
+                signal_dates.setdefault(name, []).append(np.datetime64(date, 'ns'))
+
+        codes, first, last = [], [], []
+        for ts_code in sorted(signal_dates):
+            if ts_code not in store:
+                continue
+            dates = store.arrays(ts_code, start_date, end_date)['trade_date']
+            pos = np.searchsorted(dates, np.sort(np.array(signal_dates[ts_code])))
+            codes.append(ts_code)
+            first.append(dates[max(0, pos[0] - lookback)])
+            last.append(dates[min(len(dates) - 1, pos[-1] + hold_bars)])
+        self.codes = codes
+        self.first_dates = np.array(first, dtype='datetime64[ns]')
+        self.last_dates = np.array(last, dtype='datetime64[ns]')
+
+    @classmethod
+    def from_store(cls, store, start_date=None, end_date=None, lookback=4, hold_bars=5, codes=None, **scan_kwargs):
+        """分批扫描存储（codes 为 None 时全部股票）得到候选表后构造"""
+        candidates = scan_store(store, start_date, end_date, codes=codes, **scan_kwargs)
+        return cls(store, candidates, start_date, end_date, lookback, hold_bars)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def active_codes(self, date, held=()):
+        """
+        在给定日期需要数据源的股票（候选窗口内，或仍有持仓）
+        :param held: 当前有持仓的股票，窗口已过也保留
+        """
+        date = np.datetime64(pd.Timestamp(date), 'ns')
+        mask = (self.first_dates <= date) & (date <= self.last_dates)
+        active = {self.codes[i] for i in np.flatnonzero(mask)} | (set(held) & set(self.codes))
+        return sorted(active)
+
+    def add_feeds(self, cerebro):
+        """
+        只为活跃股票加入数据源，数据从信号窗口开始，窗口结束后有持仓时继续到 end_date
+        会把 cerebro 设为不预加载：预加载发生在回测之前，无法按持仓决定是否延长
+        """
+        cerebro.p.preload = False
+        for ts_code, first, last in zip(self.codes, self.first_dates, self.last_dates):
+            cerebro.adddata(WindowBarData(
+                store=self.store, ts_code=ts_code,
+                start_date=pd.Timestamp(first).strftime('%Y%m%d'),
+                end_date=self.end_date,
+                hold_until=pd.Timestamp(last).strftime('%Y%m%d'),
+                name=ts_code,
+            ))
+        return list(self.codes)
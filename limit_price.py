@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+# ================== 涨跌停价计算 ==================
+# 全部基于数组运算：先对 ts_code 去重判断板块，再按下标展开到每一行，
+# 百万行级别的全市场长表也只需要几次向量运算。
+# 规则：
+#   主板 10%，ST 5%
+#   创业板 2020-08-24 注册制改革前同主板，之后 20%（ST 也是 20%）
+#   科创板 20%，北交所 30%
+#   价格按交易所规则四舍五入到 0.01 元
+
+BOARD_MAIN = 'main'
+BOARD_CHINEXT = 'chinext'
+BOARD_STAR = 'star'
+BOARD_BSE = 'bse'
+
+LIMIT_RATIO = {
+    BOARD_MAIN: 0.10,
+    BOARD_CHINEXT: 0.20,
+    BOARD_STAR: 0.20,
+    BOARD_BSE: 0.30,
+}
+ST_LIMIT_RATIO = 0.05
+CHINEXT_REFORM_DATE = np.datetime64('2020-08-24', 'ns')
+PRICE_TICK = 0.01
+
+
+def board_of(ts_codes):
+    """按代码判断所属板块，返回与输入等长的板块数组"""
+    s = pd.Series(np.asarray(ts_codes, dtype=str))
+    board = np.full(len(s), BOARD_MAIN, dtype=object)
+    board[s.str.startswith(('300', '301')).to_numpy()] = BOARD_CHINEXT
+    board[s.str.startswith(('688', '689')).to_numpy()] = BOARD_STAR
+    board[(s.str.endswith('.BJ') | s.str.startswith(('4', '8', '92'))).to_numpy()] = BOARD_BSE
+    return board
+
+
+def _to_datetime64(trade_dates):
+    values = np.asarray(trade_dates)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]')
+    return pd.to_datetime(values.astype(str), format='%Y%m%d').to_numpy(dtype='datetime64[ns]')
+
+
+def _factorize(ts_codes):
+    """代码去重；category 列直接复用编码，避免逐行字符串转换"""
+    if isinstance(ts_codes, pd.Series):
+        ts_codes = ts_codes.array
+    if isinstance(ts_codes, pd.Categorical):
+        return ts_codes.codes.astype(np.intp), np.asarray(ts_codes.categories, dtype=str)
+    codes, uniques = pd.factorize(ts_codes)
+    return codes, np.asarray(uniques, dtype=str)
+
+
+def limit_ratio(ts_codes, trade_dates=None, is_st=None):
+    """
+    逐行计算涨跌幅限制比例
+    :param ts_codes: 股票代码数组
+    :param trade_dates: 交易日数组（datetime64 或 'YYYYMMDD'），用于区分创业板改革前后，None 视为改革后
+    :param is_st: 与行对齐的布尔数组，或 ST 股票代码集合
+    """
+    codes, uniques = _factorize(ts_codes)
+    boards = board_of(uniques)
+    base = np.array([LIMIT_RATIO[b] for b in boards], dtype=np.float64)
+    ratio = base[codes]
+
+    # 创业板改革前按主板规则
+    is_chinext = (boards == BOARD_CHINEXT)[codes]
+    main_rule = (boards == BOARD_MAIN)[codes]
+    if trade_dates is not None and is_chinext.any():
+        before_reform = is_chinext & (_to_datetime64(trade_dates) < CHINEXT_REFORM_DATE)
+        ratio[before_reform] = LIMIT_RATIO[BOARD_MAIN]
+        main_rule |= before_reform
+
+    if is_st is not None:
+        if isinstance(is_st, (set, frozenset)):
+            st = np.isin(uniques, list(is_st))[codes]
+        else:
+            st = np.asarray(is_st, dtype=bool)
+        ratio[st & main_rule] = ST_LIMIT_RATIO
+    return ratio
+
+
+def round_price(prices):
+    """四舍五入到分，先消除浮点误差（如 10.05 * 1.1 = 11.054999...）"""
+    return np.floor(np.round(np.asarray(prices, dtype=np.float64) * 100, 6) + 0.5) / 100
+
+
+def limit_prices(pre_close, ratio):
+    """由昨收和限制比例计算 (涨停价, 跌停价)"""
+    pre_close = np.asarray(pre_close, dtype=np.float64)
+    ratio = np.asarray(ratio, dtype=np.float64)
+    return round_price(pre_close * (1 + ratio)), round_price(pre_close * (1 - ratio))
+
+
+def add_limit_prices(df, is_st=None, ts_code=None):
+    """
+    为日线表添加 up_limit、down_limit、is_limit_up、is_limit_down 四列
+    :param df: pro.daily 格式的单只或全市场长表，需要 pre_close、close 列
+    :param is_st: 见 limit_ratio
+    :param ts_code: df 没有 ts_code 列时指定单只股票代码
+    :return: 原 DataFrame（就地添加列）
+    """
+    codes = df['ts_code'] if ts_code is None else np.full(len(df), ts_code, dtype=object)
+    if 'trade_date' in df.columns:
+        trade_dates = df['trade_date'].to_numpy()
+    elif isinstance(df.index, pd.DatetimeIndex):
+        trade_dates = df.index.to_numpy()
+    else:
+        trade_dates = None
+
+    ratio = limit_ratio(codes, trade_dates, is_st)
+    up, down = limit_prices(df['pre_close'].to_numpy(), ratio)
+    close = df['close'].to_numpy(dtype=np.float64)
+    df['up_limit'] = up
+    df['down_limit'] = down
+    # 收盘价与涨跌停价相差不到半个最小价位即视为封板
+    df['is_limit_up'] = close >= up - PRICE_TICK / 2
+    df['is_limit_down'] = close <= down + PRICE_TICK / 2
+    return df
@@ -1,120 +1,77 @@
 import backtrader as bt
-import tushare as ts
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
-import os
-import re
+from datetime import datetime
 
+from data_source import lazy_pro
 
-# 设置Tushare的Token
-ts.set_token('0ff27db3b933751cc13e959f62e7147d441325b4fdc2a4fd1b0aacfe')
-pro = ts.pro_api()
+
+# 行情接口，数据源与延迟创建见 data_source.lazy_pro
+pro = lazy_pro()
 start_date = '20240101'
 end_date = datetime.now().strftime('%Y%m%d')  # 当前时间
+START_DATE = start_date
 END_DATE=end_date
 INIT_CASH = 1_000_000
 MAX_WORKERS = 4  # 根据API限制调整并发数
-STOCK_BASIC_FILE = 'stock_basic.csv'  # 本地存储文件
 
 
 # ================== 数据工具函数 ==================
-def calculate_up_limit(ts_code, pre_close):
-    """精确计算涨停价"""
-    if ts_code.startswith('688') or ts_code.startswith('300'):
-        return round(pre_close * 1.2, 2)  # 科创板和创业板20%
-    elif ts_code.startswith('8'):
-        return round(pre_close * 1.3, 2)  # 北交所30%（虽然已过滤，保留逻辑）
-    else:
-        return round(pre_close * 1.1, 2)  # 主板10%
-
 def get_trade_days():
-    """获取交易日历"""
-    schedule = TRADE_CALENDAR.schedule(start_date=START_DATE, end_date=END_DATE)
-    return schedule.index.tz_localize(None).to_pydatetime().tolist()
+    """获取回测区间内的交易日（本地交易日历，不调用接口）"""
+    import pandas as pd
+    from trade_calendar import load_calendar
 
-def process_stock_data(ts_code):
-    """多进程处理单只股票数据"""
-    try:
-        df = pro.daily(ts_code=ts_code, start_date=START_DATE, end_date=END_DATE)
-        if df.empty:
-            return None
-
-        # 计算涨停价
-        df['pre_close'] = df['close'].shift(1)
-        df['up_limit'] = df.apply(lambda x: calculate_up_limit(x['ts_code'], x['pre_close']), axis=1)
-        df['is_limit_up'] = np.isclose(df['close'], df['up_limit'], rtol=0.01)
-
-        # 格式转换
-        df['trade_date'] = pd.to_datetime(df['trade_date'])
-        df.set_index('trade_date', inplace=True)
-        df.sort_index(inplace=True)
-        return (ts_code, df)
-    except Exception as e:
-        print(f"Error processing {ts_code}: {str(e)}")
-        return None
+    days = load_calendar(pro, end_date=END_DATE).range(START_DATE, END_DATE)
+    return pd.DatetimeIndex(days).to_pydatetime().tolist()
 
-# ================== 本地数据存储与加载 ==================
-def save_stock_basic_to_local(file_path=STOCK_BASIC_FILE):
-    """获取股票基础数据并保存到本地文件"""
-    df = pro.stock_basic(exchange='', list_status='L', fields='ts_code,name,list_date,market,list_status')
-    df.to_csv(file_path, index=False)
-    print(f"股票基础数据已保存到 {file_path}")
+def process_stock_data(ts_code):
+    """多线程处理单只股票数据，接口异常向上抛出由下载器重试"""
+    import pandas as pd
+    from limit_price import add_limit_prices
 
+    df = pro.daily(ts_code=ts_code, start_date=START_DATE, end_date=END_DATE)
+    if df.empty:
+        return None
 
-def load_stock_basic_from_local(file_path=STOCK_BASIC_FILE):
-    """从本地文件加载股票基础数据"""
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"本地文件 {file_path} 不存在，请先调用 save_stock_basic_to_local 保存数据")
-    return pd.read_csv(file_path)
+    # 格式转换
+    df['trade_date'] = pd.to_datetime(df['trade_date'])
+    df.set_index('trade_date', inplace=True)
+    df.sort_index(inplace=True)
 
+    # 计算涨跌停价（pre_close 直接用接口返回的除权昨收）
+    add_limit_prices(df)
+    return df
 
+# ================== 股票池 ==================
 def filter_st_stocks(df):
     """
-    精确过滤名称中包含 ST 或 *ST 的股票（支持全角/半角符号）
+    过滤名称中包含 ST 或 *ST 的股票（支持全角/半角符号）
     :param df: 包含股票基础数据的 DataFrame，必须包含 'name' 列
     :return: 过滤后的 DataFrame
     """
-    # 预编译正则表达式（匹配以下形式）：
-    # 1. 以 *ST、＊ST（全角星号）、ST 开头
-    # 2. 中间含有 ST（如 公司ST摘帽）
-    st_pattern = re.compile(
-        r'^[\*＊]?ST|.*ST',
-        flags=re.IGNORECASE  # 忽略大小写
-    )
-
-    # 检查匹配
-    is_st = df['name'].apply(lambda x: bool(st_pattern.search(str(x))))
-
-    # 返回非 ST 股票
-    return df[~is_st]
-
-def get_filtered_stocks(use_local=True, file_path=STOCK_BASIC_FILE):
-    """获取并过滤股票列表"""
-    if use_local:
-        try:
-            print("读取本地数据")
-            df = load_stock_basic_from_local(file_path)
-        except FileNotFoundError:
-            print("本地数据不存在，从 Tushare 获取数据...")
-            df = pro.stock_basic(exchange='', list_status='L', fields='ts_code,name,list_date,market,list_status')
-            df.to_csv(file_path, index=False)
-    else:
-        df = pro.stock_basic(exchange='', list_status='L', fields='ts_code,name,list_date,market,is_st,list_status')
+    from stock_universe import ST_PATTERN
 
-    # 过滤 ST 股票
-    df = filter_st_stocks(df)
+    is_st = df['name'].astype(str).str.contains(ST_PATTERN, regex=True)
+    return df[~is_st.to_numpy()]
 
-    # 其他过滤条件
-    cutoff_date = pd.to_datetime(END_DATE) - pd.DateOffset(years=1)
-    print("cutoff_data=",cutoff_date)
-    df = df[
-        (pd.to_datetime(df['list_date']) < cutoff_date) &  # 上市超过1年
-        (~df['market'].isin(['科创板', '北交所'])) &  # 排除科创板和北交所
-        (df['list_status'] == 'L')  # 仅上市状态
-        ]
+def get_filtered_stocks(use_local=True, membership=None):
+    """
+    获取并过滤股票列表，use_local=False 时强制刷新股票基础数据快照
+    :param membership: 逐日股票池；传入时保留回测区间内可交易过的股票（含期间退市、摘帽），
+                       ST 和退市改由策略按当天判断，否则按今天的状态过滤
+    """
+    import numpy as np
+    from stock_universe import load_universe
 
-    return df['ts_code'].tolist()
+    universe = load_universe(pro, refresh=not use_local)
+    mask = (
+        universe.listed_for(END_DATE, years=1) &  # 上市超过1年
+        ~universe.market_in(['科创板', '北交所'])  # 排除科创板和北交所
+    )
+    if membership is None:
+        mask &= universe.not_st() & universe.status_in(['L'])  # 仅上市状态
+    else:
+        mask &= np.isin(universe.codes, membership.ever_members(START_DATE, END_DATE))
+    return universe.select(mask)
 
 # ================== 策略类 ==================
 class LimitUpStrategy(bt.Strategy):
@@ -122,11 +79,17 @@ class LimitUpStrategy(bt.Strategy):
         ('position_ratio', 0.3),
         ('max_positions', 3),
         ('profit_target', 0.03),
+        ('candidates', None),  # signal_scan 预扫描结果 {date: [ts_code]}，为 None 时逐只判断
+        ('universe', None),  # membership.MembershipTable，只在当天可交易（在市且非 ST）的股票中买入
+        ('recorder', None),  # event_log.EventRecorder，设置后日志写入事件文件而不是打印
     )
+    # checkpoint 保存和恢复的属性
+    checkpoint_state = ('stock_status', 'positions_count')
 
     def __init__(self):
         self.orders = {}
         self.positions_count = 0
+        self.data_index = {d._name: i for i, d in enumerate(self.datas)}
         # 为每个股票维护状态
         self.stock_status = {}
         for d in self.datas:
@@ -157,73 +120,114 @@ class LimitUpStrategy(bt.Strategy):
         if self.positions_count >= self.params.max_positions:
             return
 
-        for i, d in enumerate(self.datas):
+        for d in self._buy_candidates():
             status = self.stock_status[d._name]
-
-            # 涨停判断逻辑
-            if len(d.close) < 4:
+            if self.params.candidates is None and not self._is_entry_signal(d):
                 continue
 
-            # 涨停日判断（简化处理）
-            is_limit_up = abs(d.close[-3] - d.pre_close[-3] * 1.1) < 0.01  # 假设3天前涨停
-
-            # 连续三天缩量回调判断
-            cond1 = d.volume[-2] < d.volume[-3]  # 第1天缩量
-            cond2 = d.volume[-1] < d.volume[-2]  # 第2天缩量
-            cond3 = d.close[-2] < d.close[-3]  # 第1天价格下跌
-            cond4 = d.close[-1] < d.close[-2]  # 第2天价格下跌
-            cond5 = d.close[0] > d.close[-1]  # 第3天上涨
-
-            if is_limit_up and cond1 and cond2 and cond3 and cond4 and cond5:
-                # 计算可买数量
-                available_cash = self.broker.get_cash()
-                position_value = available_cash * self.params.position_ratio
-                size = int(position_value / d.close[0]) / 100 * 100  # 按手数买入
-
-                if size > 0 and self.positions_count < self.params.max_positions:
-                    self.buy(data=d, size=size)
-                self.positions_count += 1
-                status['entry_price'] = d.close[0]
+            # 计算可买数量
+            available_cash = self.broker.get_cash()
+            position_value = available_cash * self.params.position_ratio
+            size = int(position_value / d.close[0] // 100 * 100)  # 按手数买入
+
+            if size > 0 and self.positions_count < self.params.max_positions:
+                self.buy(data=d, size=size)
+            self.positions_count += 1
+            status['entry_price'] = d.close[0]
+
+    def _buy_candidates(self):
+        # 有预扫描结果时只取当天的候选股票，保持与 self.datas 相同的顺序
+        if self.params.candidates is None:
+            datas = self.datas
+        else:
+            names = self.params.candidates.get(self.datetime.date(0), ())
+            datas = [self.datas[i] for i in sorted(self.data_index[n] for n in names if n in self.data_index)]
+        if self.params.universe is not None:
+            date = self.datetime.date(0)
+            datas = [d for d in datas if self.params.universe.is_member(date, d._name)]
+        return datas
+
+    def _is_entry_signal(self, d):
+        # 涨停判断逻辑
+        if len(d.close) < 4:
+            return False
+
+        # 涨停日判断（简化处理）
+        is_limit_up = abs(d.close[-3] - d.pre_close[-3] * 1.1) < 0.01  # 假设3天前涨停
+
+        # 连续三天缩量回调判断
+        cond1 = d.volume[-2] < d.volume[-3]  # 第1天缩量
+        cond2 = d.volume[-1] < d.volume[-2]  # 第2天缩量
+        cond3 = d.close[-2] < d.close[-3]  # 第1天价格下跌
+        cond4 = d.close[-1] < d.close[-2]  # 第2天价格下跌
+        cond5 = d.close[0] > d.close[-1]  # 第3天上涨
+
+        return is_limit_up and cond1 and cond2 and cond3 and cond4 and cond5
 
     def _is_last_bar(self):
         # 判断是否是当日最后一个bar（假设是日线数据）
         return True
 
+    def log(self, txt, *args, dt=None):
+        # txt 为 % 格式串，事件级别不够时不取日期也不格式化
+        recorder = self.params.recorder
+        if recorder is not None:
+            if recorder.enabled():
+                recorder.log(dt or self.datetime.date(0), txt, *args)
+            return
+        print(txt % args if args else txt)
+
     def notify_order(self, order):
         if order.status in [order.Completed]:
             if order.isbuy():
-                print(f"买入 {order.data._name} 价格：{order.executed.price}")
+                self.log("买入 %s 价格：%s", order.data._name, order.executed.price)
             elif order.issell():
-                print(f"卖出 {order.data._name} 价格：{order.executed.price}")
+                self.log("卖出 %s 价格：%s", order.data._name, order.executed.price)
 
 
 # ================== 回测设置 ==================
 if __name__ == '__main__':
+    import pandas as pd
+    from bar_store import BarStore, BAR_STORE_DIR
+    from downloader import download_daily_bars
+    from signal_scan import scan_limit_up_pullback
+    from membership import load_membership
+    from trade_calendar import load_calendar
+    from ashare_broker import AShareBroker
+    from analytics import EquityRecorder
+    from report import write_report
+
     cerebro = bt.Cerebro()
 
-    # 首次运行时保存数据到本地
-    if not os.path.exists(STOCK_BASIC_FILE):
-        save_stock_basic_to_local()
+    # 添加筛选后的股票数据，逐日股票池避免幸存者偏差
+    membership = load_membership(START_DATE, END_DATE, pro)
+    valid_stocks = get_filtered_stocks(use_local=True, membership=membership)[:30]  # 示例取前30只，实际需处理全部
+
+    # 并发限速下载，进度可续传，结果分批写入列式存储
+    failed = download_daily_bars(pro, valid_stocks, start_date, end_date, fetch=process_stock_data,
+                                 max_workers=MAX_WORKERS, calendar=load_calendar(pro, end_date=end_date))
+    if failed:
+        print(f"下载失败 {len(failed)} 只：{failed}")
 
-    # 添加筛选后的股票数据
-    valid_stocks = get_filtered_stocks(use_local=True)[:30]  # 示例取前30只，实际需处理全部
+    store = BarStore(BAR_STORE_DIR)
+    codes = store.add_feeds(cerebro, codes=valid_stocks, start_date=start_date, end_date=end_date)
 
-    for ts_code in valid_stocks:
-        df = pro.daily(ts_code=ts_code, start_date=start_date, end_date=end_date)
-        df['trade_date'] = pd.to_datetime(df['trade_date'])
-        df.set_index('trade_date', inplace=True)
-        df.sort_index(inplace=True)
-        data = bt.feeds.PandasData(dataname=df, name=ts_code)
-        cerebro.adddata(data)
+    # 预扫描买点，next() 只处理当天候选
+    bars = store.to_frame(codes)
+    bars = bars[(bars['trade_date'] >= pd.Timestamp(start_date)) & (bars['trade_date'] <= pd.Timestamp(end_date))]
+    candidates = scan_limit_up_pullback(bars, use_pre_close=True)
 
     # 添加策略
-    cerebro.addstrategy(LimitUpStrategy)
+    cerebro.addstrategy(LimitUpStrategy, candidates=candidates, universe=membership)
+
+    # A 股撮合：T+1、整手、封板不能成交，佣金最低 5 元、卖出印花税
+    cerebro.broker = AShareBroker()
 
     # 设置初始资金
     cerebro.broker.set_cash(1000000)
 
-    # 设置交易手续费
-    cerebro.broker.setcommission(commission=0.001)
+    # 记录净值和成交，用于输出报告
+    cerebro.addanalyzer(EquityRecorder, _name='equity')
 
     # 运行回测
     results = cerebro.run()
@@ -231,5 +235,5 @@ if __name__ == '__main__':
     # 输出结果
     print(f'最终资产价值: {cerebro.broker.getvalue():.2f}')
 
-    # 绘制结果
-    cerebro.plot()
\ No newline at end of file
+    # 输出报告：只画有成交的股票，PNG + index.html，不弹出窗口
+    print(f"报告: {write_report(results[0])}")
\ No newline at end of file
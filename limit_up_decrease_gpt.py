@@ -1,42 +1,35 @@
 import backtrader as bt
-import tushare as ts
-import pandas as pd
 import os
-from datetime import datetime, timedelta
-import numpy as np
 
-# 设置Tushare Token
-ts.set_token('0ff27db3b933751cc13e959f62e7147d441325b4fdc2a4fd1b0aacfe')
-pro = ts.pro_api()
+from event_log import EventRecorder, EventAnalyzer
+from data_source import lazy_pro
+from checkpoint import CHECKPOINT_EVERY
 
-# ================== 数据获取与存储 ==================
-def fetch_and_save_data(start_date, end_date):
-    # 获取所有A股列表
-    df = pro.stock_basic(exchange='', list_status='L', fields='ts_code,name,list_date,market,is_st')
+# 行情接口，数据源与延迟创建见 data_source.lazy_pro
+pro = lazy_pro()
 
-    # 通过股票名称来过滤ST股：名称中含有 "ST" 或 "*ST"
-    df = df[~df['name'].str.contains("ST|*ST", na=False)]
+# ================== 数据获取与存储 ==================
+def get_universe_codes(start_date, end_date, membership):
+    """
+    回测区间内可交易过的股票（含期间退市、摘帽），排除科创板和北交所
+    ST 和退市不按今天的状态过滤，改由策略按当天的 membership 判断，避免幸存者偏差
+    """
+    import numpy as np
+    from stock_universe import load_universe
 
-    # 过滤科创板、北交所等不需要的市场股票
-    df = df[~df['market'].isin(['科创板', '北交所'])]
+    # 获取A股列表（本地快照过期才重新请求，含已退市股票）
+    universe = load_universe(pro)
+    mask = ~universe.market_in(['科创板', '北交所']) & \
+        np.isin(universe.codes, membership.ever_members(start_date, end_date))
+    return universe.select(mask)
 
-    # 获取每只股票的历史数据并保存为CSV
-    for ts_code in df['ts_code']:
-        file_path = f"data/{ts_code}.csv"
 
-        # 如果本地已存在数据，跳过下载
-        if os.path.exists(file_path):
-            print(f"已存在数据：{ts_code}")
-            continue
+def fetch_and_save_data(start_date, end_date, codes):
+    from bar_store import BAR_STORE_DIR
+    from bar_sync import sync_daily_bars
 
-        print(f"正在下载数据：{ts_code}")
-        try:
-            stock_data = pro.daily(ts_code=ts_code, start_date=start_date, end_date=end_date)
-            stock_data['trade_date'] = pd.to_datetime(stock_data['trade_date'])
-            stock_data.set_index('trade_date', inplace=True)
-            stock_data.to_csv(file_path)
-        except Exception as e:
-            print(f"下载 {ts_code} 时出错: {e}")
+    # 增量同步到 end_date：已有数据只补缺失的交易日，新股票再单独回补
+    sync_daily_bars(pro, start_date, end_date, codes=codes, root=BAR_STORE_DIR)
 
 
 # ================== 策略类 ==================
@@ -45,11 +38,17 @@ class LimitUpStrategy(bt.Strategy):
         ('position_ratio', 0.3),  # 每只股票投入30%资金
         ('max_positions', 3),  # 最多持有3只股票
         ('profit_target', 0.03),  # 卖出利润目标3%
+        ('candidates', None),  # signal_scan 预扫描结果 {date: [ts_code]}，为 None 时逐只判断
+        ('universe', None),  # membership.MembershipTable，只在当天可交易（在市且非 ST）的股票中买入
+        ('recorder', None),  # event_log.EventRecorder，设置后日志写入事件文件而不是打印
     )
+    # checkpoint 保存和恢复的属性
+    checkpoint_state = ('stock_status', 'positions_count')
 
     def __init__(self):
         self.positions_count = 0
         self.stock_status = {}
+        self.data_index = {d._name: i for i, d in enumerate(self.datas)}
         for d in self.datas:
             self.stock_status[d._name] = {
                 'limit_up_day': -3,
@@ -58,10 +57,15 @@ class LimitUpStrategy(bt.Strategy):
                 'entry_price': None
             }
 
-    def log(self, txt, dt=None):
-        # 记录策略的执行日志
+    def log(self, txt, *args, dt=None):
+        # 记录策略的执行日志；txt 为 % 格式串，事件级别不够时不取日期也不格式化
+        recorder = self.params.recorder
+        if recorder is not None:
+            if recorder.enabled():
+                recorder.log(dt or self.datetime.date(0), txt, *args)
+            return
         dt = dt or self.datetime.date(0)
-        print('%s, %s' % (dt.isoformat(), txt))
+        print('%s, %s' % (dt.isoformat(), txt % args if args else txt))
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -71,13 +75,19 @@ class LimitUpStrategy(bt.Strategy):
         # 注意: 当资金不足时，broker会拒绝订单
         if order.status in [order.Completed]:
             if order.isbuy():
-                self.log(f"买入 {order.executed.size} 股，价格：{order.executed.price},总价：{order.executed.value},代码：{order.data._name}")
+                self.log("买入 %s 股，价格：%s,总价：%s,代码：%s", order.executed.size, order.executed.price,
+                         order.executed.value, order.data._name)
             elif order.issell():
-                self.log(f"卖出 {order.executed.size} 股，价格：{order.executed.price},总价：{order.executed.value},代码：{order.data._name}")
+                self.log("卖出 %s 股，价格：%s,总价：%s,代码：%s", order.executed.size, order.executed.price,
+                         order.executed.value, order.data._name)
 
                 # 记录当前交易数量
             self.bar_executed = len(self)
 
+    def prenext(self):
+        # 新上市或按需加载的数据源尚未开始时，其余股票照常交易
+        self.next()
+
     def next(self):
         current_date = self.datetime.date(0).isoformat()
 
@@ -85,7 +95,7 @@ class LimitUpStrategy(bt.Strategy):
         for i, d in enumerate(self.datas):
             position = self.getposition(d)
             if position.size > 0:
-                self.log(f"触发卖出，name {d._name}")
+                self.log("触发卖出，name %s", d._name)
                 # 如果涨幅达到3%，则卖出
                 if d.close[0] >= self.stock_status[d._name]['entry_price'] * (1 + self.params.profit_target):
                     self.sell(data=d, size=position.size)
@@ -99,33 +109,49 @@ class LimitUpStrategy(bt.Strategy):
         if self.positions_count >= self.params.max_positions:
             return
 
-        for i, d in enumerate(self.datas):
+        for d in self._buy_candidates():
             status = self.stock_status[d._name]
-
-            if len(d.close) < 5:
+            if self.params.candidates is None and not self._is_entry_signal(d):
                 continue
 
-            # 判断是否为涨停日
-            is_limit_up = abs(d.close[-3] - d.close[-4] * 1.1) < 0.01  # 假设3天前涨停
-
-            # 连续3日缩量回调判断
-            cond1 = d.volume[-2] < d.volume[-3]  # 第1天缩量
-            cond2 = d.volume[-1] < d.volume[-2]  # 第2天缩量
-            cond3 = d.close[-2] < d.close[-3]  # 第1天价格下跌
-            cond4 = d.close[-1] < d.close[-2]  # 第2天价格下跌
-            cond5 = d.close[0] > d.close[-1]  # 第3天上涨
-
-            if is_limit_up and cond1 and cond2 and cond3 and cond4 and cond5:
-                self.log(f"触发买入，name {d._name}")
-                # 计算可买数量
-                available_cash = self.broker.get_cash()
-                position_value = available_cash * self.params.position_ratio
-                size = int(position_value / d.close[0] // 100 * 100)  # 按手数买入
-
-                if size > 0 and self.positions_count < self.params.max_positions:
-                    self.buy(data=d, size=size)
-                    self.positions_count += 1
-                    status['entry_price'] = d.close[0]
+            self.log("触发买入，name %s", d._name)
+            # 计算可买数量
+            available_cash = self.broker.get_cash()
+            position_value = available_cash * self.params.position_ratio
+            size = int(position_value / d.close[0] // 100 * 100)  # 按手数买入
+
+            if size > 0 and self.positions_count < self.params.max_positions:
+                self.buy(data=d, size=size)
+                self.positions_count += 1
+                status['entry_price'] = d.close[0]
+
+    def _buy_candidates(self):
+        # 有预扫描结果时只取当天的候选股票，保持与 self.datas 相同的顺序
+        if self.params.candidates is None:
+            datas = self.datas
+        else:
+            names = self.params.candidates.get(self.datetime.date(0), ())
+            datas = [self.datas[i] for i in sorted(self.data_index[n] for n in names if n in self.data_index)]
+        if self.params.universe is not None:
+            date = self.datetime.date(0)
+            datas = [d for d in datas if self.params.universe.is_member(date, d._name)]
+        return datas
+
+    def _is_entry_signal(self, d):
+        if len(d.close) < 5:
+            return False
+
+        # 判断是否为涨停日
+        is_limit_up = abs(d.close[-3] - d.close[-4] * 1.1) < 0.01  # 假设3天前涨停
+
+        # 连续3日缩量回调判断
+        cond1 = d.volume[-2] < d.volume[-3]  # 第1天缩量
+        cond2 = d.volume[-1] < d.volume[-2]  # 第2天缩量
+        cond3 = d.close[-2] < d.close[-3]  # 第1天价格下跌
+        cond4 = d.close[-1] < d.close[-2]  # 第2天价格下跌
+        cond5 = d.close[0] > d.close[-1]  # 第3天上涨
+
+        return is_limit_up and cond1 and cond2 and cond3 and cond4 and cond5
 
     def _is_last_bar(self):
         # 判断是否是当日最后一个bar（假设是日线数据）
@@ -133,51 +159,94 @@ class LimitUpStrategy(bt.Strategy):
 
 
 # ================== 回测设置 ==================
-def run_backtest(start_date, end_date):
+def run_backtest(start_date, end_date, lazy=False, aligned=False, events_file=None, events_level='info',
+                 checkpoint_dir=None, checkpoint_every=CHECKPOINT_EVERY, resume=False):
+    """
+    lazy=True 时只为出现过买点的股票在信号前后加载数据源
+    aligned=True 时先对齐到交易日面板，所有数据源共用一条时间轴，停牌缺口不参与回看
+    events_file 不为空时订单、成交、净值和日志写入该 JSONL/Parquet 文件，不再逐条打印
+    checkpoint_dir 不为空时每 checkpoint_every 根 K 线和结束时写检查点；
+    resume=True 时从该目录最近的检查点继续，只加载检查点前 RESUME_WARMUP 个交易日之后的数据，
+    延长 end_date 再 resume 即可每日增量回测
+    """
+    import pandas as pd
+    from bar_store import BarStore, import_csv_dir, BAR_STORE_DIR
+    from signal_scan import scan_limit_up_pullback, scan_panel
+    from lazy_universe import LazyUniverse
+    from panel import AlignedPanel
+    from trade_calendar import load_calendar
+    from ashare_broker import AShareBroker
+    from checkpoint import Checkpointer, load_checkpoint, resumable, resume_start
+    from membership import load_membership
+
     cerebro = bt.Cerebro()
 
-    # 加载本地数据或拉取新数据
-    stocks = os.listdir('data')
-    valid_stocks = []  # 存储有效股票
+    # 逐日股票池按原始区间构造，从检查点继续时沿用同一份
+    membership = load_membership(start_date, end_date, pro)
+    codes = get_universe_codes(start_date, end_date, membership)
 
-    for stock_file in stocks:
-        if stock_file.endswith('.csv'):
-            ts_code = stock_file.replace('.csv', '')
-            df = pd.read_csv(f"data/{stock_file}", parse_dates=True, index_col='trade_date')
-            # 将数据列的名称修改为 backtrader 所需的格式
-            df = df[['open', 'high', 'low', 'close', 'vol']]
-            df.columns = ['open', 'high', 'low', 'close', 'volume']
+    # 从检查点继续时数据源只需覆盖检查点前的预热区间
+    state = load_checkpoint(checkpoint_dir) if resume and checkpoint_dir else None
+    if state is not None:
+        start_date = resume_start(state, start_date, load_calendar(pro, end_date=end_date))
+        print(f"从检查点 {state['date']} 继续，数据从 {start_date} 开始加载")
 
-            df.sort_index(inplace=True)  # 确保数据按时间排序
-            data = bt.feeds.PandasData(dataname=df, name=ts_code)
-            valid_stocks.append(ts_code)
-            cerebro.adddata(data)
+    # 加载本地列式存储，旧的 data/*.csv 首次运行时迁移一次
+    store = BarStore(BAR_STORE_DIR)
+    if not len(store) and os.path.isdir('data') and any(f.endswith('.csv') for f in os.listdir('data')):
+        print("迁移本地 CSV 数据到列式存储...")
+        import_csv_dir('data', BAR_STORE_DIR)
+        store = BarStore(BAR_STORE_DIR)
 
     # 如果本地数据不足，拉取新数据
-    if not valid_stocks:
+    if not len(store):
         print("本地无数据，正在拉取新数据...")
-        fetch_and_save_data(start_date, end_date)
-
-        # 加载新获取的数据
-        for stock_file in os.listdir('data'):
-            if stock_file.endswith('.csv'):
-                ts_code = stock_file.replace('.csv', '')
-                df = pd.read_csv(f"data/{stock_file}", parse_dates=True, index_col='trade_date')
-                df.sort_index(inplace=True)
-                data = bt.feeds.PandasData(dataname=df, name=ts_code)
-                cerebro.adddata(data)
+        fetch_and_save_data(start_date, end_date, codes)
+        store = BarStore(BAR_STORE_DIR)
+
+    if aligned:
+        panel = AlignedPanel.from_store(store, codes=codes, start_date=start_date, end_date=end_date,
+                                        calendar=load_calendar(pro, end_date=end_date))
+        panel.add_feeds(cerebro)
+        candidates = scan_panel(panel)
+        print(f"面板 {len(panel)} 个交易日 × {len(panel.codes)} 只，停牌 {int(panel.suspended.sum())} 个")
+    elif lazy:
+        # 分批预扫描，只物化候选股票的数据源
+        universe = LazyUniverse.from_store(store, start_date, end_date, codes=codes)
+        universe.add_feeds(cerebro)
+        candidates = universe.candidates
+        print(f"候选股票 {len(universe)} 只 / 股票池 {len(codes)} 只")
+    else:
+        codes = store.add_feeds(cerebro, codes=codes, start_date=start_date, end_date=end_date)
+
+        # 预扫描全市场买点，next() 只处理当天候选
+        bars = store.to_frame(codes)
+        bars = bars[(bars['trade_date'] >= pd.Timestamp(start_date)) & (bars['trade_date'] <= pd.Timestamp(end_date))]
+        candidates = scan_limit_up_pullback(bars)
 
     # 添加策略
-    cerebro.addstrategy(LimitUpStrategy)
+    recorder = EventRecorder(events_file, level=events_level) if events_file else None
+    if checkpoint_dir:
+        cerebro.addstrategy(resumable(LimitUpStrategy), candidates=candidates, universe=membership,
+                            recorder=recorder, resume=state)
+        cerebro.addanalyzer(Checkpointer, root=checkpoint_dir, every=checkpoint_every)
+    else:
+        cerebro.addstrategy(LimitUpStrategy, candidates=candidates, universe=membership, recorder=recorder)
+    if recorder is not None:
+        cerebro.addanalyzer(EventAnalyzer, recorder=recorder)
+
+    # A 股撮合：T+1、整手、封板不能成交，佣金最低 5 元、卖出印花税
+    cerebro.broker = AShareBroker()
 
     # 设置初始资金
     cerebro.broker.set_cash(1000000)
 
-    # 设置交易手续费
-    cerebro.broker.setcommission(commission=0.001)
-
     # 运行回测
-    results = cerebro.run()
+    try:
+        results = cerebro.run()
+    finally:
+        if recorder is not None:
+            recorder.close()
 
     # 输出结果
     print(f'最终资产价值: {cerebro.broker.getvalue():.2f}')
@@ -191,4 +260,4 @@ if __name__ == '__main__':
     end_date = '20241231'
 
     # 运行回测
-    run_backtest(start_date, end_date)
+    run_backtest(start_date, end_date, lazy=True)
@@ -0,0 +1,144 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from stock_universe import load_universe, ST_PATTERN, UNIVERSE_DIR, SNAPSHOT_TTL
+
+# ================== 逐日股票池 ==================
+# 用 stock_basic（含已退市）的上市/退市日期和 namechange 的历史名称区间，
+# 构造 日期 × 股票 的布尔表：当天已上市、未退市、且名称不含 ST 记为可交易。
+# 行按自然日排列，查询某天只需 (date - start).days 定位一行；按位打包后十年全市场不到 10MB。
+# 回测时逐根 K 线按当天的股票池选股，不再用“今天仍在上市、今天不是 ST”的股票回看历史。
+
+NAMECHANGE_FILE = 'namechange.csv'
+NAMECHANGE_FIELDS = 'ts_code,name,start_date,end_date,change_reason'
+NAMECHANGE_PAGE = 10000  # namechange 单次返回的最大行数
+
+
+def load_namechange(pro=None, root=UNIVERSE_DIR, ttl=SNAPSHOT_TTL, refresh=False):
+    """历史名称变更，本地文件超过 TTL 或 refresh=True 时通过 pro 分页重新获取"""
+    path = os.path.join(root, NAMECHANGE_FILE)
+    expired = not os.path.exists(path) or time.time() - os.path.getmtime(path) > ttl.total_seconds()
+    if pro is not None and (refresh or expired):
+        frames, offset = [], 0
+        while True:
+            page = pro.namechange(fields=NAMECHANGE_FIELDS, limit=NAMECHANGE_PAGE, offset=offset)
+            frames.append(page)
+            if len(page) < NAMECHANGE_PAGE:
+                break
+            offset += NAMECHANGE_PAGE
+        os.makedirs(root, exist_ok=True)
+        tmp_path = path + '.tmp'
+        pd.concat(frames, ignore_index=True).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    elif not os.path.exists(path):
+        raise FileNotFoundError(f"{path} 不存在，请传入 pro 以获取")
+    return pd.read_csv(path, dtype={'start_date': str, 'end_date': str})
+
+
+def _interval_matrix(n_days, n_codes, cols, lo, hi):
+    """半开区间 [lo, hi)（行号）内置 True，差分后按列累加，重叠区间不会重复计数"""
+    lo = np.clip(lo, 0, n_days)
+    hi = np.clip(hi, 0, n_days)
+    keep = lo < hi
+    diff = np.zeros((n_days + 1, n_codes), dtype=np.int32)
+    np.add.at(diff, (lo[keep], cols[keep]), 1)
+    np.add.at(diff, (hi[keep], cols[keep]), -1)
+    return np.cumsum(diff[:-1], axis=0) > 0
+
+
+class MembershipTable:
+    """按自然日索引的可交易股票表，members(date) 为 O(1) 定位一行"""
+
+    def __init__(self, codes, start_date, packed):
+        self.codes = np.asarray(codes, dtype='<U12')
+        self.start = np.datetime64(pd.Timestamp(start_date), 'D')
+        self.packed = packed  # (天数, ceil(股票数 / 8)) 的 uint8
+        self._index = {code: i for i, code in enumerate(self.codes.tolist())}
+
+    @classmethod
+    def build(cls, universe, namechange, start_date, end_date):
+        """
+        :param universe: StockUniverse，应包含已退市股票（stock_universe 的快照默认包含）
+        :param namechange: load_namechange 返回的历史名称表
+        """
+        start = np.datetime64(pd.Timestamp(start_date), 'D')
+        n_days = int((np.datetime64(pd.Timestamp(end_date), 'D') - start).astype(int)) + 1
+        codes = universe.codes
+        n_codes = len(codes)
+
+        def rows(dates, default):
+            days = np.asarray(dates, dtype='datetime64[D]')
+            out = (days - start).astype(np.int64)
+            return np.where(np.isnat(days), default, out)
+
+        # 上市区间 [list_date, delist_date)
+        cols = np.arange(n_codes)
+        listed = _interval_matrix(n_days, n_codes, cols,
+                                  rows(universe._list_date, n_days), rows(universe._delist_date, n_days))
+
+        # ST 区间 [start_date, end_date]，end_date 为空表示至今
+        nc = namechange[namechange['name'].astype(str).str.contains(ST_PATTERN, regex=True)]
+        col = pd.Index(codes).get_indexer(nc['ts_code'])
+        nc, col = nc[col >= 0], col[col >= 0]
+        st_lo = rows(pd.to_datetime(nc['start_date'], format='%Y%m%d', errors='coerce'), n_days)
+        st_hi = rows(pd.to_datetime(nc['end_date'], format='%Y%m%d', errors='coerce'), n_days - 1) + 1
+        st = _interval_matrix(n_days, n_codes, col, st_lo, st_hi)
+
+        return cls(codes, start, np.packbits(listed & ~st, axis=1))
+
+    def __len__(self):
+        return len(self.packed)
+
+    def _row(self, date):
+        i = int((np.datetime64(pd.Timestamp(date), 'D') - self.start).astype(int))
+        if not 0 <= i < len(self.packed):
+            raise KeyError(f"{date} 不在股票池表范围内")
+        return i
+
+    def mask(self, date):
+        """date 当天的可交易布尔数组，与 self.codes 对齐"""
+        return np.unpackbits(self.packed[self._row(date)], count=len(self.codes)).astype(bool)
+
+    def members(self, date):
+        """date 当天可交易（在市且非 ST）的股票"""
+        return self.codes[self.mask(date)].tolist()
+
+    def is_member(self, date, ts_code):
+        i = self._index.get(ts_code)
+        if i is None:
+            return False
+        return bool(self.packed[self._row(date), i >> 3] & (0x80 >> (i & 7)))
+
+    def ever_members(self, start_date=None, end_date=None):
+        """区间内任意一天可交易过的股票，用于确定需要下载的范围（含期间退市、摘帽的股票）"""
+        lo = self._row(start_date) if start_date is not None else 0
+        hi = self._row(end_date) + 1 if end_date is not None else len(self.packed)
+        packed = np.bitwise_or.reduce(self.packed[lo:hi], axis=0)
+        return self.codes[np.unpackbits(packed, count=len(self.codes)).astype(bool)].tolist()
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, codes=self.codes, start=np.array(str(self.start)), packed=self.packed)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f['codes'], str(f['start']), f['packed'])
+
+
+def load_membership(start_date, end_date, pro=None, root=UNIVERSE_DIR):
+    """
+    加载逐日股票池：同一份 stock_basic 快照和日期范围只构造一次，之后从本地 .npz 读取
+    """
+    universe = load_universe(pro, root)
+    version = os.path.splitext(universe.version)[0] if universe.version else 'adhoc'
+    path = os.path.join(root, f'membership_{start_date}_{end_date}_{version}.npz')
+    if os.path.exists(path):
+        return MembershipTable.load(path)
+    table = MembershipTable.build(universe, load_namechange(pro, root), start_date, end_date)
+    table.save(path)
+    return table
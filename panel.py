@@ -0,0 +1,141 @@
+import numpy as np
+import backtrader as bt
+
+from bar_store import BAR_FIELDS
+from shared_feed import to_bt_datenum
+
+# ================== 日期对齐面板 ==================
+# 全市场几千个数据源的上市日期、停牌缺口各不相同，backtrader 每根 K 线都要逐个比对时钟，
+# 而且 d.close[-3] 这类回看在停牌后会跨过缺口取到很早以前的价格。
+# 这里先把列式存储散射到一张 (交易日 × 股票) 的稠密面板上，缺口用掩码显式标出：
+#   traded     当天有成交的 K 线
+#   listed     首个交易日之后（含）
+#   suspended  listed 且当天没有成交，即停牌
+# 面板上的数据源共用同一条时间轴，Cerebro 不再需要对齐；向量化扫描直接在二维数组上做平移。
+# 停牌日 PanelData 仍输出一根 K 线（沿用收盘价、成交量 0、suspended 为 1），保持时间轴对齐；
+# AShareBroker 遇到这种 K 线不成交，订单留到复牌。换用其他 broker 时策略需自行检查 suspended。
+
+_FILL_FIELDS = ('open', 'high', 'low', 'close', 'pre_close')
+
+
+class AlignedPanel:
+    """(交易日 × 股票) 稠密面板，fields 中的数组形状均为 (len(dates), len(codes))，无 K 线处为 NaN"""
+
+    def __init__(self, dates, codes, fields, traded):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.codes = np.asarray(codes, dtype='<U12')
+        self.fields = fields
+        self.traded = traded
+        self.listed = np.logical_or.accumulate(traded, axis=0)
+        self.suspended = self.listed & ~traded
+        self.datenum = to_bt_datenum(self.dates)
+        self._index = {code: i for i, code in enumerate(self.codes.tolist())}
+        self._filled = None
+
+    @classmethod
+    def from_store(cls, store, codes=None, start_date=None, end_date=None, calendar=None):
+        """
+        :param store: BarStore 或 SharedBarPanel
+        :param calendar: TradeCalendar，作为面板的时间轴；为 None 时取这些股票出现过的全部日期
+        """
+        codes = [c for c in (store.codes.tolist() if codes is None else codes) if c in store]
+        bounds = [store._bounds(c, start_date, end_date) for c in codes]
+        idx = np.concatenate([np.arange(lo, hi) for lo, hi in bounds]) if bounds else np.array([], dtype=np.int64)
+        cols = np.repeat(np.arange(len(codes)), [hi - lo for lo, hi in bounds])
+        trade_date = np.asarray(store.trade_date)[idx].astype('datetime64[D]')
+
+        if calendar is not None:
+            dates = calendar.range(start_date or trade_date.min(), end_date or trade_date.max())
+        else:
+            dates = np.unique(trade_date)
+
+        # 每根 K 线在时间轴上的行号，不在时间轴上的（如非交易日的脏数据）丢弃
+        rows = np.searchsorted(dates, trade_date)
+        keep = rows < len(dates)
+        keep[keep] = dates[rows[keep]] == trade_date[keep]
+        rows, cols, idx = rows[keep], cols[keep], idx[keep]
+
+        shape = (len(dates), len(codes))
+        fields = {}
+        for f in BAR_FIELDS:
+            arr = np.full(shape, np.nan)
+            arr[rows, cols] = np.asarray(store.columns[f])[idx]
+            fields[f] = arr
+        traded = np.zeros(shape, dtype=bool)
+        traded[rows, cols] = fields['vol'][rows, cols] > 0
+        return cls(dates, codes, fields, traded)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, ts_code):
+        return ts_code in self._index
+
+    def filled(self):
+        """
+        供数据源使用的填充版本：停牌日价格沿用最近一次收盘价、成交量为 0，上市前保持 NaN
+        沿用的价格只用于回看和估值，不能作为成交价（见 AShareBroker._halted）
+        结果缓存，fork 出的子进程可直接共享
+        """
+        if self._filled is None:
+            rows = np.where(self.traded, np.arange(len(self.dates))[:, None], 0)
+            last = np.maximum.accumulate(rows, axis=0)
+            cols = np.arange(len(self.codes))[None, :]
+            last_close = np.where(self.listed, self.fields['close'][last, cols], np.nan)
+
+            filled = {}
+            for f in _FILL_FIELDS:
+                filled[f] = np.where(self.traded, self.fields[f], last_close)
+            for f in ('vol', 'amount'):
+                filled[f] = np.where(self.traded, self.fields[f], np.where(self.listed, 0.0, np.nan))
+            self._filled = filled
+        return self._filled
+
+    def add_feeds(self, cerebro, codes=None):
+        """把面板上的股票作为 PanelData 加入 Cerebro，返回加入的代码"""
+        codes = self.codes.tolist() if codes is None else [c for c in codes if c in self._index]
+        self.filled()
+        for ts_code in codes:
+            cerebro.adddata(PanelData(panel=self, ts_code=ts_code, name=ts_code))
+        return codes
+
+
+class PanelData(bt.feed.DataBase):
+    """读取 AlignedPanel 一列的数据源，所有股票共用面板的时间轴，停牌日 suspended 为 1"""
+    lines = ('pre_close', 'suspended')
+    params = (
+        ('panel', None),
+        ('ts_code', None),
+    )
+
+    def start(self):
+        super(PanelData, self).start()
+        panel = self.p.panel
+        j = panel._index[self.p.ts_code]
+        filled = panel.filled()
+        self._dtnum = panel.datenum
+        self._open = filled['open'][:, j]
+        self._high = filled['high'][:, j]
+        self._low = filled['low'][:, j]
+        self._close = filled['close'][:, j]
+        self._volume = filled['vol'][:, j]
+        self._pre_close = filled['pre_close'][:, j]
+        self._suspended = panel.suspended[:, j]
+        self._idx = -1
+
+    def _load(self):
+        self._idx += 1
+        i = self._idx
+        if i >= len(self._dtnum):
+            return False
+        lines = self.lines
+        lines.datetime[0] = self._dtnum[i]
+        lines.open[0] = self._open[i]
+        lines.high[0] = self._high[i]
+        lines.low[0] = self._low[i]
+        lines.close[0] = self._close[i]
+        lines.volume[0] = self._volume[i]
+        lines.openinterest[0] = 0.0
+        lines.pre_close[0] = self._pre_close[i]
+        lines.suspended[0] = float(self._suspended[i])
+        return True
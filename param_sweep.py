@@ -0,0 +1,137 @@
+import itertools
+import multiprocessing as mp
+import os
+import random
+
+import backtrader as bt
+import pandas as pd
+
+from analytics import EquityRecorder, summarize
+from bar_store import BarStore, PandasBarData
+from shared_feed import SharedBarPanel, SharedBarData
+
+# ================== 参数寻优 ==================
+# 数据在主进程只加载一次：fork 启动的子进程直接继承（写时复制），
+# 其他平台通过进程池 initializer 每个进程只传一次，而不是每组参数都序列化一遍。
+# 传入 BarStore/SharedBarPanel 时各进程直接读取同一份内存，不再构造 DataFrame 副本。
+
+_SWEEP_DATA = None  # 子进程共享的行情，DataFrame、{name: DataFrame} 或 BarStore/SharedBarPanel
+
+
+def run_once(strategy, data, params=None, cash=100000, commission=0.001, coc=False, sizer=None,
+             codes=None, start_date=None, end_date=None, indicator_cache=None):
+    """
+    单次回测并返回汇总指标（analytics.summarize）
+    :param data: 单只股票的 DataFrame，{ts_code: DataFrame}（多标的策略），或 BarStore/SharedBarPanel
+    :param sizer: (sizer 类, 参数字典)，如 (bt.sizers.PercentSizer, {'percents': 50})
+    :param codes: data 为 BarStore/SharedBarPanel 时参与回测的股票，None 表示全部
+    :param indicator_cache: indicator_cache.IndicatorCache，作为 indicator_cache 参数传给策略；
+                            传入进程池后每个子进程使用自己的内存缓存，共用同一个落盘目录
+    """
+    cerebro = bt.Cerebro(stdstats=False)
+    if isinstance(data, BarStore):
+        for ts_code in (data.codes.tolist() if codes is None else codes):
+            cerebro.adddata(SharedBarData(store=data, ts_code=ts_code, start_date=start_date,
+                                          end_date=end_date, name=ts_code))
+    else:
+        frames = data if isinstance(data, dict) else {None: data}
+        for name, df in frames.items():
+            cerebro.adddata(PandasBarData(dataname=df, name=name))
+    params = dict(params or {})
+    if indicator_cache is not None:
+        params['indicator_cache'] = indicator_cache
+    cerebro.addstrategy(strategy, **params)
+    if coc:
+        cerebro.broker = bt.brokers.BackBroker(coc=True)
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=commission)
+    if sizer is not None:
+        cerebro.addsizer(sizer[0], **sizer[1])
+    # 只记录净值和成交，夏普、回撤、胜率等在回测结束后向量化计算
+    cerebro.addanalyzer(EquityRecorder, _name='equity')
+
+    result = cerebro.run()[0]
+    return summarize(result.analyzers.equity.get_analysis())
+
+
+def param_grid(grid):
+    """网格参数：{'a': [1, 2], 'b': [3]} -> [{'a': 1, 'b': 3}, {'a': 2, 'b': 3}]"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(list(grid[k]) for k in keys))]
+
+
+def random_params(space, n_iter, seed=None):
+    """
+    随机搜索参数
+    :param space: 取值列表表示离散选择，(low, high) 二元组表示区间（均为整数时取整数）
+    """
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(n_iter):
+        sample = {}
+        for key, values in space.items():
+            if isinstance(values, tuple) and len(values) == 2:
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    sample[key] = rng.randint(low, high)
+                else:
+                    sample[key] = rng.uniform(low, high)
+            else:
+                sample[key] = rng.choice(list(values))
+        samples.append(sample)
+    return samples
+
+
+def _init_worker(data):
+    global _SWEEP_DATA
+    _SWEEP_DATA = data
+
+
+def _run_task(task):
+    strategy, params, kwargs = task
+    try:
+        metrics = run_once(strategy, _SWEEP_DATA, params, **kwargs)
+    except Exception as e:
+        metrics = {'error': repr(e)}
+    return {**params, **metrics}
+
+
+def run_sweep(strategy, data, params_list, processes=None, **kwargs):
+    """
+    多进程并行回测一组参数
+    :param params_list: param_grid / random_params 生成的参数列表
+    :param kwargs: 透传给 run_once（cash、commission、coc、sizer、codes、indicator_cache 等）
+    :return: 每组参数一行的指标 DataFrame
+    """
+    global _SWEEP_DATA
+    processes = processes or os.cpu_count()
+    tasks = [(strategy, params, kwargs) for params in params_list]
+
+    if 'fork' in mp.get_all_start_methods():
+        _SWEEP_DATA = data
+        pool = mp.get_context('fork').Pool(processes)
+    else:
+        pool = mp.Pool(processes, initializer=_init_worker, initargs=(data,))
+
+    chunksize = max(1, len(tasks) // (processes * 4))
+    with pool:
+        rows = list(pool.imap_unordered(_run_task, tasks, chunksize=chunksize))
+    _SWEEP_DATA = None
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    from indicator_cache import IndicatorCache
+    from wave_strategy import Strategy_wave1
+
+    stock_index = '002057.SZ'
+    panel = SharedBarPanel.from_store(BarStore(), codes=[stock_index])
+
+    grid = param_grid({'smoothing_period': range(3, 21), 'stack_len': [3, 4, 5]})
+    try:
+        # 每个均线周期只计算一次，三种 stack_len 共用
+        results = run_sweep(Strategy_wave1, panel, grid, codes=[stock_index], cash=2000, coc=True,
+                            indicator_cache=IndicatorCache())
+    finally:
+        panel.close()
+    print(results.sort_values('net_profit', ascending=False).head(10))
@@ -0,0 +1,271 @@
+import argparse
+import bisect
+import cProfile
+import importlib
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+# ================== 回测性能剖析 ==================
+# Profiler 提供三类数据：
+#   phase()        分阶段计时（拉数据、解析、构造数据源、指标初始化、回测），可选 tracemalloc 统计分配
+#   instrument()   生成策略子类，逐根记录 next()/prenext() 耗时到对数分桶直方图，开销约为两次 perf_counter_ns
+#   StackSampler   后台线程定时采样主线程调用栈，输出 flamegraph.pl / speedscope 可读的折叠栈
+# 另外可以打开 cProfile，导出 pstats 文件供 snakeviz 等工具查看。
+
+LATENCY_EDGES_NS = np.logspace(3, 10, 57).astype(np.int64).tolist()  # 1µs ~ 10s，每 10 倍 8 个桶
+
+
+class LatencyHistogram:
+    """对数分桶的耗时直方图，单位纳秒"""
+
+    def __init__(self, edges=LATENCY_EDGES_NS):
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, ns):
+        self.counts[bisect.bisect_right(self.edges, ns)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, q):
+        """返回第 q 百分位所在桶的上界（纳秒）"""
+        if not self.count:
+            return 0
+        target = self.count * q / 100
+        cum = 0
+        for i, c in enumerate(self.counts):
+            cum += c
+            if cum >= target:
+                return self.edges[i] if i < len(self.edges) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count / 1e3 if self.count else 0.0,
+            'p50_us': self.percentile(50) / 1e3,
+            'p90_us': self.percentile(90) / 1e3,
+            'p99_us': self.percentile(99) / 1e3,
+            'max_us': self.max / 1e3,
+            'buckets': {f'<{e / 1e3:g}us': c for e, c in zip(self.edges, self.counts) if c},
+        }
+
+
+class StackSampler:
+    """定时采样指定线程的调用栈，结果为 {'a;b;c': 次数} 的折叠栈"""
+
+    def __init__(self, interval=0.001, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if names:
+                key = ';'.join(reversed(names))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f'{stack} {count}\n')
+
+
+class Profiler:
+    """分阶段计时、next() 耗时直方图、内存分配和调用栈采样"""
+
+    def __init__(self, trace_alloc=False, sample_interval=None, cprofile=False):
+        """
+        :param trace_alloc: 用 tracemalloc 统计每个阶段新增的内存和峰值（会让整体变慢 2~3 倍）
+        :param sample_interval: 调用栈采样间隔（秒），None 表示不采样
+        :param cprofile: 同时打开 cProfile
+        """
+        self.phases = {}
+        self.latency = {}
+        self.trace_alloc = trace_alloc
+        self.sampler = StackSampler(sample_interval) if sample_interval else None
+        self.cprofile = cProfile.Profile() if cprofile else None
+
+    @contextmanager
+    def phase(self, name):
+        """累计一个阶段的耗时（同名阶段多次进入时累加）"""
+        stat = self.phases.setdefault(name, {'calls': 0, 'seconds': 0.0, 'alloc_bytes': 0, 'peak_bytes': 0})
+        if self.trace_alloc:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stat['calls'] += 1
+            stat['seconds'] += time.perf_counter() - start
+            if self.trace_alloc:
+                current, peak = tracemalloc.get_traced_memory()
+                stat['alloc_bytes'] += current - before
+                stat['peak_bytes'] = max(stat['peak_bytes'], peak - before)
+
+    def wrap(self, func, name=None):
+        """把函数的每次调用计入同名阶段，如 get_data = profiler.wrap(get_data, 'fetch')"""
+        name = name or func.__name__
+
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+
+    def instrument(self, strategy_cls):
+        """
+        返回记录耗时的策略子类：__init__（指标初始化）计入 '<策略名>.init' 阶段，
+        每次 next()/prenext() 计入直方图
+        """
+        profiler = self
+        name = strategy_cls.__name__
+        hist_next = self.latency.setdefault(f'{name}.next', LatencyHistogram())
+        hist_prenext = self.latency.setdefault(f'{name}.prenext', LatencyHistogram())
+        clock = time.perf_counter_ns
+
+        def __init__(self, *args, **kwargs):
+            with profiler.phase(f'{name}.init'):
+                strategy_cls.__init__(self, *args, **kwargs)
+
+        def next(self):
+            t = clock()
+            strategy_cls.next(self)
+            hist_next.add(clock() - t)
+
+        def prenext(self):
+            t = clock()
+            strategy_cls.prenext(self)
+            hist_prenext.add(clock() - t)
+
+        return type(name, (strategy_cls,), {'__init__': __init__, 'next': next, 'prenext': prenext,
+                                            '__module__': strategy_cls.__module__})
+
+    @contextmanager
+    def profile(self):
+        """在此范围内打开 tracemalloc、调用栈采样和 cProfile"""
+        if self.trace_alloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.sampler is not None:
+            self.sampler.start()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        try:
+            yield self
+        finally:
+            if self.cprofile is not None:
+                self.cprofile.disable()
+            if self.sampler is not None:
+                self.sampler.stop()
+
+    def report(self):
+        report = {
+            'phases': self.phases,
+            'latency': {k: h.summary() for k, h in self.latency.items() if h.count},
+        }
+        if self.trace_alloc and tracemalloc.is_tracing():
+            top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+            report['top_allocations'] = [{'where': str(s.traceback), 'bytes': s.size, 'blocks': s.count} for s in top]
+        return report
+
+    def print_report(self):
+        report = self.report()
+        print('阶段耗时：')
+        for name, stat in report['phases'].items():
+            alloc = f"  新增 {stat['alloc_bytes'] / 2 ** 20:.1f}MB 峰值 {stat['peak_bytes'] / 2 ** 20:.1f}MB" if self.trace_alloc else ''
+            print(f"  {name:<24} {stat['seconds']:9.3f}s  x{stat['calls']}{alloc}")
+        for name, s in report['latency'].items():
+            print(f"{name}: {s['count']} 次  平均 {s['mean_us']:.1f}µs  p50<{s['p50_us']:.3g}µs  "
+                  f"p90<{s['p90_us']:.3g}µs  p99<{s['p99_us']:.3g}µs  最大 {s['max_us']:.1f}µs")
+
+    def save(self, prefix):
+        """写出 <prefix>.json 报告，以及（如已开启）<prefix>.collapsed 折叠栈和 <prefix>.pstats"""
+        with open(f'{prefix}.json', 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        if self.sampler is not None:
+            self.sampler.write_collapsed(f'{prefix}.collapsed')
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(f'{prefix}.pstats')
+
+
+# ================== 命令行 ==================
+STRATEGIES = {
+    'wave': ('wave_strategy', 'Strategy_wave1', {'coc': True, 'cash': 2000}),
+    'turtle': ('TurtleStrategy', 'TurtleStrategy', {'cash': 100000}),
+    'limitup': ('limit_up_decrease_gpt', 'LimitUpStrategy', {'cash': 1000000}),
+    'double_sma': ('test', 'DoubleSMA', {'cash': 100000}),
+}
+
+
+def profile_backtest(strategy, codes, start_date=None, end_date=None, root=None, profiler=None, **params):
+    """从列式存储加载数据，按阶段计时跑一次回测"""
+    import backtrader as bt
+    from bar_store import BarStore, BAR_STORE_DIR
+    from shared_feed import SharedBarData
+
+    profiler = profiler or Profiler()
+    module, cls_name, broker = STRATEGIES[strategy]
+    with profiler.profile():
+        with profiler.phase('import'):
+            strategy_cls = getattr(importlib.import_module(module), cls_name)
+        with profiler.phase('open_store'):
+            store = BarStore(root or BAR_STORE_DIR)
+        with profiler.phase('build_feeds'):
+            cerebro = bt.Cerebro(stdstats=False)
+            for ts_code in codes:
+                cerebro.adddata(SharedBarData(store=store, ts_code=ts_code, start_date=start_date,
+                                              end_date=end_date, name=ts_code))
+        cerebro.addstrategy(profiler.instrument(strategy_cls), **params)
+        if broker.get('coc'):
+            cerebro.broker = bt.brokers.BackBroker(coc=True)
+        cerebro.broker.setcash(broker['cash'])
+        with profiler.phase('run'):
+            cerebro.run()
+    return profiler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='剖析一次回测的耗时分布')
+    parser.add_argument('strategy', choices=sorted(STRATEGIES))
+    parser.add_argument('codes', nargs='+')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--alloc', action='store_true', help='统计内存分配')
+    parser.add_argument('--sample', type=float, default=0.001, help='调用栈采样间隔（秒），0 表示关闭')
+    parser.add_argument('--cprofile', action='store_true')
+    parser.add_argument('--out', default='profile', help='输出文件前缀')
+    args = parser.parse_args()
+
+    prof = Profiler(trace_alloc=args.alloc, sample_interval=args.sample or None, cprofile=args.cprofile)
+    profile_backtest(args.strategy, args.codes, args.start, args.end, profiler=prof)
+    prof.print_report()
+    prof.save(args.out)
@@ -0,0 +1,254 @@
+import html
+import multiprocessing as mp
+import os
+
+import numpy as np
+
+from analytics import attribution, drawdown, summarize
+from shared_feed import EPOCH_ORDINAL
+
+# ================== 回测报告 ==================
+# cerebro.plot() 会弹出交互窗口，而且把每个数据源的每一根 K 线都画出来，全市场回测几分钟都画不完。
+# write_report() 用 Agg 后端直接输出 PNG 和一个 index.html，不需要图形界面：
+#   - 只画有成交的股票（可用 max_tickers 按收益绝对值取前 N 只），其余数据源不取数据也不出图；
+#   - 序列长于图宽时按像素分桶：折线每桶保留最小、最大值，K 线每桶合并为一根 OHLC，形状不丢；
+#   - 各股票的图在进程池里并行生成，fork 启动时子进程直接继承数组。
+# 需要在回测前添加 analytics.EquityRecorder：
+#   cerebro.addanalyzer(EquityRecorder, _name='equity')
+#   result = cerebro.run()[0]
+#   write_report(result)
+
+REPORT_DIR = 'reports'
+REPORT_WIDTH = 1200  # 图宽（像素），也是分桶数的上限
+REPORT_DPI = 100
+
+_UP_COLOR = 'red'  # A 股习惯：涨红跌绿
+_DOWN_COLOR = 'green'
+
+
+def _to_datetime64(datenum):
+    """backtrader 的日期浮点数 -> datetime64[s]"""
+    return ((np.asarray(datenum) - EPOCH_ORDINAL) * 86400).round().astype('datetime64[s]')
+
+
+def _bucket_bounds(n, buckets):
+    return np.linspace(0, n, min(buckets, n) + 1).astype(np.int64)
+
+
+def decimate_minmax(y, buckets=REPORT_WIDTH):
+    """
+    折线降采样：每桶保留最小值和最大值（按原先后顺序），输出最多 2 * buckets 个点
+    :return: 保留点在原序列中的下标
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    bounds = _bucket_bounds(n, buckets)
+    starts = bounds[:-1]
+    width = int(np.diff(bounds).max())
+    # 不足宽度的桶用本桶最后一个值补齐，补齐的值不改变桶内最值
+    cols = np.minimum(starts[:, None] + np.arange(width), (bounds[1:] - 1)[:, None])
+    windows = np.where(np.isnan(y[cols]), np.nanmean(y), y[cols])
+    lo = cols[np.arange(len(starts)), windows.argmin(axis=1)]
+    hi = cols[np.arange(len(starts)), windows.argmax(axis=1)]
+    return np.unique(np.concatenate([lo, hi]))
+
+
+def decimate_ohlc(open_, high, low, close, buckets=REPORT_WIDTH):
+    """
+    K 线降采样：每桶合并为一根（首根开盘、最高、最低、末根收盘）
+    :return: (每桶首根的下标, open, high, low, close)
+    """
+    n = len(close)
+    if n <= buckets:
+        return np.arange(n), open_, high, low, close
+    bounds = _bucket_bounds(n, buckets)
+    starts = bounds[:-1]
+    return (starts, open_[starts], np.fmax.reduceat(high, starts), np.fmin.reduceat(low, starts),
+            close[bounds[1:] - 1])
+
+
+# ================== 绘图（子进程中执行） ==================
+def _pyplot():
+    # 每个进程第一次画图时才加载 matplotlib，并固定为无界面的 Agg 后端
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _new_figure(height, rows=1, ratios=None):
+    plt = _pyplot()
+    fig, axes = plt.subplots(rows, 1, sharex=True, squeeze=False, figsize=(REPORT_WIDTH / REPORT_DPI, height),
+                             gridspec_kw={'height_ratios': ratios} if ratios else None)
+    # 固定边距，不用 tight_layout（每张图都要额外排版一次）
+    fig.subplots_adjust(left=0.06, right=0.98, top=0.93, bottom=0.08, hspace=0.08)
+    for ax in axes[:, 0]:
+        ax.grid(alpha=0.3)
+    return plt, fig, axes[:, 0]
+
+
+def _save(fig, path):
+    # PNG 低压缩级别，编码时间是绘图的大头，文件稍大无妨
+    fig.savefig(path, dpi=REPORT_DPI, pil_kwargs={'compress_level': 1})
+
+
+_TICKER_FIGURE = None  # 本进程复用的单股票画布 (fig, ax)
+
+
+def _ticker_axes():
+    global _TICKER_FIGURE
+    if _TICKER_FIGURE is None:
+        from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+        from matplotlib.lines import Line2D
+
+        _, fig, (ax,) = _new_figure(4)
+        locator = AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+        ax.legend(handles=[Line2D([], [], marker='^', color=_UP_COLOR, linestyle='', label='buy'),
+                           Line2D([], [], marker='v', color=_DOWN_COLOR, linestyle='', label='sell')],
+                  loc='upper left')
+        _TICKER_FIGURE = fig, ax
+    return _TICKER_FIGURE
+
+
+def _plot_ticker(task):
+    """单只股票的价格图：收盘价折线或 K 线，叠加买卖点；同一进程内复用画布，只替换数据"""
+    from matplotlib.dates import date2num
+
+    name, path, style, bars, fills = task
+    dt, open_, high, low, close = bars
+    fill_dt, fill_price, fill_size = fills
+    fig, ax = _ticker_axes()
+    for artist in ax.lines[:] + ax.collections[:] + ax.patches[:]:
+        artist.remove()
+
+    x = date2num(_to_datetime64(dt))
+    if style == 'candle':
+        idx, o, h, l, c = decimate_ohlc(open_, high, low, close)
+        xs = x[idx]
+        colors = np.where(c >= o, _UP_COLOR, _DOWN_COLOR)
+        # 每根 K 线的宽度取相邻两根最小间隔（天）的 0.6 倍
+        step = np.diff(xs).min() if len(xs) > 1 else 1.0
+        ax.vlines(xs, l, h, colors=colors, linewidth=0.6)
+        ax.bar(xs, np.where(c == o, 1e-9, c - o), bottom=o, width=step * 0.6, color=colors)
+        y_lo, y_hi = np.nanmin(low), np.nanmax(high)
+    else:
+        idx = decimate_minmax(close)
+        ax.plot(x[idx], close[idx], color='tab:blue', linewidth=0.8)
+        y_lo, y_hi = np.nanmin(close), np.nanmax(close)
+    fx = date2num(_to_datetime64(fill_dt))
+    buy = fill_size > 0
+    ax.scatter(fx[buy], fill_price[buy], marker='^', color=_UP_COLOR, s=30, zorder=3)
+    ax.scatter(fx[~buy], fill_price[~buy], marker='v', color=_DOWN_COLOR, s=30, zorder=3)
+    if len(fill_price):
+        y_lo, y_hi = min(y_lo, fill_price.min()), max(y_hi, fill_price.max())
+    pad = (y_hi - y_lo) * 0.05 or 1.0
+    ax.set_xlim(x[0] - 1, x[-1] + 1)
+    ax.set_ylim(y_lo - pad, y_hi + pad)
+    ax.set_title(name)
+    _save(fig, path)
+    return path
+
+
+def _plot_equity(rec, path):
+    """净值曲线和回撤"""
+    plt, fig, (ax, ax_dd) = _new_figure(5, rows=2, ratios=[3, 1])
+    x = _to_datetime64(rec['datetime'])
+    value = rec['value']
+    idx = decimate_minmax(value)
+    ax.plot(x[idx], value[idx], color='tab:blue', linewidth=0.8)
+    ax.axhline(rec['start_cash'], color='gray', linewidth=0.6, linestyle='--')
+    ax.set_title('equity')
+    dd = -drawdown(value)[0] * 100
+    idx = decimate_minmax(dd)
+    ax_dd.fill_between(x[idx], dd[idx], 0, color='tab:red', alpha=0.4, linewidth=0)
+    ax_dd.set_ylabel('drawdown %')
+    _save(fig, path)
+    plt.close(fig)
+    return path
+
+
+# ================== 报告 ==================
+def _series(line, n):
+    return np.asarray(line.get(ago=0, size=n), dtype=float)
+
+
+def _ticker_tasks(strategy, rec, codes, out_dir, style):
+    """只为 codes 中的数据源取数组，成交按日期对应到各自数据源"""
+    datas = strategy.datas
+    fill_dt = rec['datetime'][np.minimum(rec['fill_bar'], len(rec['datetime']) - 1)]
+    tasks = []
+    for i in codes:
+        d = datas[i]
+        n = len(d)
+        bars = tuple(_series(line, n) for line in (d.datetime, d.open, d.high, d.low, d.close))
+        mask = rec['fill_data'] == i
+        name = d._name or f'data{i}'
+        path = os.path.join(out_dir, f'{name}.png')
+        tasks.append((name, path, style, bars, (fill_dt[mask], rec['fill_price'][mask], rec['fill_size'][mask])))
+    return tasks
+
+
+def _fmt(v):
+    if isinstance(v, int):
+        return f'{v:,}'
+    return f'{v:,.2f}' if abs(v) >= 1000 else f'{v:.4g}'
+
+
+def _write_index(path, stats, rows):
+    cells = ''.join(f'<tr><th>{html.escape(k)}</th><td>{_fmt(v)}</td></tr>' for k, v in stats.items())
+    tickers = ''.join(
+        f'<tr><td>{html.escape(name)}</td><td>{pnl:.2f}</td>'
+        f'<td><a href="{html.escape(img)}"><img src="{html.escape(img)}" width="600" loading="lazy"></a></td></tr>'
+        for name, pnl, img in rows)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>回测报告</title>
+<style>body{{font-family:sans-serif}} table{{border-collapse:collapse}} td,th{{padding:2px 8px;text-align:left}}</style>
+</head><body>
+<h2>净值</h2><img src="equity.png">
+<h2>统计</h2><table>{cells}</table>
+<h2>有成交的股票（{len(rows)} 只，按收益排序）</h2>
+<table><tr><th>股票</th><th>收益</th><th>图</th></tr>{tickers}</table>
+</body></html>
+""")
+
+
+def write_report(strategy, out_dir=REPORT_DIR, analyzer='equity', style='line', max_tickers=None,
+                 processes=None):
+    """
+    回测结束后输出 PNG 图和 index.html
+    :param strategy: cerebro.run() 返回的策略实例
+    :param analyzer: analytics.EquityRecorder 的 _name
+    :param style: 'line' 收盘价折线，'candle' K 线
+    :param max_tickers: 只画收益绝对值最大的前 N 只有成交的股票，None 表示全部
+    :param processes: 绘图进程数，1 表示在当前进程中逐个绘制
+    :return: index.html 路径
+    """
+    rec = getattr(strategy.analyzers, analyzer).get_analysis()
+    os.makedirs(out_dir, exist_ok=True)
+    pnl = attribution(rec)
+    index = {d._name if d._name is not None else i: i for i, d in enumerate(strategy.datas)}
+    names = sorted(pnl, key=lambda k: -abs(pnl[k]))[:max_tickers]
+    tasks = _ticker_tasks(strategy, rec, [index[k] for k in names], out_dir, style)
+
+    processes = processes or os.cpu_count()
+    if processes > 1 and len(tasks) > 1:
+        ctx = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else mp.get_context()
+        with ctx.Pool(min(processes, len(tasks))) as pool:
+            # 净值图在主进程里和各股票的图同时画
+            pending = pool.map_async(_plot_ticker, tasks, chunksize=max(1, len(tasks) // (processes * 4)))
+            _plot_equity(rec, os.path.join(out_dir, 'equity.png'))
+            paths = pending.get()
+    else:
+        _plot_equity(rec, os.path.join(out_dir, 'equity.png'))
+        paths = [_plot_ticker(task) for task in tasks]
+
+    rows = [(str(name), pnl[name], os.path.basename(path)) for name, path in zip(names, paths)]
+    rows.sort(key=lambda r: -r[1])
+    path = os.path.join(out_dir, 'index.html')
+    _write_index(path, summarize(rec), rows)
+    return path
@@ -0,0 +1,135 @@
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+import backtrader as bt
+
+from bar_store import BarStore, BAR_FIELDS
+
+# ================== 共享内存行情 ==================
+# SharedBarPanel 把列式存储的全部数组复制进一块 multiprocessing.shared_memory，
+# 序列化时只传共享内存名和布局，子进程直接挂载同一块内存，不再各自复制 DataFrame。
+# SharedBarData 是直接从数组逐根读取的数据源，既能挂在 SharedBarPanel 上，
+# 也能直接挂在内存映射的 BarStore 上。
+
+EPOCH_ORDINAL = 719163  # datetime(1970, 1, 1).toordinal()，用于换算 backtrader 的日期数值
+
+
+def to_bt_datenum(trade_date):
+    """datetime64 数组 -> backtrader 使用的日期浮点数（与 bt.date2num 一致）"""
+    days = np.asarray(trade_date).astype('datetime64[D]').astype(np.int64)
+    return (days + EPOCH_ORDINAL).astype(np.float64)
+
+
+class SharedBarPanel(BarStore):
+    """放在共享内存中的全市场日线，接口与 BarStore 相同"""
+
+    def __init__(self, shm_name, layout, codes, shm=None):
+        self.root = None
+        self.version = shm_name
+        self._layout = layout
+        self._owner = shm is not None
+        if shm is not None:
+            self._shm = shm
+        elif sys.version_info >= (3, 13):
+            self._shm = shared_memory.SharedMemory(name=shm_name, track=False)
+        else:
+            # 进程池子进程与创建方共用同一个 resource_tracker，重复登记无副作用，
+            # 不能在这里注销，否则创建方 unlink 时会重复注销
+            self._shm = shared_memory.SharedMemory(name=shm_name)
+
+        views = {key: np.ndarray(shape, dtype=np.dtype(dtype), buffer=self._shm.buf, offset=offset)
+                 for key, (offset, dtype, shape) in layout.items()}
+        for view in views.values():
+            view.flags.writeable = self._owner
+        self.codes = np.asarray(codes, dtype='<U12')
+        self.offsets = views['offsets']
+        self.trade_date = views['trade_date']
+        self.columns = {f: views[f] for f in BAR_FIELDS}
+        self._index = {code: i for i, code in enumerate(self.codes.tolist())}
+
+    @classmethod
+    def from_store(cls, store, codes=None):
+        """把 BarStore（可只取部分股票）复制进一块新的共享内存"""
+        if codes is not None:
+            store = _SubsetView(store, codes)
+        arrays = {'offsets': np.asarray(store.offsets, dtype=np.int64),
+                  'trade_date': np.asarray(store.trade_date, dtype='datetime64[ns]')}
+        for f in BAR_FIELDS:
+            arrays[f] = np.asarray(store.columns[f], dtype=np.float64)
+
+        layout, size = {}, 0
+        for key, arr in arrays.items():
+            layout[key] = (size, arr.dtype.str, arr.shape)
+            size += max(arr.nbytes, 1)
+            size = (size + 63) // 64 * 64  # 按 64 字节对齐
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for key, arr in arrays.items():
+            offset, dtype, shape = layout[key]
+            np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)[...] = arr
+        return cls(shm.name, layout, store.codes.tolist(), shm=shm)
+
+    def __reduce__(self):
+        # 只序列化共享内存名和布局，子进程反序列化时挂载
+        return self.__class__, (self.version, self._layout, self.codes.tolist())
+
+    def close(self):
+        """释放本进程的映射；创建方还会删除共享内存"""
+        self.offsets = self.trade_date = None
+        self.columns = {}
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class _SubsetView:
+    """从 BarStore 中抽取部分股票，仅供 SharedBarPanel.from_store 使用"""
+
+    def __init__(self, store, codes):
+        codes = [c for c in codes if c in store]
+        bounds = [store._bounds(c) for c in codes]
+        idx = np.concatenate([np.arange(lo, hi) for lo, hi in bounds]) if bounds else np.array([], dtype=np.int64)
+        self.codes = np.asarray(codes, dtype='<U12')
+        self.offsets = np.concatenate(([0], np.cumsum([hi - lo for lo, hi in bounds]))).astype(np.int64)
+        self.trade_date = np.asarray(store.trade_date)[idx]
+        self.columns = {f: np.asarray(store.columns[f])[idx] for f in BAR_FIELDS}
+
+
+class SharedBarData(bt.feed.DataBase):
+    """直接读取 BarStore/SharedBarPanel 数组的数据源，不构造 DataFrame"""
+    lines = ('pre_close',)
+    params = (
+        ('store', None),  # BarStore 或 SharedBarPanel
+        ('ts_code', None),
+        ('start_date', None),  # 'YYYYMMDD'
+        ('end_date', None),
+    )
+
+    def start(self):
+        super(SharedBarData, self).start()
+        arrays = self.p.store.arrays(self.p.ts_code, self.p.start_date, self.p.end_date)
+        self._dtnum = to_bt_datenum(arrays['trade_date'])
+        self._open = arrays['open']
+        self._high = arrays['high']
+        self._low = arrays['low']
+        self._close = arrays['close']
+        self._volume = arrays['vol']
+        self._pre_close = arrays['pre_close']
+        self._idx = -1
+
+    def _load(self):
+        self._idx += 1
+        i = self._idx
+        if i >= len(self._dtnum):
+            return False
+        lines = self.lines
+        lines.datetime[0] = self._dtnum[i]
+        lines.open[0] = self._open[i]
+        lines.high[0] = self._high[i]
+        lines.low[0] = self._low[i]
+        lines.close[0] = self._close[i]
+        lines.volume[0] = self._volume[i]
+        lines.openinterest[0] = 0.0
+        lines.pre_close[0] = self._pre_close[i]
+        return True
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# ================== 涨停回调信号预扫描 ==================
+# LimitUpStrategy 的买入条件只依赖各股票自身最近 5 根 K 线：
+#   3 天前涨停，之后连续 2 天缩量下跌，今天收涨。
+# 在全市场长表上用数组平移一次性算出所有满足条件的 (日期, 股票)，
+# 回测时 next() 只需查当天的候选列表，不再逐个数据源做行缓冲索引。
+
+
+def _lag(values, k):
+    """整体后移 k 行，前 k 行补 NaN"""
+    out = np.empty(len(values), dtype=np.float64)
+    out[:k] = np.nan
+    out[k:] = values[:len(values) - k]
+    return out
+
+
+def scan_limit_up_pullback(bars, use_pre_close=False, limit_col=None):
+    """
+    扫描涨停后缩量回调再收涨的买点
+    :param bars: 长表，需要 ts_code、trade_date、close、vol 列（use_pre_close 时还需要 pre_close）
+    :param use_pre_close: 涨停判断用 3 天前的 pre_close（ds 版本）而不是 4 天前的收盘价（gpt 版本）
+    :param limit_col: 直接使用已计算好的涨停标记列（如 limit_price 生成的 is_limit_up）
+    :return: {datetime.date: [ts_code, ...]}，列表按代码排序
+    """
+    df = bars.sort_values(['ts_code', 'trade_date'], kind='mergesort')
+    codes, _ = pd.factorize(df['ts_code'])
+    close = df['close'].to_numpy(dtype=np.float64)
+    vol = df['vol'].to_numpy(dtype=np.float64)
+
+    # 同一只股票内往前数 k 根 K 线是否存在
+    def has_lag(k):
+        ok = np.zeros(len(codes), dtype=bool)
+        ok[k:] = codes[k:] == codes[:len(codes) - k]
+        return ok
+
+    c1, c2, c3 = _lag(close, 1), _lag(close, 2), _lag(close, 3)
+    v1, v2, v3 = _lag(vol, 1), _lag(vol, 2), _lag(vol, 3)
+
+    if limit_col is not None:
+        is_limit_up = has_lag(3) & (_lag(df[limit_col].to_numpy(dtype=np.float64), 3) > 0)
+    elif use_pre_close:
+        p3 = _lag(df['pre_close'].to_numpy(dtype=np.float64), 3)
+        is_limit_up = has_lag(3) & (np.abs(c3 - p3 * 1.1) < 0.01)
+    else:
+        c4 = _lag(close, 4)
+        is_limit_up = has_lag(4) & (np.abs(c3 - c4 * 1.1) < 0.01)
+
+    signal = (is_limit_up
+              & (v2 < v3) & (v1 < v2)          # 连续 2 天缩量
+              & (c2 < c3) & (c1 < c2)          # 连续 2 天下跌
+              & (close > c1))                  # 今天上涨
+
+    hits = df.loc[signal, ['trade_date', 'ts_code']]
+    trade_date = hits['trade_date']
+    if not pd.api.types.is_datetime64_any_dtype(trade_date):
+        trade_date = pd.to_datetime(trade_date.astype(str), format='%Y%m%d')
+    dates = trade_date.dt.date
+    candidates = {}
+    for date, ts_code in sorted(zip(dates, hits['ts_code'])):
+        candidates.setdefault(date, []).append(ts_code)
+    return candidates
+
+
+def _lag_rows(values, k, fill=np.nan):
+    """二维数组沿日期轴后移 k 行，前 k 行补 fill"""
+    out = np.empty_like(values)
+    out[:k] = fill
+    out[k:] = values[:len(values) - k]
+    return out
+
+
+def scan_panel(panel, use_pre_close=False):
+    """
+    在 panel.AlignedPanel 上扫描同样的买点
+    回看按交易日对齐：窗口内有停牌或尚未上市的日期时不产生信号，不会跨过停牌缺口比较价格
+    :return: {datetime.date: [ts_code, ...]}，列表按代码排序
+    """
+    close = panel.fields['close']
+    vol = panel.fields['vol']
+    traded = panel.traded
+
+    c1, c2, c3 = _lag_rows(close, 1), _lag_rows(close, 2), _lag_rows(close, 3)
+    v1, v2, v3 = _lag_rows(vol, 1), _lag_rows(vol, 2), _lag_rows(vol, 3)
+    window = traded & _lag_rows(traded, 1, False) & _lag_rows(traded, 2, False) & _lag_rows(traded, 3, False)
+
+    if use_pre_close:
+        p3 = _lag_rows(panel.fields['pre_close'], 3)
+        is_limit_up = np.abs(c3 - p3 * 1.1) < 0.01
+    else:
+        c4 = _lag_rows(close, 4)
+        is_limit_up = _lag_rows(traded, 4, False) & (np.abs(c3 - c4 * 1.1) < 0.01)
+
+    signal = (window & is_limit_up
+              & (v2 < v3) & (v1 < v2)          # 连续 2 天缩量
+              & (c2 < c3) & (c1 < c2)          # 连续 2 天下跌
+              & (close > c1))                  # 今天上涨
+
+    order = np.argsort(panel.codes, kind='mergesort')
+    rows, cols = np.nonzero(signal[:, order])
+    dates = panel.dates[rows].tolist()
+    names = panel.codes[order][cols].tolist()
+    candidates = {}
+    for date, ts_code in zip(dates, names):
+        candidates.setdefault(date, []).append(ts_code)
+    return candidates
@@ -0,0 +1,126 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from limit_price import board_of
+
+# ================== 股票池缓存 ==================
+# stock_basic 快照按时间戳版本化保存在 data/universe/ 下，超过 TTL 才重新请求接口；
+# 加载时一次性算好 is_st、board、上市日期等列，筛选条件都是可以用 & | ~ 组合的布尔数组。
+
+UNIVERSE_DIR = 'data/universe'
+SNAPSHOT_TTL = timedelta(days=1)
+SNAPSHOT_KEEP = 5  # 保留最近几个版本
+STOCK_BASIC_FIELDS = 'ts_code,symbol,name,area,industry,market,exchange,list_status,list_date,delist_date'
+ST_PATTERN = r'[SＳ][TＴ]'  # ST、*ST、＊ST、SST 以及全角字母
+
+_CACHE = {}  # 快照路径 -> StockUniverse
+
+
+class StockUniverse:
+    """stock_basic 快照及预计算列，筛选方法均返回与 self.df 行对齐的布尔数组"""
+
+    def __init__(self, df, version=None):
+        df = df.reset_index(drop=True).copy()
+        df['list_date'] = pd.to_datetime(df['list_date'].astype(str), format='%Y%m%d', errors='coerce')
+        if 'delist_date' in df.columns:
+            df['delist_date'] = pd.to_datetime(df['delist_date'].astype(str), format='%Y%m%d', errors='coerce')
+        else:
+            df['delist_date'] = pd.NaT
+        df['is_st'] = df['name'].astype(str).str.contains(ST_PATTERN, regex=True).to_numpy()
+        df['board'] = board_of(df['ts_code'].to_numpy())
+        self.df = df
+        self.version = version
+        self.codes = df['ts_code'].to_numpy(dtype=str)
+        self._list_date = df['list_date'].to_numpy(dtype='datetime64[ns]')
+        self._delist_date = df['delist_date'].to_numpy(dtype='datetime64[ns]')
+
+    def __len__(self):
+        return len(self.df)
+
+    # ---------- 筛选条件 ----------
+    def not_st(self):
+        return ~self.df['is_st'].to_numpy()
+
+    def board_in(self, boards):
+        return np.isin(self.df['board'].to_numpy(), list(boards))
+
+    def market_in(self, markets):
+        return self.df['market'].isin(list(markets)).to_numpy()
+
+    def status_in(self, statuses):
+        return self.df['list_status'].isin(list(statuses)).to_numpy()
+
+    def listed_on(self, date):
+        """date 当天处于上市状态（已上市且尚未退市）"""
+        date = np.datetime64(pd.Timestamp(date), 'ns')
+        delisted = ~np.isnat(self._delist_date) & (self._delist_date <= date)
+        return (self._list_date <= date) & ~delisted
+
+    def listed_for(self, date, years=1):
+        """截至 date 上市满 years 年"""
+        cutoff = np.datetime64(pd.Timestamp(date) - pd.DateOffset(years=years), 'ns')
+        return self._list_date < cutoff
+
+    def select(self, mask=None):
+        """按布尔数组取股票代码"""
+        if mask is None:
+            return self.codes.tolist()
+        return self.codes[mask].tolist()
+
+    def members(self, date, mask=None):
+        """date 当天在市且满足 mask 的股票，用于逐日确定回测股票池（避免幸存者偏差）"""
+        listed = self.listed_on(date)
+        return self.select(listed if mask is None else listed & mask)
+
+
+# ================== 快照存取 ==================
+def _snapshot_files(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(f for f in os.listdir(root) if f.startswith('stock_basic_') and f.endswith('.csv'))
+
+
+def _snapshot_time(file_name):
+    return datetime.strptime(file_name[len('stock_basic_'):-len('.csv')], '%Y%m%d%H%M%S')
+
+
+def save_snapshot(pro, root=UNIVERSE_DIR):
+    """请求上市、退市、暂停上市的全部股票并保存为新版本快照，返回文件路径"""
+    frames = [pro.stock_basic(exchange='', list_status=status, fields=STOCK_BASIC_FIELDS) for status in ('L', 'D', 'P')]
+    df = pd.concat(frames, ignore_index=True)
+
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f"stock_basic_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv")
+    tmp_path = path + '.tmp'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+    for old in _snapshot_files(root)[:-SNAPSHOT_KEEP]:
+        os.remove(os.path.join(root, old))
+    print(f"股票基础数据已保存到 {path}")
+    return path
+
+
+def load_universe(pro=None, root=UNIVERSE_DIR, ttl=SNAPSHOT_TTL, refresh=False):
+    """
+    加载股票池：本地快照未过期直接用，过期或 refresh=True 时通过 pro 重新获取
+    没有 pro 时使用最新的本地快照（即使已过期）
+    """
+    files = _snapshot_files(root)
+    expired = not files or datetime.now() - _snapshot_time(files[-1]) > ttl
+    if pro is not None and (refresh or expired):
+        path = save_snapshot(pro, root)
+    elif files:
+        path = os.path.join(root, files[-1])
+        if expired:
+            print(f"股票基础数据快照已过期：{path}")
+    else:
+        raise FileNotFoundError(f"{root} 下没有股票基础数据快照，请传入 pro 以获取")
+
+    if path not in _CACHE:
+        df = pd.read_csv(path, dtype={'symbol': str, 'list_date': str, 'delist_date': str})
+        _CACHE[path] = StockUniverse(df, version=os.path.basename(path))
+    return _CACHE[path]
@@ -0,0 +1,168 @@
+import math
+from collections import deque
+
+# ================== 流式增量指标 ==================
+# 每来一根 K 线调用一次 update()，单次更新 O(1)（均摊），不依赖 backtrader 的 line 对象，
+# 既可以在策略的 next() 里用，也可以直接接分钟线/实时行情：
+#   donchian = Donchian(20)
+#   for bar in feed:
+#       upper, lower = donchian.update(bar.high, bar.low)
+# 数据不足一个周期时返回 nan，与 backtrader 指标在 minperiod 之前的取值一致，比较运算都为 False。
+# 公式与 backtrader 的 SMA、Highest/Lowest、ATR 保持一致，回测和实盘信号可以互相核对。
+
+NAN = float('nan')
+
+
+class RollingSMA:
+    """简单移动平均，环形缓冲区 + 滚动和；每绕一圈用 fsum 重算一次，避免浮点误差累积"""
+
+    def __init__(self, period):
+        self.period = period
+        self._buf = [0.0] * period
+        self._pos = 0
+        self._count = 0
+        self._sum = 0.0
+        self.value = NAN
+
+    @property
+    def ready(self):
+        return self._count >= self.period
+
+    def update(self, x):
+        old = self._buf[self._pos]
+        self._buf[self._pos] = x
+        self._pos += 1
+        if self._pos == self.period:
+            self._pos = 0
+        if self._count < self.period:
+            self._count += 1
+            self._sum += x
+            if self._count == self.period:
+                self._sum = math.fsum(self._buf)
+        elif self._pos == 0:
+            self._sum = math.fsum(self._buf)
+        else:
+            self._sum += x - old
+        if self.ready:
+            self.value = self._sum / self.period
+        return self.value
+
+
+class SlopeSignStack:
+    """
+    最近 length 个斜率方向（+1 / -1），即 Strategy_wave1 的信号栈
+    每次传入新的均线值，只压入 sign(新值 - 上一个值)，不重新遍历整个窗口；
+    差值不大于 0 或含 nan 时记为 -1，初始栈全为 -1
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self._signs = deque([-1] * length, maxlen=length)
+        self.total = -length  # 栈内符号之和
+        self._prev = NAN
+
+    def update(self, value):
+        sign = 1 if value - self._prev > 0 else -1
+        self.total += sign - self._signs[0]
+        self._signs.append(sign)
+        self._prev = value
+        return self.total
+
+    @property
+    def last(self):
+        return self._signs[-1]
+
+    def signs(self):
+        """从旧到新的符号列表，下标与原先的 self.stack 相同"""
+        return list(self._signs)
+
+
+class RollingExtreme:
+    """单调双端队列求最近 period 个值的最大（is_max=True）或最小值，均摊 O(1)"""
+
+    def __init__(self, period, is_max=True):
+        self.period = period
+        self.is_max = is_max
+        self._window = deque()  # (序号, 值)，值单调
+        self._index = 0
+        self.value = NAN
+
+    @property
+    def ready(self):
+        return self._index >= self.period
+
+    def update(self, x):
+        window = self._window
+        if self.is_max:
+            while window and window[-1][1] <= x:
+                window.pop()
+        else:
+            while window and window[-1][1] >= x:
+                window.pop()
+        window.append((self._index, x))
+        self._index += 1
+        if window[0][0] <= self._index - 1 - self.period:
+            window.popleft()
+        if self.ready:
+            self.value = window[0][1]
+        return self.value
+
+
+class Donchian:
+    """
+    唐奇安通道：最近 upper_period 根的最高价、最近 lower_period 根的最低价（含当前 K 线）
+    海龟策略比较的是上一根的通道，在 update() 之前读取 upper/lower 即可
+    """
+
+    def __init__(self, upper_period, lower_period=None):
+        self._high = RollingExtreme(upper_period, is_max=True)
+        self._low = RollingExtreme(lower_period or upper_period, is_max=False)
+
+    @property
+    def upper(self):
+        return self._high.value
+
+    @property
+    def lower(self):
+        return self._low.value
+
+    @property
+    def ready(self):
+        return self._high.ready and self._low.ready
+
+    def update(self, high, low):
+        return self._high.update(high), self._low.update(low)
+
+
+class WilderATR:
+    """
+    Wilder 平均真实波幅，与 bt.indicators.ATR 相同：
+    真实波幅从第 2 根开始计算，前 period 个取算术平均作为初值，之后 atr = atr * (1 - 1/period) + tr / period
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.alpha = 1.0 / period
+        self.alpha1 = 1.0 - self.alpha
+        self._prev_close = None
+        self._seed = []
+        self.value = NAN
+
+    @property
+    def ready(self):
+        return self.value == self.value
+
+    def update(self, high, low, close):
+        prev_close = self._prev_close
+        self._prev_close = close
+        if prev_close is None:
+            return self.value
+        tr = max(high, prev_close) - min(low, prev_close)
+        if self.value == self.value:
+            self.value = self.value * self.alpha1 + tr * self.alpha
+        else:
+            self._seed.append(tr)
+            if len(self._seed) == self.period:
+                self.value = math.fsum(self._seed) / self.period
+                self._seed = []
+        return self.value
@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+
+from limit_price import limit_ratio, limit_prices, round_price, board_of, BOARD_CHINEXT, BOARD_STAR
+
+# ================== 合成 A 股日线 ==================
+# 不依赖 Tushare 的确定性行情生成器，用于基准测试和离线调试。同一组参数和 seed 总是生成同样的数据。
+#   代码分布：沪深主板、创业板、科创板，部分股票为 ST
+#   价格：按分取整，涨跌幅受各板块（含创业板改革前后、ST）的涨跌停价约束
+#   涨停：按概率封板，其后按概率出现“连续两天缩量下跌、第三天收涨”的回调形态
+#   停牌：随机区间停牌，停牌期间无 K 线，复牌首日的昨收为停牌前收盘价
+#   上市：部分股票在区间中途上市
+# 交易日历用工作日近似，不含节假日。输出与 pro.daily 相同的列，可直接交给 bar_store.write_bars。
+
+TRADING_DAYS_PER_YEAR = 244
+GEN_CHUNK = 500  # 每批生成的股票数，控制中间数组的内存
+
+
+def _universe(n_codes, seed, st_share=0.05):
+    """股票代码、是否 ST、上市时点（占区间的比例）"""
+    rng = np.random.default_rng([seed, 0])
+    board = rng.choice(3, size=n_codes, p=[0.65, 0.22, 0.13])
+    # 各板块内单独编号，5000 只时代码仍落在各自的号段内
+    seq = np.zeros(n_codes, dtype=np.int64)
+    for b in range(3):
+        seq[board == b] = np.arange((board == b).sum())
+    codes = np.where(board == 1, np.char.add((300001 + seq).astype(str), '.SZ'),
+                     np.where(board == 2, np.char.add((688001 + seq).astype(str), '.SH'),
+                              np.where(seq % 2 == 0, np.char.add((600000 + seq // 2).astype(str), '.SH'),
+                                       np.char.add(np.char.zfill((1 + seq // 2).astype(str), 6), '.SZ'))))
+    is_st = rng.random(n_codes) < st_share
+    list_at = np.where(rng.random(n_codes) < 0.7, 0.0, rng.random(n_codes) * 0.5)
+    return codes, is_st, list_at
+
+
+def _trade_days(years, start_date):
+    return pd.bdate_range(start_date, periods=max(1, int(round(years * TRADING_DAYS_PER_YEAR)))).to_numpy()
+
+
+def generate_stock_basic(n_codes, years=1, seed=0, start_date='20150105'):
+    """与 generate_bars 参数相同时配套的 stock_basic 表"""
+    codes, is_st, list_at = _universe(n_codes, seed)
+    days = _trade_days(years, start_date)
+    markets = pd.Series(board_of(codes)).map({BOARD_CHINEXT: '创业板', BOARD_STAR: '科创板'}).fillna('主板')
+    names = np.where(is_st, np.char.add('*ST', codes.astype('<U6')), np.char.add('股票', codes.astype('<U6')))
+    list_date = pd.DatetimeIndex(days[(list_at * len(days)).astype(int)]).strftime('%Y%m%d')
+    return pd.DataFrame({'ts_code': codes, 'name': names, 'market': markets.to_numpy(), 'list_date': list_date,
+                         'list_status': 'L'})
+
+
+def _generate_chunk(codes, is_st, list_at, days, seed, limit_up_prob, pullback_prob, suspend_prob):
+    rng = np.random.default_rng(seed)
+    n_days, n = len(days), len(codes)
+
+    # 创业板改革前后的涨跌幅限制不同，按日期二选一
+    ratio_before = limit_ratio(codes, np.full(n, np.datetime64('2020-01-02')), is_st)
+    ratio_after = limit_ratio(codes, None, is_st)
+    after_reform = days >= np.datetime64('2020-08-24')
+
+    listed_from = (list_at * n_days).astype(int)
+    suspended = np.zeros((n_days, n), dtype=bool)
+    for t, j in zip(*np.nonzero(rng.random((n_days, n)) < suspend_prob)):
+        suspended[t:t + rng.integers(1, 30), j] = True
+
+    shape = (n_days, n)
+    out = {f: np.empty(shape) for f in ('open', 'high', 'low', 'close', 'pre_close', 'vol')}
+    close = round_price(rng.uniform(4, 60, n))
+    vol = rng.lognormal(11, 1, n)
+    pull = np.zeros(n, dtype=np.int8)  # 0 无；1、2 回调缩量下跌；3 收涨
+    for t in range(n_days):
+        pre = close
+        ratio = ratio_after if after_reform[t] else ratio_before
+        up, down = limit_prices(pre, ratio)
+        active = (t >= listed_from) & ~suspended[t]
+
+        r = rng.normal(0.0003, 0.02, n)
+        r = np.where((pull == 1) | (pull == 2), -np.abs(r) - 0.003, r)
+        r = np.where(pull == 3, np.abs(r) + 0.003, r)
+        limit_up = rng.random(n) < limit_up_prob
+        c = np.clip(round_price(pre * (1 + r)), down, up)
+        c = np.where(limit_up, up, c)
+
+        v = vol * rng.lognormal(0, 0.25, n)
+        v = np.where(limit_up, vol * rng.uniform(1.5, 3, n), v)
+        v = np.where((pull == 1) | (pull == 2), vol * rng.uniform(0.6, 0.9, n), v)
+
+        o = np.clip(round_price(pre * (1 + rng.normal(0, 0.006, n))), down, up)
+        h = np.minimum(round_price(np.maximum(o, c) * (1 + np.abs(rng.normal(0, 0.006, n)))), up)
+        lo = np.maximum(round_price(np.minimum(o, c) * (1 - np.abs(rng.normal(0, 0.006, n)))), down)
+
+        out['open'][t], out['high'][t], out['low'][t], out['close'][t] = o, h, lo, c
+        out['pre_close'][t], out['vol'][t] = pre, np.round(v)
+
+        # 停牌和未上市的股票价格、量、形态状态都不推进
+        close = np.where(active, c, pre)
+        vol = np.where(active, v, vol)
+        next_pull = np.where(pull == 3, 0, np.where(pull > 0, pull + 1, 0))
+        next_pull = np.where(limit_up & (rng.random(n) < pullback_prob), 1, next_pull)
+        pull = np.where(active, next_pull, pull).astype(np.int8)
+        suspended[t] = ~active
+
+    # 按 (ts_code, trade_date) 排列，只保留有 K 线的行
+    valid = ~suspended.T
+    df = pd.DataFrame({
+        'ts_code': np.repeat(codes, valid.sum(axis=1)),
+        'trade_date': np.broadcast_to(days, (n, n_days))[valid],
+    })
+    for f in ('open', 'high', 'low', 'close', 'pre_close', 'vol'):
+        df[f] = out[f].T[valid]
+    df['amount'] = np.round(df['vol'].to_numpy() * df['close'].to_numpy() / 10, 3)  # 手 × 元 -> 千元
+    return df
+
+
+def generate_bars(n_codes=100, years=1, seed=0, start_date='20150105', limit_up_prob=0.02,
+                  pullback_prob=0.5, suspend_prob=0.0005):
+    """
+    生成全市场日线长表
+    :param n_codes: 股票数（1 ~ 5000）
+    :param years: 年数，每年 TRADING_DAYS_PER_YEAR 个交易日
+    :return: ts_code、trade_date(datetime64)、open、high、low、close、pre_close、vol、amount
+    """
+    days = _trade_days(years, start_date)
+    codes, is_st, list_at = _universe(n_codes, seed)
+    frames = []
+    for i in range(0, n_codes, GEN_CHUNK):
+        sl = slice(i, i + GEN_CHUNK)
+        frames.append(_generate_chunk(codes[sl], is_st[sl], list_at[sl], days, [seed, 1, i],
+                                      limit_up_prob, pullback_prob, suspend_prob))
+    return pd.concat(frames, ignore_index=True)
+
+
+class SyntheticPro:
+    """用 synthetic 生成的行情模拟 daily、stock_basic、trade_cal、namechange 接口"""
+
+    def __init__(self, n_codes=300, years=3, seed=0, start_date=None):
+        """start_date 默认取截至今天的 years 年，脚本里“最近 N 天”的区间也有数据"""
+        if start_date is None:
+            periods = int(round(years * TRADING_DAYS_PER_YEAR))
+            start_date = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=periods)[0].strftime('%Y%m%d')
+        self._basic = generate_stock_basic(n_codes, years, seed, start_date)
+        bars = generate_bars(n_codes, years, seed, start_date)
+        bars['trade_date'] = bars['trade_date'].dt.strftime('%Y%m%d')
+        self._bars = bars.sort_values(['trade_date', 'ts_code'], ascending=[False, True], ignore_index=True)
+        self._days = sorted(bars['trade_date'].unique())
+
+    def daily(self, ts_code=None, trade_date=None, start_date=None, end_date=None, **kwargs):
+        df = self._bars
+        if ts_code:
+            df = df[df['ts_code'].isin(ts_code.split(','))]
+        if trade_date:
+            df = df[df['trade_date'] == trade_date]
+        if start_date:
+            df = df[df['trade_date'] >= start_date]
+        if end_date:
+            df = df[df['trade_date'] <= end_date]
+        return df.reset_index(drop=True)
+
+    def stock_basic(self, list_status='L', **kwargs):
+        return self._basic[self._basic['list_status'] == (list_status or 'L')].reset_index(drop=True)
+
+    def trade_cal(self, exchange='SSE', start_date=None, end_date=None, **kwargs):
+        # 合成行情按工作日生成，日历同样按工作日
+        dates = pd.date_range(start_date or self._days[0], end_date or self._days[-1])
+        return pd.DataFrame({'exchange': exchange, 'cal_date': dates.strftime('%Y%m%d'),
+                             'is_open': (dates.dayofweek < 5).astype(int)})
+
+    def namechange(self, **kwargs):
+        st = self._basic[self._basic['name'].str.contains('ST')]
+        return pd.DataFrame({'ts_code': st['ts_code'], 'name': st['name'], 'start_date': st['list_date'],
+                             'end_date': None, 'change_reason': 'ST'}).reset_index(drop=True)
@@ -1,16 +1,16 @@
-import tushare as ts
 import backtrader as bt
-import pandas as pd
 from datetime import datetime
-import matplotlib.pyplot as plt
 
-# 设置Tushare的Token
-ts.set_token('0ff27db3b933751cc13e959f62e7147d441325b4fdc2a4fd1b0aacfe')
-pro = ts.pro_api()
+from data_source import lazy_pro
+
+# 行情接口，数据源与延迟创建见 data_source.lazy_pro
+pro = lazy_pro()
 
 
 # 获取股票历史数据的函数
 def get_data(stock_code, start_date, end_date):
+    import pandas as pd
+
     # 获取历史日线数据
     #print(stock_code,start_date,end_date)
     df = pro.daily(ts_code=stock_code, start_date=start_date, end_date=end_date)
@@ -38,15 +38,27 @@ class DoubleSMA(bt.Strategy):
     params = (
         ('sma_short', 5),  # 短期SMA
         ('sma_long', 20),  # 长期SMA
+        ('recorder', None),  # event_log.EventRecorder，设置后日志写入事件文件而不是打印
+        ('indicator_cache', None),  # indicator_cache.IndicatorCache，参数寻优时复用同一周期的均线
     )
-    def log(self, txt, dt=None):
-        # 记录策略的执行日志
+    def log(self, txt, *args, dt=None):
+        # 记录策略的执行日志；txt 为 % 格式串，事件级别不够时不取日期也不格式化
+        recorder = self.params.recorder
+        if recorder is not None:
+            if recorder.enabled():
+                recorder.log(dt or self.datas[0].datetime.date(0), txt, *args)
+            return
         dt = dt or self.datas[0].datetime.date(0)
-        print('%s, %s' % (dt.isoformat(), txt))
+        print('%s, %s' % (dt.isoformat(), txt % args if args else txt))
 
     def __init__(self):
-        self.sma_short = bt.indicators.SimpleMovingAverage(self.data.close, period=self.params.sma_short)
-        self.sma_long = bt.indicators.SimpleMovingAverage(self.data.close, period=self.params.sma_long)
+        cache = self.params.indicator_cache
+        if cache is not None:
+            self.sma_short = cache.sma(self.data.close, self.params.sma_short)
+            self.sma_long = cache.sma(self.data.close, self.params.sma_long)
+        else:
+            self.sma_short = bt.indicators.SimpleMovingAverage(self.data.close, period=self.params.sma_short)
+            self.sma_long = bt.indicators.SimpleMovingAverage(self.data.close, period=self.params.sma_long)
 
     def next(self):
         #help(self.sma_short)
@@ -63,18 +75,27 @@ class DoubleSMA(bt.Strategy):
         # 注意: 当资金不足时，broker会拒绝订单
         if order.status in [order.Completed]:
             if order.isbuy():
-                self.log(f"买入 {order.executed.size} 股，价格：{order.executed.price},总价：{order.executed.value}")
+                self.log("买入 %s 股，价格：%s,总价：%s", order.executed.size, order.executed.price, order.executed.value)
             elif order.issell():
-                self.log(f"卖出 {order.executed.size} 股，价格：{order.executed.price},总价：{order.executed.value}")
+                self.log("卖出 %s 股，价格：%s,总价：%s", order.executed.size, order.executed.price, order.executed.value)
 
                 # 记录当前交易数量
             self.bar_executed = len(self)
 
 class TestStrategy(bt.Strategy):
-    def log(self, txt, dt=None):
-        # 记录策略的执行日志
+    params = (
+        ('recorder', None),  # event_log.EventRecorder，设置后日志写入事件文件而不是打印
+    )
+
+    def log(self, txt, *args, dt=None):
+        # 记录策略的执行日志；txt 为 % 格式串，事件级别不够时不取日期也不格式化
+        recorder = self.params.recorder
+        if recorder is not None:
+            if recorder.enabled():
+                recorder.log(dt or self.datas[0].datetime.date(0), txt, *args)
+            return
         dt = dt or self.datas[0].datetime.date(0)
-        print('%s, %s' % (dt.isoformat(), txt))
+        print('%s, %s' % (dt.isoformat(), txt % args if args else txt))
 
     def __init__(self):
         # 保存收盘价的引用
@@ -90,9 +111,9 @@ class TestStrategy(bt.Strategy):
         # 注意: 当资金不足时，broker会拒绝订单
         if order.status in [order.Completed]:
             if order.isbuy():
-                self.log(f"买入 {order.executed.size} 股，价格：{order.executed.price}")
+                self.log("买入 %s 股，价格：%s", order.executed.size, order.executed.price)
             elif order.issell():
-                self.log(f"卖出 {order.executed.size} 股，价格：{order.executed.price}")
+                self.log("卖出 %s 股，价格：%s", order.executed.size, order.executed.price)
 
                 # 记录当前交易数量
             self.bar_executed = len(self)
@@ -107,12 +128,11 @@ class TestStrategy(bt.Strategy):
     def notify_trade(self, trade):
         if not trade.isclosed:
             return
-        self.log('交易利润, 毛利润 %.2f, 净利润 %.2f' %
-        (trade.pnl, trade.pnlcomm))
+        self.log('交易利润, 毛利润 %.2f, 净利润 %.2f', trade.pnl, trade.pnlcomm)
 
     def next(self):
         # 记录收盘价
-        self.log('next func: Close, %.2f' % self.dataclose[0])
+        self.log('next func: Close, %.2f', self.dataclose[0])
 
         # 如果有订单正在挂起，不操作
         if self.order:
@@ -125,62 +145,78 @@ class TestStrategy(bt.Strategy):
                 # 昨天收盘价 < 前天的收盘价
                 if self.dataclose[-1] < self.dataclose[-2]:
                     # 买入
-                    self.log('买入, %.2f' % self.dataclose[0])
+                    self.log('买入, %.2f', self.dataclose[0])
                     # 跟踪订单避免重复
                     self.order = self.buy()
         else:
             # 如果已经持仓，且当前交易数据量在买入后5个单位后
             if len(self) >= (self.bar_executed + 5):
                 # 全部卖出
-                self.log('卖出, %.2f' % self.dataclose[0])
+                self.log('卖出, %.2f', self.dataclose[0])
                 # 跟踪订单避免重复
                 self.order = self.sell()
 
 
-# 创建回测引擎
-cerebro = bt.Cerebro()
+def main():
+    from analytics import EquityRecorder, summarize, attribution
+    from ashare_broker import AShareBroker
+    from report import write_report
+
+    # 创建回测引擎
+    cerebro = bt.Cerebro()
+
+    # 添加数据并设置策略
+    for stock_code in stock_codes:
+        stock_data = get_data(stock_code, start_date, end_date)
+        cerebro.adddata(stock_data, name=stock_code)
 
-# 添加数据并设置策略
-for stock_code in stock_codes:
-    stock_data = get_data(stock_code, start_date, end_date)
-    cerebro.adddata(stock_data, name=stock_code)
+    cerebro.addstrategy(DoubleSMA)
+    #cerebro.addstrategy(TestStrategy)
 
-cerebro.addstrategy(DoubleSMA)
-#cerebro.addstrategy(TestStrategy)
+    #cerebro.addsizer(bt.sizers.FixedSize, stake=100)
+    #设置每次操作50%资金
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=50)
 
-#cerebro.addsizer(bt.sizers.FixedSize, stake=100)
-#设置每次操作50%资金
-cerebro.addsizer(bt.sizers.PercentSizer, percents=50)
+    # A 股撮合和费用：按整手成交、T+1、佣金最低 5 元、卖出印花税
+    cerebro.broker = AShareBroker()
 
-# 设置初始资金
-cerebro.broker.set_cash(100000)
+    # 设置初始资金
+    cerebro.broker.set_cash(100000)
 
-# 设置手续费
-cerebro.broker.setcommission(commission=0.001)
+    # 打印回测前的信息
+    print(f'初始资金: {cerebro.broker.getvalue()}')
 
-# 打印回测前的信息
-print(f'初始资金: {cerebro.broker.getvalue()}')
+    # 记录净值和成交，统计指标在回测结束后计算
+    cerebro.addanalyzer(EquityRecorder, _name='equity')
 
-# 添加交易统计分析器
-cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trade_analyzer')
+    # 运行回测
+    result = cerebro.run()
 
-# 运行回测
-result = cerebro.run()
+    # 打印回测后的信息
+    print(f'结束资金: {cerebro.broker.getvalue()}')
 
-# 打印回测后的信息
-print(f'结束资金: {cerebro.broker.getvalue()}')
+    # 打印交易统计信息
+    rec = result[0].analyzers.equity.get_analysis()
+    stats = summarize(rec)
+    pnl = rec['trade_pnlcomm']
+    won, lost = pnl[pnl >= 0], pnl[pnl < 0]
 
-# 打印交易统计信息
-trade_analyzer = result[0].analyzers.trade_analyzer.get_analysis()
+    print('交易统计:')
+    print(f"总交易数: {stats['trades']}")
+    print(f"赢利交易数: {len(won)}")
+    print(f"亏损交易数: {len(lost)}")
+    print(f"胜率: {stats['win_rate']:.2%}")
+    print(f"平均盈利: {won.mean() if len(won) else 0}")
+    print(f"平均亏损: {lost.mean() if len(lost) else 0}")
+    print(f"夏普比率: {stats['sharpe']:.2f}  索提诺比率: {stats['sortino']:.2f}")
+    print(f"最大回撤: {stats['max_drawdown']:.2f}%，持续 {stats['max_drawdown_len']} 个交易日")
+    print(f"年化换手率: {stats['turnover']:.2f}")
+    for name, pnl in attribution(rec).items():
+        print(f"{name} 收益: {pnl:.2f}")
 
-# 检查交易统计，避免 KeyError
-print('交易统计:')
-print(f"总交易数: {trade_analyzer.get('total', {}).get('total', 0)}")
-print(f"赢利交易数: {trade_analyzer.get('won', {}).get('total', 0)}")
-print(f"亏损交易数: {trade_analyzer.get('lost', {}).get('total', 0)}")
-print(f"平均盈利: {trade_analyzer.get('won', {}).get('average', 0)}")
-print(f"平均亏损: {trade_analyzer.get('lost', {}).get('average', 0)}")
+    # 绘制图表：写入 reports/index.html，不弹出窗口
+    print(f"报告: {write_report(result[0])}")
 
 
-# 绘制图表
-cerebro.plot()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import backtrader as bt
+
+from ashare_broker import AShareBroker, AShareCommission
+
+
+def _bars(n=30, seed=1):
+    """随机游走的日线，涨跌幅限制在 ±5% 以内"""
+    rng = np.random.default_rng(seed)
+    close = 12.0 * np.cumprod(1 + rng.uniform(-0.04, 0.04, n))
+    open_ = close * (1 + rng.uniform(-0.01, 0.01, n))
+    return pd.DataFrame({
+        'open': open_.round(2),
+        'high': (np.maximum(open_, close) * 1.01).round(2),
+        'low': (np.minimum(open_, close) * 0.99).round(2),
+        'close': close.round(2),
+        'volume': np.full(n, 1e6),
+    }, index=pd.bdate_range('2024-01-02', periods=n))
+
+
+class _Script(bt.Strategy):
+    """按 K 线序号下单：{序号: 股数}，正数买入、负数卖出"""
+    params = (('orders', None),)
+
+    def __init__(self):
+        self.fills = []
+
+    def notify_order(self, order):
+        if order.status == order.Completed:
+            self.fills.append((len(self), order.executed.size, order.executed.price, order.executed.comm))
+
+    def next(self):
+        size = self.p.orders.get(len(self))
+        if size:
+            (self.buy if size > 0 else self.sell)(size=abs(size))
+
+
+def _run(broker, df, orders, commission=None):
+    cerebro = bt.Cerebro()
+    cerebro.adddata(bt.feeds.PandasData(dataname=df, name='000001.SZ'))
+    cerebro.addstrategy(_Script, orders=orders)
+    cerebro.broker = broker
+    broker.set_cash(100000)
+    if commission is not None:
+        broker.setcommission(commission=commission)
+    s = cerebro.run()[0]
+    return s.fills, broker.getcash(), broker.getvalue()
+
+
+def test_matches_backbroker_with_rules_disabled():
+    """关闭整手、T+1、涨跌停后，成交、现金和净值与 BackBroker 完全一致"""
+    df = _bars()
+    orders = {2: 4055, 5: 1200, 6: -3000, 12: -2255, 15: 700, 20: -700}
+    expected = _run(bt.brokers.BackBroker(), df, orders, commission=0.001)
+    got = _run(AShareBroker(lot_size=1, t_plus_1=False, check_limits=False), df, orders, commission=0.001)
+    assert len(got[0]) == len(orders)
+    assert np.allclose(np.array(got[0]), np.array(expected[0]))
+    assert np.isclose(got[1], expected[1]) and np.isclose(got[2], expected[2])
+
+
+def test_setcommission_survives_start():
+    broker = AShareBroker()
+    assert isinstance(broker.comminfo[None], AShareCommission)
+    broker.setcommission(commission=0.001)
+    broker.start()
+    assert not isinstance(broker.comminfo[None], AShareCommission)
+
+
+def test_market_order_waits_for_traded_bar():
+    """成交量为 0 的 K 线不成交，买单和卖单都顺延到下一根有成交的 K 线开盘"""
+    df = _bars()
+    df.iloc[2:5, df.columns.get_loc('volume')] = 0.0  # 第 2 根下的买单本应在第 3 根成交
+    df.iloc[9:11, df.columns.get_loc('volume')] = 0.0
+    fills, _, _ = _run(AShareBroker(), df, {2: 1000, 9: -1000})
+    assert [(bar, size) for bar, size, _, _ in fills] == [(6, 1000), (12, -1000)]
+    assert fills[0][2] == df['open'].iloc[5] and fills[1][2] == df['open'].iloc[11]
+
+
+class _LimitScript(_Script):
+    def __init__(self):
+        super(_LimitScript, self).__init__()
+        self.rejected = []
+
+    def notify_order(self, order):
+        super(_LimitScript, self).notify_order(order)
+        if order.status == order.Rejected:
+            self.rejected.append(order.getordername())
+
+    def next(self):
+        if len(self) == 2:
+            self.buy(size=1000)
+        elif len(self) == 3:
+            # 当天买入的股票用限价单卖出，不能绕过 T+1
+            self.sell(size=1000, exectype=bt.Order.Limit, price=self.data.close[0] * 0.9)
+            self.buy(size=1000, exectype=bt.Order.Stop, price=self.data.close[0])
+
+
+def test_non_market_orders_rejected():
+    cerebro = bt.Cerebro()
+    cerebro.adddata(bt.feeds.PandasData(dataname=_bars(), name='000001.SZ'))
+    cerebro.addstrategy(_LimitScript)
+    cerebro.broker = AShareBroker()
+    cerebro.broker.set_cash(100000)
+    s = cerebro.run()[0]
+    assert s.rejected == ['Limit', 'Stop']
+    assert [(bar, size) for bar, size, _, _ in s.fills] == [(3, 1000)]
+    assert cerebro.broker.getposition(s.data).size == 1000
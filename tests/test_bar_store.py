@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from bar_store import BarStore, BAR_FIELDS, append_bars, compact_bars, write_bars
+from synthetic import generate_bars
+
+
+def _bars():
+    bars = generate_bars(8, years=0.2, seed=4, start_date='20240102')
+    return bars.sort_values(['ts_code', 'trade_date'], ignore_index=True)
+
+
+def _assert_same(store, expected):
+    got = store.to_frame()
+    assert got['ts_code'].tolist() == expected['ts_code'].tolist()
+    assert (got['trade_date'].to_numpy() == expected['trade_date'].to_numpy(dtype='datetime64[ns]')).all()
+    for f in BAR_FIELDS:
+        assert np.allclose(got[f].to_numpy(), expected[f].to_numpy(dtype=float), equal_nan=True)
+
+
+def test_write_append_compact_round_trip(tmp_path):
+    root = str(tmp_path)
+    bars = _bars()
+    days = np.sort(bars['trade_date'].unique())
+    first = bars[bars['trade_date'] <= days[20]]
+    second = bars[(bars['trade_date'] > days[20]) & (bars['trade_date'] <= days[35])]
+    third = bars[bars['trade_date'] > days[35]].copy()
+
+    write_bars(first, root)
+    assert append_bars(second, root) is not None
+    # 增量段中重复的行以新数据为准，trade_date 为 'YYYYMMDD' 字符串也可以
+    fix = first.tail(1).copy()
+    fix['close'] += 1.0
+    fix['trade_date'] = fix['trade_date'].dt.strftime('%Y%m%d')
+    append_bars(pd.concat([third.assign(trade_date=third['trade_date'].dt.strftime('%Y%m%d')), fix]), root)
+    assert append_bars(bars.iloc[:0], root) is None
+
+    expected = bars.copy()
+    expected.loc[fix.index, 'close'] += 1.0
+
+    store = BarStore(root)
+    assert len(store.deltas) == 2
+    _assert_same(store, expected)
+
+    version = compact_bars(root)
+    store = BarStore(root)
+    assert store.version == version and not store.deltas
+    _assert_same(store, expected)
+    assert compact_bars(root) == version  # 没有增量段时不重写
+
+    code = store.codes[0]
+    code_days = expected[expected['ts_code'] == code]['trade_date'].to_numpy(dtype='datetime64[ns]')
+    assert store.last_dates()[code] == code_days[-1]
+    start = pd.Timestamp(code_days[10]).strftime('%Y%m%d')
+    arrays = store.arrays(code, start_date=start, end_date=code_days[12])
+    assert (arrays['trade_date'] == code_days[10:13]).all()
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from bar_store import BarStore, write_bars
+from bar_sync import sync_daily_bars
+from synthetic import SyntheticPro
+
+
+class _FailingPro:
+    """按交易日的调用成功 ok_days 次后开始报错，模拟同步中途断网"""
+
+    def __init__(self, pro, ok_days):
+        self._pro = pro
+        self.ok_days = ok_days
+
+    def daily(self, trade_date=None, **kwargs):
+        if trade_date is not None:
+            if self.ok_days <= 0:
+                raise ConnectionError('network down')
+            self.ok_days -= 1
+        return self._pro.daily(trade_date=trade_date, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._pro, name)
+
+
+@pytest.fixture
+def pro(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # 交易日历快照写在当前目录下
+    return SyntheticPro(n_codes=20, years=0.5, seed=3, start_date='20240102')
+
+
+def test_interrupted_sync_is_caught_up(pro, tmp_path):
+    root = str(tmp_path / 'bars')
+    days = pro._days
+    mid, end = days[40], days[-1]
+    codes = pro.stock_basic()['ts_code'].tolist()
+    old, new = codes[:12], codes[12:]
+    write_bars(pro.daily(ts_code=','.join(old), end_date=mid), root)
+
+    # 新股回补到 end 后，按日同步只成功 5 天就中断
+    sync_daily_bars(_FailingPro(pro, ok_days=5), days[0], end, codes=codes, root=root, flush_every=3)
+    stuck = BarStore(root).last_dates()
+    assert stuck.min() < pd.Timestamp(end)
+
+    sync_daily_bars(pro, days[0], end, codes=codes, root=root, flush_every=3)
+    store = BarStore(root)
+    expected = pro.daily(ts_code=','.join(codes), end_date=end)
+    expected['trade_date'] = pd.to_datetime(expected['trade_date'])
+    expected = expected.sort_values(['ts_code', 'trade_date'], ignore_index=True)
+    got = store.to_frame(codes).sort_values(['ts_code', 'trade_date'], ignore_index=True)
+    assert len(got) == len(expected)
+    assert (got['trade_date'].to_numpy() == expected['trade_date'].to_numpy()).all()
+    assert (got['close'].to_numpy() == expected['close'].to_numpy()).all()
+    assert not store.deltas
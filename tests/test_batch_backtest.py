@@ -0,0 +1,17 @@
+import csv
+
+from batch_backtest import _finished_codes, RESULT_FIELDS, INSUFFICIENT_BARS
+
+
+def test_failed_codes_are_retried(tmp_path):
+    out_file = tmp_path / 'batch.csv'
+    with open(out_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerow({'ts_code': '000001.SZ', 'bars': 200, 'final_value': 2100.0})
+        writer.writerow({'ts_code': '000002.SZ', 'bars': 10, 'error': INSUFFICIENT_BARS})
+        writer.writerow({'ts_code': '000004.SZ', 'error': "OSError('read failed')"})
+        writer.writerow({'ts_code': '000005.SZ', 'error': "OSError('read failed')"})
+        writer.writerow({'ts_code': '000005.SZ', 'bars': 200, 'final_value': 1900.0})  # 续跑后成功
+    assert _finished_codes(str(out_file)) == {'000001.SZ', '000002.SZ', '000005.SZ'}
+    assert _finished_codes(str(tmp_path / 'missing.csv')) == set()
@@ -0,0 +1,31 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from checkpoint import resume_start
+from trade_calendar import TradeCalendar
+
+
+@pytest.fixture
+def calendar():
+    return TradeCalendar(pd.bdate_range('2024-01-02', '2024-12-31'))
+
+
+def test_resume_start_warmup(calendar):
+    state = {'date': datetime.date(2024, 6, 3)}
+    assert resume_start(state, '20240101', calendar, warmup=5) == '20240527'
+    # 不早于原 start_date
+    assert resume_start(state, '20240530', calendar, warmup=5) == '20240530'
+
+
+@pytest.mark.parametrize('state', [None, {}, {'date': None}, {'date': pd.NaT}, {'date': np.datetime64('NaT')}])
+def test_resume_start_without_date(calendar, state):
+    assert resume_start(state, '20240101', calendar) == '20240101'
+
+
+def test_resume_start_before_calendar(calendar):
+    # 预热区间超出日历起点时 offset 为 NaT，退回 start_date 而不是 'NaT'
+    state = {'date': datetime.date(2024, 1, 10)}
+    assert resume_start(state, '20240101', calendar, warmup=30) == '20240101'
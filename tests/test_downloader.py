@@ -0,0 +1,111 @@
+import pandas as pd
+import pytest
+
+from bar_store import BarStore
+from downloader import TokenBucket, download, download_daily_bars, load_progress
+from synthetic import SyntheticPro
+
+
+class _Clock:
+    """假时钟：sleep 只推进时间，不真的等待"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class _Flaky:
+    """每个键前 failures[key] 次调用抛异常，之后返回键本身"""
+
+    def __init__(self, failures):
+        self.failures = dict(failures)
+        self.calls = []
+
+    def __call__(self, key):
+        self.calls.append(key)
+        if self.failures.get(key, 0) > 0:
+            self.failures[key] -= 1
+            raise ConnectionError(f'{key} timeout')
+        return key
+
+
+def _limiter(rate=6000):
+    clock = _Clock()
+    return TokenBucket(rate, clock=clock, sleep=clock.sleep), clock
+
+
+def test_token_bucket_rate():
+    clock = _Clock()
+    bucket = TokenBucket(120, capacity=1, clock=clock, sleep=clock.sleep)
+    for _ in range(11):
+        bucket.acquire()
+    # 容量 1 个令牌，之后每秒 2 个：11 次调用至少用时 5 秒
+    assert clock.now == pytest.approx(5.0)
+
+
+def test_retry_with_backoff():
+    fetch = _Flaky({'a': 2})
+    backoff = _Clock()
+    limiter, _ = _limiter()
+    results, failed = download(iter(['a', 'b']), fetch, max_workers=1, retries=3, backoff=0.5,
+                               limiter=limiter, sleep=backoff.sleep)
+    assert results == {'a': 'a', 'b': 'b'} and not failed
+    assert fetch.calls.count('a') == 3
+    assert backoff.sleeps == [0.5, 1.0]
+
+
+def test_failed_after_retries(tmp_path):
+    progress = str(tmp_path / 'progress.txt')
+    fetch = _Flaky({'bad': 10})
+    limiter, _ = _limiter()
+    results, failed = download(['ok', 'bad'], fetch, max_workers=2, retries=2, progress_file=progress,
+                               limiter=limiter, sleep=lambda s: None)
+    assert set(results) == {'ok'} and set(failed) == {'bad'}
+    assert isinstance(failed['bad'], ConnectionError)
+    assert fetch.calls.count('bad') == 3
+    assert load_progress(progress) == {'ok'}
+
+
+def test_progress_skips_finished_keys(tmp_path):
+    progress = str(tmp_path / 'progress.txt')
+    limiter, _ = _limiter()
+    first = _Flaky({'c': 10})
+    download(['a', 'b', 'c'], first, retries=0, progress_file=progress, flush_every=1, limiter=limiter)
+    second = _Flaky({})
+    results, failed = download(iter(['a', 'b', 'c']), second, progress_file=progress, limiter=limiter)
+    assert second.calls == ['c'] and results == {'c': 'c'} and not failed
+    assert load_progress(progress) == {'a', 'b', 'c'}
+
+
+def test_download_daily_bars(tmp_path):
+    pro = SyntheticPro(n_codes=10, years=0.2, seed=2, start_date='20240102')
+    codes = pro.stock_basic()['ts_code'].tolist()
+    root, progress = str(tmp_path / 'bars'), str(tmp_path / 'progress.txt')
+    start, end = pro._days[0], pro._days[-1]
+    broken = codes[0]
+
+    def fetch(ts_code):
+        if ts_code == broken:
+            raise ConnectionError('timeout')
+        return pro.daily(ts_code=ts_code, start_date=start, end_date=end)
+
+    limiter, _ = _limiter()
+    failed = download_daily_bars(pro, codes, start, end, root=root, fetch=fetch, progress_file=progress,
+                                 retries=1, sleep=lambda s: None, limiter=limiter, flush_every=3)
+    assert failed == [broken]
+    assert set(BarStore(root).codes) == set(codes) - {broken}
+
+    # 再次调用只下载失败的那只
+    failed = download_daily_bars(pro, codes, start, end, root=root, progress_file=progress, limiter=limiter)
+    store = BarStore(root)
+    assert failed == [] and not store.deltas
+    expected = pro.daily(ts_code=','.join(codes))
+    assert len(store.to_frame()) == len(expected)
+    assert store.last_dates().max() == pd.Timestamp(end)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from limit_price import add_limit_prices, board_of, round_price, BOARD_BSE, BOARD_CHINEXT, BOARD_MAIN, BOARD_STAR
+
+
+def test_board_of():
+    codes = ['600000.SH', '000001.SZ', '300750.SZ', '301001.SZ', '688981.SH', '830799.BJ', '430047.BJ']
+    assert board_of(codes).tolist() == [BOARD_MAIN, BOARD_MAIN, BOARD_CHINEXT, BOARD_CHINEXT, BOARD_STAR,
+                                        BOARD_BSE, BOARD_BSE]
+
+
+def test_round_price_half_up():
+    # 10.05 * 1.1 在浮点下是 11.054999...，交易所规则为四舍五入到分
+    assert round_price(10.05 * 1.1) == 11.06
+    assert round_price(9.95 * 0.9) == 8.96
+    assert round_price([1.004, 1.005, 1.015]).tolist() == [1.0, 1.01, 1.02]
+
+
+def test_add_limit_prices_by_board():
+    df = pd.DataFrame({
+        'ts_code': ['600000.SH', '600001.SH', '300001.SZ', '300001.SZ', '300002.SZ', '300002.SZ',
+                    '688001.SH', '830799.BJ'],
+        'trade_date': ['20200821', '20200821', '20200821', '20200824', '20200821', '20200824',
+                       '20200824', '20200824'],
+        'pre_close': [10.0] * 8,
+        'close': [11.0, 10.5, 11.0, 12.0, 10.5, 12.0, 12.0, 13.0],
+    })
+    add_limit_prices(df, is_st={'600001.SH', '300002.SZ'})
+    # 主板 10%、主板 ST 5%、创业板改革前 10% / 后 20%、创业板 ST 改革前 5% / 后 20%、科创板 20%、北交所 30%
+    assert df['up_limit'].tolist() == [11.0, 10.5, 11.0, 12.0, 10.5, 12.0, 12.0, 13.0]
+    assert df['down_limit'].tolist() == [9.0, 9.5, 9.0, 8.0, 9.5, 8.0, 8.0, 7.0]
+    assert df['is_limit_up'].all() and not df['is_limit_down'].any()
+
+
+def test_add_limit_prices_single_code_index():
+    df = pd.DataFrame({'pre_close': [10.05, 9.95], 'close': [11.06, 8.96]},
+                      index=pd.DatetimeIndex(['2024-01-02', '2024-01-03']))
+    add_limit_prices(df, ts_code='600000.SH')
+    assert df['up_limit'].tolist() == [11.06, 10.95]
+    assert df['down_limit'].tolist() == [9.05, 8.96]
+    assert df['is_limit_up'].tolist() == [True, False]
+    assert df['is_limit_down'].tolist() == [False, True]
+    # is_st 也可以是与行对齐的布尔数组
+    st = add_limit_prices(df.copy(), is_st=np.array([True, True]), ts_code='600000.SH')
+    assert st['up_limit'].tolist() == [10.55, 10.45]
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import backtrader as bt
+
+from ashare_broker import AShareBroker
+from bar_store import BAR_FIELDS
+from panel import AlignedPanel
+
+
+def _panel(n=12, halt=slice(4, 8)):
+    """一只股票的面板，halt 区间停牌（没有 K 线）"""
+    dates = pd.bdate_range('2024-01-02', periods=n).values.astype('datetime64[D]')
+    close = np.linspace(10.0, 11.1, n)[:, None]
+    fields = {f: close.copy() for f in BAR_FIELDS}
+    fields['open'] = close - 0.05
+    fields['high'] = close + 0.1
+    fields['low'] = close - 0.1
+    fields['pre_close'] = np.vstack([close[:1], close[:-1]])
+    fields['vol'] = np.full((n, 1), 1e5)
+    traded = np.ones((n, 1), dtype=bool)
+    traded[halt] = False
+    for f in fields:
+        fields[f][halt] = np.nan
+    return AlignedPanel(dates, ['000001.SZ'], fields, traded)
+
+
+class _Script(bt.Strategy):
+    """按 K 线序号下单：{序号: 股数}，记录成交所在的 K 线下标、股数和价格"""
+    params = (('orders', None),)
+
+    def __init__(self):
+        self.fills = []
+
+    def notify_order(self, order):
+        if order.status == order.Completed:
+            self.fills.append((len(self) - 1, order.executed.size, order.executed.price))
+
+    def next(self):
+        size = self.p.orders.get(len(self))
+        if size:
+            (self.buy if size > 0 else self.sell)(size=abs(size))
+
+
+def _run(panel, orders, **broker_kwargs):
+    cerebro = bt.Cerebro()
+    panel.add_feeds(cerebro)
+    cerebro.addstrategy(_Script, orders=orders)
+    cerebro.broker = AShareBroker(**broker_kwargs)
+    cerebro.broker.set_cash(100000)
+    return cerebro.run()[0].fills
+
+
+def test_suspended_rows_are_flagged():
+    panel = _panel()
+    filled = panel.filled()
+    assert panel.suspended[4:8, 0].all() and not panel.suspended[:4, 0].any()
+    assert (filled['vol'][4:8, 0] == 0).all()
+    assert (filled['close'][4:8, 0] == panel.fields['close'][3, 0]).all()
+
+
+def test_no_fill_during_suspension():
+    """停牌前一天下的买单、停牌期间下的卖单都在复牌当天开盘成交"""
+    panel = _panel()
+    fills = _run(panel, {2: 1000, 4: 1000, 6: -1000})
+    assert [(bar, size) for bar, size, _ in fills] == [(2, 1000), (8, 1000), (8, -1000)]
+    assert not panel.suspended[[bar for bar, _, _ in fills], 0].any()
+    assert fills[1][2] == fills[2][2] == panel.fields['open'][8, 0]
+
+
+def test_no_close_fill_during_suspension():
+    panel = _panel()
+    fills = _run(panel, {6: 1000}, coc=True)
+    assert [(bar, size) for bar, size, _ in fills] == [(8, 1000)]
+    assert fills[0][2] == panel.fields['open'][8, 0]
@@ -0,0 +1,49 @@
+import backtrader as bt
+import pytest
+
+from bar_store import BarStore, write_bars
+from shared_feed import SharedBarData
+from signal_scan import scan_limit_up_pullback
+from synthetic import generate_bars
+import limit_up_decrease_ds
+import limit_up_decrease_gpt
+
+
+class _Signals(bt.Strategy):
+    """逐根 K 线调用策略自己的 _is_entry_signal，记录命中的 (日期, 股票)"""
+    params = (('check', None),)
+
+    def __init__(self):
+        self.hits = []
+
+    def next(self):
+        if self.p.check(self, self.data):
+            self.hits.append((self.datetime.date(0), self.data._name))
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp('bars'))
+    write_bars(generate_bars(30, years=1, seed=11, start_date='20230103', limit_up_prob=0.05), root)
+    return BarStore(root)
+
+
+@pytest.mark.parametrize('module, use_pre_close', [(limit_up_decrease_gpt, False), (limit_up_decrease_ds, True)])
+def test_scan_matches_strategy(store, module, use_pre_close):
+    expected = []
+    for code in store.codes.tolist():
+        cerebro = bt.Cerebro(stdstats=False)
+        cerebro.adddata(SharedBarData(store=store, ts_code=code, name=code))
+        cerebro.addstrategy(_Signals, check=module.LimitUpStrategy._is_entry_signal)
+        expected += cerebro.run()[0].hits
+
+    candidates = scan_limit_up_pullback(store.to_frame(), use_pre_close=use_pre_close)
+    got = [(date, code) for date, names in candidates.items() for code in names]
+    assert len(expected) > 5
+    assert sorted(got) == sorted(expected)
+    assert all(names == sorted(names) for names in candidates.values())
+
+    # pro.daily 的 'YYYYMMDD' 字符串日期同样可以
+    bars = store.to_frame()
+    bars['trade_date'] = bars['trade_date'].dt.strftime('%Y%m%d')
+    assert scan_limit_up_pullback(bars, use_pre_close=use_pre_close) == candidates
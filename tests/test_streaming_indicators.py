@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pandas as pd
+import backtrader as bt
+import pytest
+
+from streaming_indicators import Donchian, RollingSMA, WilderATR
+
+
+def _feed(n=600, seed=5):
+    rng = np.random.default_rng(seed)
+    close = 20.0 * np.cumprod(1 + rng.normal(0, 0.02, n))
+    open_ = close * (1 + rng.normal(0, 0.005, n))
+    df = pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, n)),
+        'low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, n)),
+        'close': close,
+        'volume': np.full(n, 1e5),
+    }, index=pd.bdate_range('2020-01-02', periods=n))
+    return bt.feeds.PandasData(dataname=df)
+
+
+class _Compare(bt.Strategy):
+    """流式指标与 backtrader 指标逐根对照，记录两者的取值"""
+    params = (('period', 20), ('lower_period', 10))
+
+    def __init__(self):
+        p = self.p
+        self.bt = (bt.indicators.SMA(self.data.close, period=p.period),
+                   bt.indicators.Highest(self.data.high, period=p.period),
+                   bt.indicators.Lowest(self.data.low, period=p.lower_period),
+                   bt.indicators.ATR(self.data, period=p.period))
+        self.sma = RollingSMA(p.period)
+        self.channel = Donchian(p.period, p.lower_period)
+        self.atr = WilderATR(p.period)
+        self.rows = []
+
+    def _update(self):
+        d = self.data
+        self.sma.update(d.close[0])
+        self.channel.update(d.high[0], d.low[0])
+        self.atr.update(d.high[0], d.low[0], d.close[0])
+
+    def prenext(self):
+        self._update()
+
+    def next(self):
+        self._update()
+        self.rows.append(([line[0] for line in self.bt],
+                          [self.sma.value, self.channel.upper, self.channel.lower, self.atr.value]))
+
+
+@pytest.mark.parametrize('period, lower_period', [(20, 10), (3, 7), (1, 1)])
+def test_matches_backtrader(period, lower_period):
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(_feed())
+    cerebro.addstrategy(_Compare, period=period, lower_period=lower_period)
+    rows = cerebro.run()[0].rows
+    expected = np.array([r[0] for r in rows])
+    got = np.array([r[1] for r in rows])
+    assert len(rows) == 600 - max(period + 1, lower_period) + 1  # ATR 从第 period + 1 根开始有值
+    assert np.allclose(got, expected, rtol=1e-10, atol=1e-10)
+
+
+def test_nan_before_ready():
+    sma, channel, atr = RollingSMA(3), Donchian(3), WilderATR(2)
+    for x in (1.0, 2.0):
+        assert math.isnan(sma.update(x)) and not sma.ready
+        assert all(math.isnan(v) for v in channel.update(x + 1, x - 1))
+    assert sma.update(6.0) == 3.0 and channel.update(7.0, 5.0) == (7.0, 0.0)
+    assert math.isnan(atr.update(2.0, 1.0, 1.5)) and math.isnan(atr.update(3.0, 1.0, 2.0))
+    assert atr.update(2.5, 2.0, 2.2) == pytest.approx((2.0 + 0.5) / 2) and atr.ready
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from trade_calendar import TradeCalendar
+
+
+def D(s):
+    return np.datetime64(s, 'D')
+
+
+@pytest.fixture
+def calendar():
+    # 2024-01-02（周二）到 2024-01-31 的工作日，去掉 01-15（周一）当作休市日
+    days = pd.bdate_range('2024-01-02', '2024-01-31')
+    return TradeCalendar(days[days != '2024-01-15'], end_date='20240204')
+
+
+def test_next_prev_open(calendar):
+    assert calendar.next_open('20240112') == D('2024-01-16')  # 跨周末和休市日
+    assert calendar.next_open('20240113') == D('2024-01-16')
+    assert calendar.prev_open('20240116') == D('2024-01-12')
+    assert calendar.next_open('20231229') == D('2024-01-02')  # 早于日历
+    assert np.isnat(calendar.next_open('20240131'))  # 最后一个交易日之后
+    assert np.isnat(calendar.next_open('20240301'))
+    assert np.isnat(calendar.prev_open('20240102'))
+    assert calendar.prev_open('20240301') == D('2024-01-31')
+
+
+def test_offset_edges(calendar):
+    assert calendar.offset('20240115', 0) == calendar.roll_back('20240115') == D('2024-01-12')
+    assert calendar.offset('20240115', 1) == D('2024-01-16')
+    assert calendar.offset('20240115', -1) == D('2024-01-12')
+    assert np.isnat(calendar.offset('20240102', -1))
+    assert calendar.offset('20240131', 0) == D('2024-01-31')
+    assert np.isnat(calendar.offset('20240131', 1))
+    assert np.isnat(calendar.offset('20240110', 30))
+    assert calendar.offset('20240131', -(len(calendar) - 1)) == D('2024-01-02')
+    # 数组输入逐个偏移，超出范围的为 NaT
+    out = calendar.offset(['20240102', '20240116', '20240131'], 1)
+    assert out[:2].tolist() == [D('2024-01-03'), D('2024-01-17')] and np.isnat(out[2])
+
+
+def test_ranges(calendar):
+    assert calendar.count('20240113', '20240116') == 1
+    assert calendar.count('20240116', '20240113') == 0
+    assert calendar.open_days('20240112', '20240117') == ['20240112', '20240116', '20240117']
+    assert calendar.open_days('20240201', '20240210') == []
+    assert calendar.is_open(['20240115', '20240116', '20240301']).tolist() == [False, True, False]
+    assert calendar.covers('20240204') and not calendar.covers('20240205')
@@ -0,0 +1,140 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# ================== 交易日历 ==================
+# 上交所/深交所交易日历（两所相同）从 pro.trade_cal 拉取一次保存为本地快照，之后不再调用接口。
+# 交易日保存为升序 datetime64[D] 数组，前后交易日、区间、偏移 N 个交易日都是 searchsorted，
+# 可以一次处理整列日期。日期参数接受 'YYYYMMDD'、datetime、Timestamp 或它们的数组。
+
+CALENDAR_DIR = 'data/calendar'
+CALENDAR_START = '19900101'
+CALENDAR_TTL_DAYS = 30  # 交易所每年底公布下一年的休市安排，快照按月刷新即可
+
+_CACHE = {}  # 快照路径 -> TradeCalendar
+
+
+def _to_days(dates):
+    """日期或日期数组 -> datetime64[D]"""
+    if isinstance(dates, (str, bytes)) or np.ndim(dates) == 0:
+        return np.datetime64(pd.Timestamp(dates), 'D')
+    return pd.to_datetime(np.asarray(dates)).values.astype('datetime64[D]')
+
+
+class TradeCalendar:
+    """交易日历，查询方法对单个日期返回 datetime64[D]，对数组返回数组"""
+
+    def __init__(self, open_days, end_date=None, exchange='SSE'):
+        """
+        :param open_days: 全部交易日
+        :param end_date: 日历覆盖到的最后一天（含休市日），默认最后一个交易日
+        """
+        self.days = np.unique(np.asarray(open_days, dtype='datetime64[D]'))
+        self.end = np.datetime64(pd.Timestamp(end_date), 'D') if end_date is not None else self.days[-1]
+        self.exchange = exchange
+
+    def __len__(self):
+        return len(self.days)
+
+    def is_open(self, dates):
+        d = _to_days(dates)
+        pos = np.searchsorted(self.days, d)
+        pos_c = np.minimum(pos, len(self.days) - 1)
+        return self.days[pos_c] == d
+
+    def roll_forward(self, dates):
+        """当天或之后的第一个交易日"""
+        return self._take(np.searchsorted(self.days, _to_days(dates), side='left'))
+
+    def roll_back(self, dates):
+        """当天或之前的最后一个交易日"""
+        return self._take(np.searchsorted(self.days, _to_days(dates), side='right') - 1)
+
+    def next_open(self, dates):
+        """严格晚于 dates 的下一个交易日"""
+        return self._take(np.searchsorted(self.days, _to_days(dates), side='right'))
+
+    def prev_open(self, dates):
+        """严格早于 dates 的上一个交易日"""
+        return self._take(np.searchsorted(self.days, _to_days(dates), side='left') - 1)
+
+    def offset(self, dates, n):
+        """
+        偏移 n 个交易日：n > 0 从当天或之前的交易日向后数，n < 0 从当天或之后的交易日向前数
+        offset(d, 0) 等价于 roll_back(d)
+        """
+        d = _to_days(dates)
+        if n >= 0:
+            pos = np.searchsorted(self.days, d, side='right') - 1 + n
+        else:
+            pos = np.searchsorted(self.days, d, side='left') + n
+        return self._take(pos)
+
+    def range(self, start_date, end_date):
+        """[start_date, end_date] 内的交易日"""
+        lo = np.searchsorted(self.days, _to_days(start_date), side='left')
+        hi = np.searchsorted(self.days, _to_days(end_date), side='right')
+        return self.days[lo:hi]
+
+    def count(self, start_date, end_date):
+        """[start_date, end_date] 内的交易日数，可传数组"""
+        lo = np.searchsorted(self.days, _to_days(start_date), side='left')
+        hi = np.searchsorted(self.days, _to_days(end_date), side='right')
+        return np.maximum(hi - lo, 0)
+
+    def open_days(self, start_date, end_date):
+        """[start_date, end_date] 内的交易日（'YYYYMMDD' 升序列表），与 pro 接口的日期格式一致"""
+        return pd.DatetimeIndex(self.range(start_date, end_date)).strftime('%Y%m%d').tolist()
+
+    def covers(self, end_date):
+        return _to_days(end_date) <= self.end
+
+    def _take(self, pos):
+        # 超出日历范围的位置返回 NaT
+        pos = np.asarray(pos)
+        valid = (pos >= 0) & (pos < len(self.days))
+        out = np.where(valid, self.days[np.clip(pos, 0, len(self.days) - 1)], np.datetime64('NaT', 'D'))
+        return out if out.ndim else out[()]
+
+
+def save_calendar(pro, exchange='SSE', root=CALENDAR_DIR):
+    """拉取 CALENDAR_START 至明年年底的日历并保存，返回文件路径"""
+    end_date = f'{pd.Timestamp.now().year + 1}1231'
+    cal = pro.trade_cal(exchange=exchange, start_date=CALENDAR_START, end_date=end_date,
+                        fields='exchange,cal_date,is_open')
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f'trade_cal_{exchange}.csv')
+    tmp_path = path + '.tmp'
+    cal[['cal_date', 'is_open']].to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    _CACHE.pop(path, None)
+    return path
+
+
+def _read_calendar(path, exchange):
+    if path not in _CACHE:
+        cal = pd.read_csv(path, dtype={'cal_date': str})
+        days = pd.to_datetime(cal['cal_date'], format='%Y%m%d')
+        _CACHE[path] = TradeCalendar(days[cal['is_open'].astype(int) == 1].values, days.max(), exchange)
+    return _CACHE[path]
+
+
+def load_calendar(pro=None, exchange='SSE', root=CALENDAR_DIR, end_date=None, refresh=False):
+    """
+    加载本地交易日历；快照不存在、超过 CALENDAR_TTL_DAYS、未覆盖 end_date 或 refresh=True 时通过 pro 重新获取
+    没有 pro 时使用已有快照
+    """
+    path = os.path.join(root, f'trade_cal_{exchange}.csv')
+
+    def stale():
+        if not os.path.exists(path) or time.time() - os.path.getmtime(path) > CALENDAR_TTL_DAYS * 86400:
+            return True
+        return end_date is not None and not _read_calendar(path, exchange).covers(end_date)
+
+    if pro is not None and (refresh or stale()):
+        save_calendar(pro, exchange, root)
+    elif not os.path.exists(path):
+        raise FileNotFoundError(f"{path} 不存在，请传入 pro 以获取交易日历")
+    return _read_calendar(path, exchange)
@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+
+# ================== 向量化快速回测 ==================
+# 把 DoubleSMA、TestStrategy、Strategy_wave1 的信号用数组一次算出，
+# 只在有信号的 K 线上按顺序撮合（持仓、资金的先后依赖无法完全并行），
+# 最后用 bincount + cumsum 还原每日持仓、资金和净值曲线。
+# 撮合规则与 backtrader 默认 BackBroker 一致：
+#   市价单在下一根 K 线开盘成交；coc=True 时按下单当根收盘价、在下一根 K 线处理时成交
+#   手续费按成交额百分比收取；资金不足的买单被拒绝
+#   最后一根 K 线下的单不会成交
+# 用于在完整事件驱动回测之前快速筛选想法，结果与 backtrader 在容差内一致。
+
+
+def _lag(values, k):
+    """取 k 根之前的值。backtrader 预加载数据时，前 k 根的 [-k] 会回绕到序列末尾，这里保持一致"""
+    return np.roll(values, k)
+
+
+def _sma(values, period):
+    """
+    简单移动平均，前 period-1 个值为 NaN
+    价格都在 0.01 的整数倍上时按“分”做整数累加，窗口和完全精确，
+    与 backtrader 用 math.fsum 计算的结果一样不会在价格相同时产生虚假的涨跌。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) < period:
+        return out
+    cents = np.round(values * 100)
+    if np.all(np.abs(values * 100 - cents) < 1e-6):
+        csum = np.concatenate(([0], np.cumsum(cents.astype(np.int64))))
+        out[period - 1:] = (csum[period:] - csum[:-period]) / (100.0 * period)
+    else:
+        csum = np.concatenate(([0.0], np.cumsum(values)))
+        out[period - 1:] = (csum[period:] - csum[:-period]) / period
+    return out
+
+
+def _next_index(indices, start):
+    """indices（升序）中第一个 >= start 的元素，没有则返回 None"""
+    pos = np.searchsorted(indices, start)
+    return int(indices[pos]) if pos < len(indices) else None
+
+
+class _Book:
+    """按成交顺序记账，最后统一生成成交表和净值曲线"""
+
+    def __init__(self, df, cash, commission):
+        self.df = df
+        self.cash = cash
+        self.start_cash = cash
+        self.commission = commission
+        self.position = 0.0
+        self.bars, self.sizes, self.prices, self.comms = [], [], [], []
+
+    def buy(self, bar, size, price):
+        value = size * price
+        comm = value * self.commission
+        if value + comm > self.cash:
+            return False  # 资金不足，backtrader 会拒绝该订单
+        self._fill(bar, size, price, comm)
+        return True
+
+    def close(self, bar, price):
+        self._fill(bar, -self.position, price, self.position * price * self.commission)
+
+    def _fill(self, bar, size, price, comm):
+        self.cash -= size * price + comm
+        self.position += size
+        self.bars.append(bar)
+        self.sizes.append(size)
+        self.prices.append(price)
+        self.comms.append(comm)
+
+    def result(self):
+        n = len(self.df)
+        bars = np.asarray(self.bars, dtype=np.int64)
+        sizes = np.asarray(self.sizes, dtype=np.float64)
+        prices = np.asarray(self.prices, dtype=np.float64)
+        comms = np.asarray(self.comms, dtype=np.float64)
+
+        position = np.cumsum(np.bincount(bars, weights=sizes, minlength=n))
+        cash = self.start_cash + np.cumsum(np.bincount(bars, weights=-(sizes * prices + comms), minlength=n))
+        close = self.df['close'].to_numpy(dtype=np.float64)
+        equity = pd.Series(cash + position * close, index=self.df.index, name='value')
+
+        fills = pd.DataFrame({
+            'date': self.df.index[bars],
+            'side': np.where(sizes > 0, 'buy', 'sell'),
+            'size': np.abs(sizes),
+            'price': prices,
+            'commission': comms,
+        })
+        return {
+            'fills': fills,
+            'equity': equity,
+            'final_value': float(equity.iloc[-1]) if n else self.start_cash,
+        }
+
+
+def backtest_double_sma(df, sma_short=5, sma_long=20, cash=100000, commission=0.001, percents=50):
+    """test.py 中的 DoubleSMA：短均线上穿买入、下穿卖出，PercentSizer 按现金比例下单"""
+    close = df['close'].to_numpy(dtype=np.float64)
+    open_ = df['open'].to_numpy(dtype=np.float64)
+    n = len(close)
+    book = _Book(df, cash, commission)
+
+    short, long_ = _sma(close, sma_short), _sma(close, sma_long)
+    first = max(sma_short, sma_long) - 1  # next() 从最长均线可用时开始
+    bar = np.arange(n)
+    ups = np.flatnonzero((short > long_) & (bar >= first))
+    downs = np.flatnonzero((short < long_) & (bar >= first))
+
+    t = first
+    while True:
+        entry = _next_index(ups, t)
+        if entry is None or entry + 1 >= n:
+            break
+        size = book.cash * percents / 100 / close[entry]
+        if not book.buy(entry + 1, size, open_[entry + 1]):
+            t = entry + 1
+            continue
+        exit_ = _next_index(downs, entry + 1)
+        if exit_ is None or exit_ + 1 >= n:
+            break
+        book.close(exit_ + 1, open_[exit_ + 1])
+        t = exit_ + 1
+    return book.result()
+
+
+def backtest_test_strategy(df, cash=100000, commission=0.001, percents=50, hold_bars=5):
+    """test.py 中的 TestStrategy：连续两天收跌买入，成交后持有 hold_bars 根 K 线卖出"""
+    close = df['close'].to_numpy(dtype=np.float64)
+    open_ = df['open'].to_numpy(dtype=np.float64)
+    n = len(close)
+    book = _Book(df, cash, commission)
+
+    prev1, prev2 = _lag(close, 1), _lag(close, 2)
+    entries = np.flatnonzero((close < prev1) & (prev1 < prev2))
+
+    t = 0
+    while True:
+        entry = _next_index(entries, t)
+        if entry is None or entry + 1 >= n:
+            break
+        size = book.cash * percents / 100 / close[entry]
+        if not book.buy(entry + 1, size, open_[entry + 1]):
+            t = entry + 1
+            continue
+        exit_ = entry + 1 + hold_bars  # len(self) >= bar_executed + hold_bars
+        if exit_ + 1 >= n:
+            break
+        book.close(exit_ + 1, open_[exit_ + 1])
+        t = exit_ + 1
+    return book.result()
+
+
+def backtest_wave(df, smoothing_period=5, stack_len=3, cash=2000, commission=0.001, lot=100):
+    """
+    Strategy_wave1（coc=True）：均线斜率符号栈出现拐点时按手加仓/清仓
+    加仓要求收盘价高于上一次买入成交价
+    """
+    close = df['close'].to_numpy(dtype=np.float64)
+    n = len(close)
+    book = _Book(df, cash, commission)
+
+    sma = _sma(close, smoothing_period)
+    slope = np.where(sma - _lag(sma, 1) > 0, 1, -1)  # NaN 比较为 False，与策略一致记为 -1
+    stack_sum = np.zeros(n, dtype=np.int64)
+    for i in range(stack_len):
+        stack_sum += _lag(slope, i)
+
+    bar = np.arange(n)
+    ready = (bar >= smoothing_period - 1) & (bar + 1 > stack_len)
+    buy_signal = ready & (slope == 1) & np.isin(stack_sum, [-(stack_len - 2), -(stack_len - 3)])
+    sell_signal = ready & (slope == -1) & np.isin(stack_sum, [stack_len - 2, stack_len - 3])
+
+    buyprice = None
+    for t in np.flatnonzero(buy_signal | sell_signal):
+        if t + 1 >= n:
+            break
+        # coc：下一根 K 线处理订单，价格为下单当根收盘价
+        if buy_signal[t]:
+            if buyprice is None or close[t] > buyprice:
+                if book.buy(t + 1, lot, close[t]):
+                    buyprice = close[t]
+        elif book.position > 0:
+            book.close(t + 1, close[t])
+    return book.result()
@@ -1,32 +1,36 @@
-# 数据接口
-import tushare as ts
-
 # 基础模块
-from datetime import datetime,timedelta
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
-import time
+from datetime import datetime
 
 # 回测框架
 import backtrader as bt
 
-# 设置Tushare Token
-ts.set_token('0ff27db3b933751cc13e959f62e7147d441325b4fdc2a4fd1b0aacfe')
-pro = ts.pro_api()
+from data_source import lazy_pro
+from streaming_indicators import SlopeSignStack
+
+# 行情接口，数据源与延迟创建见 data_source.lazy_pro
+pro = lazy_pro()
 
 class Strategy_wave1(bt.Strategy):
     params = (
         ('printlog', False),
         ('smoothing_period', 5),
         ('stack_len', 3),
+        ('recorder', None),  # event_log.EventRecorder，设置后日志写入事件文件而不是打印
+        ('indicator_cache', None),  # indicator_cache.IndicatorCache，参数寻优时复用同一周期的均线
     )
+    # checkpoint 保存和恢复的属性，均线本身由恢复前的预热数据重新计算
+    checkpoint_state = ('stack', 'buyprice', 'sellprice')
 
-    def log(self, txt, dt=None, doprint=False):
+    def log(self, txt, *args, dt=None, doprint=False, level='info'):
         ''' Logging function fot this strategy'''
-        if self.params.printlog or doprint:
+        # txt 为 % 格式串、args 为参数，不输出时不做格式化
+        recorder = self.params.recorder
+        if recorder is not None:
+            if recorder.enabled(level):
+                recorder.log(dt or self.datas[0].datetime.date(0), txt, *args, level=level)
+        elif self.params.printlog or doprint:
             dt = dt or self.datas[0].datetime.date(0)
-            print('%s: %s' % (dt.isoformat(), txt))
+            print('%s: %s' % (dt.isoformat(), txt % args if args else txt))
             # with open('log.txt', 'a') as file:
             # file.write('%s: %s \n' % (dt.isoformat(), txt))
 
@@ -38,10 +42,16 @@ class Strategy_wave1(bt.Strategy):
         self.sellprice = None
 
         # Add a MovingAverageSimple indicator
-        self.sma = bt.indicators.SimpleMovingAverage(
-            self.datas[0], period=self.params.smoothing_period)
-        # Add a singal stack
-        self.stack = [0] * self.params.stack_len
+        if self.params.indicator_cache is not None:
+            self.sma = self.params.indicator_cache.sma(self.datas[0].close, self.params.smoothing_period)
+        else:
+            self.sma = bt.indicators.SimpleMovingAverage(
+                self.datas[0], period=self.params.smoothing_period)
+        # Add a singal stack：每根 K 线只压入最新的均线斜率方向，不再重算整个窗口
+        self.stack = SlopeSignStack(self.params.stack_len)
+        # 逐根 K 线的栈和均线明细只在需要输出时才组装
+        recorder = self.params.recorder
+        self._log_bars = recorder.enabled('debug') if recorder is not None else self.params.printlog
 
     def notify_order(self, order):
         #self.log("notify_order")
@@ -54,19 +64,19 @@ class Strategy_wave1(bt.Strategy):
         if order.status in [order.Completed]:
             if order.isbuy():
 
-                self.log('BUY EXECUTED, Price: %.2f, Lot:%i, Cash: %i, Value: %i' %
-                         (order.executed.price,
-                          order.executed.size,
-                          self.broker.get_cash(),
-                          self.broker.get_value()))
+                self.log('BUY EXECUTED, Price: %.2f, Lot:%i, Cash: %i, Value: %i',
+                         order.executed.price,
+                         order.executed.size,
+                         self.broker.get_cash(),
+                         self.broker.get_value())
                 self.buyprice = order.executed.price
 
             else:  # Sell
-                self.log('SELL EXECUTED, Price: %.2f, Lot:%i, Cash: %i, Value: %i' %
-                         (order.executed.price,
-                          -order.executed.size,
-                          self.broker.get_cash(),
-                          self.broker.get_value()))
+                self.log('SELL EXECUTED, Price: %.2f, Lot:%i, Cash: %i, Value: %i',
+                         order.executed.price,
+                         -order.executed.size,
+                         self.broker.get_cash(),
+                         self.broker.get_value())
                 self.sellprice = order.executed.price
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
@@ -80,8 +90,7 @@ class Strategy_wave1(bt.Strategy):
         if not trade.isclosed:
             return
 
-        self.log('OPERATION PROFIT, GROSS %.2f, NET %.2f' %
-                 (trade.pnl, trade.pnlcomm))
+        self.log('OPERATION PROFIT, GROSS %.2f, NET %.2f', trade.pnl, trade.pnlcomm)
 
     def next(self):
         #self.log('next func')
@@ -89,35 +98,32 @@ class Strategy_wave1(bt.Strategy):
         # if self.order:
         #    return
 
+        self.stack.update(self.sma[0])
         if len(self.sma) <= self.params.stack_len:
             return
 
-        for i in range(1, self.params.stack_len + 1):
-            self.stack[-i] = 1 if self.sma[-i + 1] - self.sma[-i] > 0 else -1
-
-        self.log(self.stack)
-        self.log([self.sma[-2],self.sma[-1],self.sma[0]])
+        if self._log_bars:
+            self.log('%s', self.stack.signs(), level='debug')
+            self.log('%s', [self.sma[-2],self.sma[-1],self.sma[0]], level='debug')
 
         # Wave Buy Signal
-        if self.stack[-1] == 1 and sum(self.stack) in [-1 * (self.params.stack_len - 2),
-                                                       -1 * (self.params.stack_len - 3)]:
+        if self.stack.last == 1 and self.stack.total in [-1 * (self.params.stack_len - 2),
+                                                         -1 * (self.params.stack_len - 3)]:
             if self.buyprice is None:
-                self.log('BUY CREATE, Price: %.2f, Lots: %i, Current Position: %i' % (self.dataclose[0],
-                                                                                      100,
-                                                                                      self.getposition(self.data).size))
+                self.log('BUY CREATE, Price: %.2f, Lots: %i, Current Position: %i', self.dataclose[0],
+                         100, self.getposition(self.data).size)
                 self.buy(size=100)
             elif self.dataclose > self.buyprice:
-                self.log('BUY CREATE, Price: %.2f, Lots: %i, Current Position: %i' % (self.dataclose[0],
-                                                                                      100,
-                                                                                      self.getposition(self.data).size))
+                self.log('BUY CREATE, Price: %.2f, Lots: %i, Current Position: %i', self.dataclose[0],
+                         100, self.getposition(self.data).size)
                 self.buy(size=100)
 
         # Wave Sell Singal
-        elif self.stack[-1] == -1 and sum(self.stack) in [1 * (self.params.stack_len - 2),
-                                                          1 * (self.params.stack_len - 3)]:
+        elif self.stack.last == -1 and self.stack.total in [1 * (self.params.stack_len - 2),
+                                                            1 * (self.params.stack_len - 3)]:
             if self.getposition(self.data).size > 0:
-                self.log('SELL CREATE (Close), Price: %.2f, Lots: %i' % (self.dataclose[0],
-                                                                         self.getposition(self.data).size))
+                self.log('SELL CREATE (Close), Price: %.2f, Lots: %i', self.dataclose[0],
+                         self.getposition(self.data).size)
                 self.close()
 
         # # Wave Buy Signal
@@ -145,6 +151,8 @@ class Strategy_wave1(bt.Strategy):
         # self.order = self.sell(size = self.getposition(data).size - opt_position)
 
 def get_data(stock_code, start_date, end_date):
+    import pandas as pd
+
     # 获取历史日线数据
     print(stock_code,start_date,end_date)
     df = pro.daily(ts_code=stock_code, start_date=start_date, end_date=end_date)
@@ -164,31 +172,32 @@ def get_data(stock_code, start_date, end_date):
     return bt.feeds.PandasData(dataname=df)
 
 if __name__ == '__main__':
+    import pandas as pd
+    from trade_calendar import load_calendar
+    from ashare_broker import AShareBroker
+
     # Create a cerebro entity
     cerebro = bt.Cerebro()
 
     # Add a strategy
     strats = cerebro.addstrategy(Strategy_wave1, printlog=True, smoothing_period=5)
 
-    start_date = datetime.now()-timedelta(days=365)
-    start_date = start_date.strftime('%Y%m%d')
+    # 最近约一年（250 个交易日），按本地交易日历计算
     end_date = datetime.now().strftime('%Y%m%d')
+    start_date = pd.Timestamp(load_calendar(pro).offset(end_date, -250)).strftime('%Y%m%d')
 
     # Create stock Data Feed
     stock_index = '002057.SZ'
 
     data = get_data(stock_index,start_date,end_date)
 
-    # Add the index Data Feed to Cerebo
-    cerebro.adddata(data)
+    # Add the index Data Feed to Cerebo（名称用于判断板块涨跌幅）
+    cerebro.adddata(data, name=stock_index)
 
-    # Set cash inside the strategy
-    cerebro.broker = bt.brokers.BackBroker(coc=True)
+    # Set cash inside the strategy；A 股撮合和费用（T+1、整手、封板不能成交、最低佣金、印花税）
+    cerebro.broker = AShareBroker(coc=True)
     cerebro.broker.setcash(2000)
 
-    # Set commission
-    cerebro.broker.setcommission(commission=0.001)
-
     # Print out the starting conditions
     start_value = cerebro.broker.getvalue()
     print('Starting Portfolio Value: %.2f' % cerebro.broker.getvalue())